@@ -1,14 +1,50 @@
-from crewai.tools import BaseTool
+from typing import List, Optional
+
 import pandas as pd
+from crewai.tools import BaseTool
+
+from tool_cache import MAX_SAMPLE_ROWS, TOOL_OUTPUT_TOKENS, fit_tokens, memoized_result, sample_frame
+
+SAMPLE_SEED = 0  # random samples are stable across repeated calls
+
+
 class CSVLoaderTool(BaseTool):
     name: str = "csv_loader"
-    description: str = "Loads a CSV file and returns schema and sample data"
+    description: str = (
+        "Returns schema and sample data for a registered dataset; file_path is its key or CSV path. "
+        "Optional: columns (subset), sample_rows (default 5), random_sample (instead of the first rows), "
+        "max_tokens (output size cap). Repeated calls are served from memory."
+    )
+
+    def _run(self, file_path: str, columns: Optional[List[str]] = None, sample_rows: int = 5,
+             random_sample: bool = False, max_tokens: int = TOOL_OUTPUT_TOKENS):
+        sample_rows = max(0, min(int(sample_rows), MAX_SAMPLE_ROWS))
+        args = {"columns": columns, "sample_rows": sample_rows, "random_sample": random_sample,
+                "max_tokens": max_tokens}
 
-    def _run(self, file_path: str):
-        df = pd.read_csv(file_path)
+        def load(handle):
+            # Large (lazy) datasets: names and row count from the streamed
+            # profile, dtypes and samples from the first chunk only
+            all_columns = handle.columns
+            df = sample_frame(handle)
+            if df is None:
+                df = pd.DataFrame(columns=all_columns)
+            selected = [col for col in columns or all_columns if col in df.columns]
+            if random_sample and len(df) > sample_rows:
+                sample = df[selected].sample(sample_rows, random_state=SAMPLE_SEED)
+            else:
+                sample = df[selected].head(sample_rows)
+            result = {
+                "columns": all_columns,
+                "dtypes": {col: str(df[col].dtype) for col in selected},
+                "sample_rows": sample.to_dict(orient="records"),
+                "row_count": handle.row_count,
+            }
+            if random_sample and not handle.is_loaded:
+                result["sampled_from_first_rows"] = len(df)
+            unknown = [col for col in columns or [] if col not in all_columns]
+            if unknown:
+                result["unknown_columns"] = unknown
+            return fit_tokens(result, max_tokens)
 
-        return {
-            "columns": list(df.columns),
-            "sample_rows": df.head(5).to_dict(orient="records"),
-            "row_count": len(df)
-        }
+        return memoized_result(self.name, file_path, args, load)
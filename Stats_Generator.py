@@ -1,21 +1,87 @@
-from crewai.tools import BaseTool
+from typing import List, Optional
+
 import pandas as pd
+from crewai.tools import BaseTool
+
+from tool_cache import MAX_TOP_VALUES, TOOL_OUTPUT_TOKENS, fit_tokens, memoized_result, sample_frame
+
+# df.describe() keys of a numeric column
+NUMERIC_STATS = ("count", "mean", "std", "min", "25%", "50%", "75%", "max")
+
+
+def _round(value):
+    return round(value, 4) if isinstance(value, float) else value
+
 
 class StatsTool(BaseTool):
     name: str = "stats_generator"
-    description: str = "Computes statistics and aggregations from logistics data"
-
-    def _run(self, file_path: str):
-        df = pd.read_csv(file_path)
-
-        stats = {
-            "row_count": len(df),
-            "numeric_summary": df.describe(include="number").to_dict(),
-            "categorical_counts": {
-                col: df[col].value_counts().head(10).to_dict()
-                for col in df.select_dtypes(include="object").columns
-            }
-        }
-
-        return stats
-        
+    description: str = (
+        "Computes statistics and aggregations for a registered dataset; file_path is its key or CSV path. "
+        "Optional: columns (subset to describe), top_values (per categorical column), "
+        "max_tokens (output size cap). Repeated calls are served from memory."
+    )
+
+    def _run(self, file_path: str, columns: Optional[List[str]] = None, top_values: int = 10,
+             max_tokens: int = TOOL_OUTPUT_TOKENS):
+        top_values = max(1, min(int(top_values), MAX_TOP_VALUES))
+        args = {"columns": columns, "top_values": top_values, "max_tokens": max_tokens}
+
+        def compute(handle):
+            if handle.is_loaded:
+                stats = _stats(handle.df, columns, top_values)
+            else:
+                stats = _profile_stats(handle, columns, top_values)
+            return fit_tokens(stats, max_tokens)
+
+        return memoized_result(self.name, file_path, args, compute)
+
+
+def _stats(df, columns, top_values):
+    unknown = [col for col in columns or [] if col not in df.columns]
+    if columns:
+        df = df[[col for col in columns if col in df.columns]]
+    numeric = df.select_dtypes(include="number")
+    stats = {
+        "row_count": len(df),
+        "numeric_summary": {
+            col: {stat: _round(value) for stat, value in summary.items()}
+            for col, summary in (numeric.describe().to_dict() if not numeric.columns.empty else {}).items()
+        },
+        "categorical_counts": {
+            col: {str(value): int(n) for value, n in df[col].value_counts().head(top_values).items()}
+            for col in df.select_dtypes(exclude=["number", "datetime"]).columns
+        },
+    }
+    if unknown:
+        stats["unknown_columns"] = unknown
+    return stats
+
+
+def _profile_stats(handle, columns, top_values):
+    # Same fields as _stats from the streamed profile of a lazy dataset, without
+    # parsing it whole; dtypes come from the first chunk
+    profile = handle.profile()
+    head = sample_frame(handle)
+    if head is None:
+        head = pd.DataFrame(columns=profile.columns)
+    unknown = [col for col in columns or [] if col not in profile.columns]
+    selected = [col for col in columns or profile.columns if col in profile.columns and col in head.columns]
+    numeric = head[selected].select_dtypes(include="number").columns
+    categorical = head[selected].select_dtypes(exclude=["number", "datetime"]).columns
+    stats = {
+        "row_count": profile.total_rows,
+        "numeric_summary": {
+            col: {stat: _round(value) for stat, value in profile.column_profiles[col].describe().items()
+                  if stat in NUMERIC_STATS}
+            for col in numeric if profile.column_profiles[col].numeric
+        },
+        "categorical_counts": {
+            col: {str(value): int(n) for value, n in profile.column_profiles[col].top_k(top_values).items()}
+            for col in categorical
+        },
+        # quartiles come from a sample and counts are lower bounds
+        "approximate": True,
+    }
+    if unknown:
+        stats["unknown_columns"] = unknown
+    return stats
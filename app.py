@@ -1,11 +1,20 @@
 import streamlit as st
-import pandas as pd
-import tempfile
 import json
-import re
+import os
+import time
 
-from pipeline import run_pipeline
+from cache_gc import maybe_collect
+from dataset_registry import get_dataset, register_dataset, load_report
+from figure_renderer import warm_up
+from job_queue import (DONE, FAILED, POLL_SECONDS, STREAM_POLL_SECONDS, get_job, job_result,
+                       save_task_output, submit_job, warm_workers)
+from pipeline import TASK_NAMES, configured_providers
 from plot_graphs import render_plots_streamlit
+from rule_planner import rule_plan
+from structured_output import typed_output
+from tool_cache import sample_frame
+from tracing import span_rows, start_trace, to_chrome
+from viz_validator import plan_hash, validate_and_repair
 
 
 # ---- PAGE CONFIG ----
@@ -16,87 +25,261 @@ st.set_page_config(
 
 st.title("🚚 Logistics Delay Analyzer")
 st.write("Analyze shipment delays and get actionable insights using AI.")
+if not configured_providers():
+    st.warning("No LLM provider key found (OPENROUTER_API_KEY, GROQ_API_KEY or OLLAMA_BASE_URL): "
+               "the drill-down and rule-based charts work, AI analysis jobs will fail.")
+
+
+def show_results(result, dataset, on_repaired=None):
+
+    st.success("✅ Analysis Completed!")
+
+    # -------------------------------------------------
+    # AI INSIGHTS & RECOMMENDATIONS 
+    # -------------------------------------------------
+    st.subheader("🧠 AI Insights & Recommendations")
+    st.write(result.tasks_output[2].raw)   
+
+    # -------------------------------------------------
+    # TASK-WISE OUTPUTS
+    # -------------------------------------------------
+    task_description = ["Understanding Dataset","Delay Causes"]
+    st.subheader("🧩 Task-wise Outputs")
+
+    for i, task in enumerate(result.tasks_output, start=1):
+        # Task index:
+        # 1 → Data Understanding
+        # 2 → Delay Analysis
+        # 3 → Recommendations
+        # 4 → Visualization
+        # 5 → Visualization interpretation
+        if i in (3,4,5):
+            continue
+
+        with st.expander(f"Task {i}: {task_description[i-1]}"):
+            st.write(task.raw)  
+
+    # -------------------------------------------------
+    # STRUCTURED OUTPUTS
+    # -------------------------------------------------
+    # Pydantic objects straight from the tasks; a broken answer is repaired
+    # locally or re-run alone, never the whole pipeline
+    with st.spinner("Reading the visualization plan..."):
+        viz_plan = typed_output(result, 3, dataset, on_repaired=on_repaired)
+        interpretation = typed_output(result, 4, dataset, on_repaired=on_repaired)
+    if viz_plan is None:
+        st.error("❌ The visualization plan could not be parsed")
+        st.code(str(result.tasks_output[3].raw))
+        st.stop()
+    if interpretation is None:
+        st.warning("⚠️ Chart explanations could not be parsed; showing the charts without them")
+
+    # -------------------------------------------------
+    # RENDER PLOTS
+    # -------------------------------------------------
+    st.subheader("📈 Visual Insights")
+    with start_trace("render_plots") as render_trace:
+        # checked against the real columns first; only invalid plots are re-asked.
+        # Jobs store the check, so this is only repeated for a plan re-run here
+        plan_plots = viz_plan.model_dump()["plots"]
+        checked = result.viz_check
+        if checked.get("plan") == plan_hash(plan_plots):
+            plots, plan_report = checked["plots"], checked["report"]
+        else:
+            plots, plan_report = validate_and_repair(plan_plots, dataset)
+        render_plots_streamlit({"plots": plots}, dataset,
+                               interpretation.model_dump() if interpretation else {})
+    changed = [row for row in plan_report if row["status"] != "ok"]
+    if changed:
+        with st.expander(f"🧪 Visualization plan checks ({len(changed)} of {len(plan_report)} plots adjusted)"):
+            st.dataframe([
+                {"metric": row["metric"], "status": row["status"],
+                 "details": "; ".join(row["fixes"] + row["errors"])}
+                for row in changed
+            ], use_container_width=True)
+
+    # -------------------------------------------------
+    # LOAD REPORT
+    # -------------------------------------------------
+    with st.expander("⏱️ Dataset load report"):
+        st.json(load_report())
+
+    with st.expander("⏱️ Pipeline timings (seconds)"):
+        st.json({name: round(secs, 2) for name, secs in result.timings.items()})
+
+    with st.expander("🔢 Prompt tokens per task (before → after compaction)"):
+        st.table(result.prompt_tokens)
+
+    if st.checkbox("⏱️ Show timing panel", help="Per-stage spans of the pipeline run and of this render"):
+        show_timing_panel([result.trace, render_trace.to_dict()])
+
+
+def show_timing_panel(traces):
+    for trace in traces:
+        if not trace:
+            continue
+        st.markdown(f"**{trace['name']}**")
+        st.dataframe([
+            {
+                "stage": "\u2003" * row["depth"] + row["name"],
+                "ms": round(row["duration"] * 1000, 1),
+                "details": ", ".join(f"{k}={v}" for k, v in row["attrs"].items()),
+            }
+            for row in span_rows(trace)
+        ], use_container_width=True)
+        st.download_button(
+            "Download Chrome trace",
+            json.dumps(to_chrome(trace), default=str),
+            file_name=f"{trace['name']}-{trace['id']}.json",
+            mime="application/json",
+            key=f"trace-{trace['id']}",
+        )
+
+
+def show_drilldown(dataset):
+    # Filters query the pre-aggregated cube, never the raw frame
+    cube = dataset.delay_cube()
+    if cube is None:
+        return
+    with st.expander("🧊 Delay drill-down (instant, no AI)"):
+        filter_cols = st.columns(len(cube.dims))
+        filters = {}
+        for col, dim in zip(filter_cols, cube.dims):
+            with col:
+                filters[dim] = st.multiselect(dim.replace("_", " ").title(), cube.options(dim),
+                                              key=f"cube_{dim}") or None
+        by = st.multiselect("Break down by", cube.dims, default=cube.dims[:1], key="cube_by")
+
+        # .iloc[0] upcasts the row to float: counts are converted back
+        total = cube.query(filters).iloc[0]
+        shipments, delayed = int(total["shipments"]), int(total["delayed"])
+        metrics = st.columns(3)
+        metrics[0].metric("Shipments", f"{shipments:,}")
+        metrics[1].metric("Delay rate", f"{100 * total['delay_rate']:.1f}%" if shipments else "–")
+        metrics[2].metric("Mean delay (days)",
+                          f"{total['mean_delay_days']:.2f}" if delayed else "–")
+        if by:
+            table = cube.query(filters, by=by).sort_values("shipments", ascending=False)
+            st.dataframe(table, use_container_width=True, hide_index=True)
+            if len(by) == 1:
+                st.bar_chart(table.set_index(by[0])["delay_rate"])
+
+
+@st.cache_resource
+def warm_pools():
+    # Once per server process: job workers import crewai and build their agents,
+    # render workers start, while the user is still picking a file
+    warm_workers()
+    warm_up()
+    return True
+
+
+def partial_answer(text):
+    # Streamed text includes the agent's reasoning; the answer follows "Final Answer:"
+    head, marker, answer = text.rpartition("Final Answer:")
+    return answer.strip() if marker else text.strip()
+
+
+def job_dataset(job):
+    # Registry lookup by key on every poll; the file is only hashed again after
+    # an eviction or a restart, and None once cache_gc removed the upload
+    try:
+        return get_dataset(job["dataset_key"])
+    except KeyError:
+        if os.path.exists(job["dataset_path"]):
+            return register_dataset(job["dataset_path"])
+    return None
+
+
+def show_job(job_id):
+    job = get_job(job_id)
+    if job is None:
+        st.warning(f"Analysis job {job_id} was not found.")
+        return
+    dataset = job_dataset(job)
+
+    # ---- PER-TASK PROGRESS ----
+    if job["status"] not in (DONE, FAILED):
+        st.info(f"Analysis job `{job_id}` is {job['status']} — you can reload this page at any time.")
+        progress = st.progress(len(job["tasks"]) / len(TASK_NAMES))
+        for i, name in enumerate(TASK_NAMES):
+            icon = "✅" if i in job["tasks"] else "✍️" if i in job["streams"] else "⏳"
+            st.write(f"{icon} Task {i + 1}: {name.replace('_', ' ').title()}")
+        # Insights are shown as soon as the recommendation task starts answering
+        if 2 in job["tasks"]:
+            st.subheader("🧠 AI Insights & Recommendations")
+            st.write(job["tasks"][2]["raw"])
+        elif 2 in job["streams"]:
+            st.subheader("🧠 AI Insights & Recommendations")
+            st.write(partial_answer(job["streams"][2]) + " ▌")
+        for i, text in job["streams"].items():
+            if i != 2:
+                with st.expander(f"✍️ {TASK_NAMES[i].replace('_', ' ').title()} (writing…)"):
+                    st.text(partial_answer(text)[-2000:])
+        # Rule-based charts render in milliseconds while the AI plan is computed
+        if 3 not in job["tasks"] and dataset is not None:
+            st.subheader("📈 Quick charts (rule-based, replaced by the AI plan when ready)")
+            render_plots_streamlit(rule_plan(dataset), dataset, {})
+        time.sleep(STREAM_POLL_SECONDS if job["streams"] else POLL_SECONDS)
+        st.rerun()
+
+    if job["status"] == FAILED:
+        st.error("❌ Analysis failed")
+        st.code(job["error"])
+        return
+
+    if dataset is None:
+        st.warning("⌛ The dataset of this analysis has expired from the cache; upload it again to view the results.")
+        return
+
+    # a task re-run during display is stored, so reloads don't repeat it
+    show_results(job_result(job), dataset,
+                 on_repaired=lambda index, output: save_task_output(job_id, index, output))
+
 
 # ---- FILE UPLOAD ----
+maybe_collect()  # expire unused uploads, Parquet copies, traces and figures (throttled)
+warm_pools()
 uploaded_file = st.file_uploader(
-    "📂 Upload Logistics CSV Dataset",
-    type=["csv"]
+    "📂 Upload Logistics Dataset (CSV, Parquet or Arrow)",
+    type=["csv", "parquet", "arrow", "feather"]
 )
 
 if uploaded_file:
-    df = pd.read_csv(uploaded_file)
+    # Spooled to disk once by content hash and parsed from that file;
+    # reruns only re-hash the upload buffer. Every later stage shares this handle.
+    dataset = register_dataset(uploaded_file, name=uploaded_file.name)
 
     st.subheader("📊 Dataset Preview")
-    st.dataframe(df.head(10), use_container_width=True)
-
-    # Save uploaded CSV to temp file
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".csv") as tmp:
-        tmp.write(uploaded_file.getvalue())
-        csv_path = tmp.name
+    # large (lazy) uploads are previewed from their first chunk, never parsed whole
+    preview = sample_frame(dataset)
+    if preview is not None:
+        st.dataframe(preview.head(10), use_container_width=True)
+    show_drilldown(dataset)
 
     # ---- RUN ANALYSIS ----
+    parallel = st.checkbox(
+        "Run visualization branch in parallel",
+        value=True,
+        help="Charts only need the schema, so they can be planned alongside the delay analysis."
+    )
+    use_cache = st.checkbox(
+        "Reuse cached results for unchanged data",
+        value=True,
+        help="Task outputs are cached by dataset hash, prompt and model settings."
+    )
+    planner = st.radio(
+        "Visualization plan",
+        ["AI agent", "Rule-based (instant)"],
+        horizontal=True,
+        help="The rule-based plan picks charts from column types and delay columns without an LLM call."
+    )
     if st.button("🚀 Run Delay Analysis"):
-        with st.spinner("Analyzing delays... Please wait ⏳"):
-            result = run_pipeline(csv_path)
-
-        st.success("✅ Analysis Completed!")
-
-        # -------------------------------------------------
-        # AI INSIGHTS & RECOMMENDATIONS 
-        # -------------------------------------------------
-        st.subheader("🧠 AI Insights & Recommendations")
-        st.write(result.tasks_output[2].raw)   
-
-        # -------------------------------------------------
-        # TASK-WISE OUTPUTS
-        # -------------------------------------------------
-        task_description = ["Understanding Dataset","Delay Causes"]
-        st.subheader("🧩 Task-wise Outputs")
-
-        for i, task in enumerate(result.tasks_output, start=1):
-            # Task index:
-            # 1 → Data Understanding
-            # 2 → Delay Analysis
-            # 3 → Recommendations
-            # 4 → Visualization
-            # 5 → Visualization interpretation
-            if i in (3,4,5):
-                continue
-
-            with st.expander(f"Task {i}: {task_description[i-1]}"):
-                st.write(task.raw)  
-
-        # -------------------------------------------------
-        # VISUALIZATION JSON EXTRACTION
-        # -------------------------------------------------
-        raw_viz_output = str(result.tasks_output[3].raw).strip()
-        # Remove ```json fences if present
-        match = re.search(r"```json\s*(.*?)\s*```", raw_viz_output, re.DOTALL)
-        if match:
-            raw_viz_output = match.group(1)
-
-        try:
-            viz_json = json.loads(raw_viz_output)
-        except json.JSONDecodeError as e:
-            st.error("❌ Failed to parse visualization JSON")
-            st.code(raw_viz_output)
-            st.stop()
-        
-        raw_interpreter_output = str(result.tasks_output[4].raw).strip()
-        match = re.search(r"```json\s*(.*?)\s*```", raw_interpreter_output, re.DOTALL)
-        if match:
-            raw_interpreter_output = match.group(1)
-
-        try:
-            interpreter_json = json.loads(raw_interpreter_output)
-        except json.JSONDecodeError as e:
-            st.error("❌ Failed to parse visualization JSON")
-            st.code(raw_interpreter_output)
-            st.stop()
-
-
-        # -------------------------------------------------
-        # RENDER PLOTS
-        # -------------------------------------------------
-        st.subheader("📈 Visual Insights")
-        render_plots_streamlit(viz_json, df, interpreter_json)
+        # Runs in a background worker; the job id in the URL survives reloads
+        job_id = submit_job(dataset.path, dataset_key=dataset.key, parallel=parallel, use_cache=use_cache,
+                            viz_planner="rules" if planner.startswith("Rule") else "llm")
+        st.query_params["job"] = job_id
+
+# ---- RESULTS (re-attached by job id after a reload) ----
+if "job" in st.query_params:
+    show_job(st.query_params["job"])
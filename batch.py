@@ -0,0 +1,223 @@
+"""Headless batch mode: analyze many CSV exports without the Streamlit UI.
+
+    python batch.py "exports/*.csv" --out batch_output --workers 3 --parallel
+    python batch.py live_export.csv --incremental   # only rows appended since the last run
+
+Each file gets its own folder with the task outputs, the viz and
+interpretation JSON and one PNG per chart. A file is skipped on the next
+run once its ``done.json`` marker matches the file's size and mtime, so an
+interrupted batch resumes where it stopped. With ``--incremental``, CSVs
+are tailed from where the previous run stopped and the LLM is only asked
+again when the delay rates drifted (see incremental.py).
+"""
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+
+matplotlib.use("Agg")  # workers render PNGs without a display
+
+# ---- SETTINGS ----
+DEFAULT_OUT_DIR = "batch_output"
+DEFAULT_WORKERS = int(os.getenv("LDA_BATCH_WORKERS", 2))
+DONE_MARKER = "done.json"
+SUMMARY_FILE = "summary.json"
+INPUT_EXTENSIONS = (".csv", ".parquet", ".arrow", ".feather")
+
+# tasks_output position -> file written for it
+TEXT_OUTPUTS = {0: "data_understanding.md", 1: "delay_analysis.md", 2: "insights.md"}
+JSON_OUTPUTS = {3: "viz_plan.json", 4: "interpretation.json"}
+TRACE_FILE = "trace.json"  # Chrome trace format (chrome://tracing, Perfetto)
+
+
+# ---- HELPERS ----
+def output_dir_for(path, out_dir):
+    # stem plus a short path hash: same-named exports from different folders don't collide
+    stem = os.path.splitext(os.path.basename(path))[0]
+    digest = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:8]
+    return os.path.join(out_dir, f"{stem}-{digest}")
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def is_done(path, out_dir):
+    marker = os.path.join(output_dir_for(path, out_dir), DONE_MARKER)
+    if not os.path.exists(marker):
+        return False
+    with open(marker) as fh:
+        done = json.load(fh)
+    return done.get("signature") == file_signature(path)
+
+
+def _write_json(path, payload):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as fh:
+        json.dump(payload, fh, indent=2, default=str)
+    os.replace(tmp, path)
+
+
+# ---- WORKER ----
+def _init_worker(workers):
+    # Provider limits are per process; split them so the batch as a whole
+    # stays inside the same requests-per-minute budget as one app instance.
+    from llm_clients import split_limits, use_limits
+
+    use_limits(split_limits(workers))
+
+
+def analyze_file(path, out_dir, parallel=False, use_cache=True, viz_planner="llm", incremental=False):
+    """Run the pipeline on one CSV and write its outputs; returns a summary row."""
+    start = time.perf_counter()
+    target = output_dir_for(path, out_dir)
+    os.makedirs(os.path.join(target, "plots"), exist_ok=True)
+    signature = file_signature(path)
+    row = {"file": path, "output_dir": target}
+    try:
+        from dataset_registry import register_dataset, release_dataset
+        from ingest import detect_format
+        from incremental import run_incremental
+        from pipeline import run_pipeline
+        from plot_executor import execute_plan
+        from plot_graphs import save_plot_png
+        from structured_output import typed_output
+        from viz_validator import validate_and_repair
+        from tracing import export_chrome
+
+        if incremental and detect_format(path) == "csv":
+            update = run_incremental(path, parallel=parallel, use_cache=use_cache, viz_planner=viz_planner)
+            dataset, result = update.dataset, update.result
+            row.update(rows_ingested=update.rows_ingested, total_rows=update.total_rows,
+                       drift=update.drift, reran_llm=update.reran_llm)
+        else:
+            dataset = register_dataset(path)
+            result = run_pipeline(dataset, parallel=parallel, use_cache=use_cache, viz_planner=viz_planner)
+        outputs = result.tasks_output
+
+        for index, name in TEXT_OUTPUTS.items():
+            with open(os.path.join(target, name), "w") as fh:
+                fh.write(str(outputs[index].raw))
+        # repaired locally, or the failed task alone is re-run
+        models = {index: typed_output(result, index, dataset) for index in JSON_OUTPUTS}
+        payloads = {index: model.model_dump() if model else None for index, model in models.items()}
+        for index, name in JSON_OUTPUTS.items():
+            _write_json(os.path.join(target, name), payloads[index] or {"raw": str(outputs[index].raw)})
+
+        plot_start = time.perf_counter()
+        plots, plan_report = validate_and_repair((payloads[3] or {}).get("plots", []), dataset)
+        rendered = []
+        for i, data in enumerate(execute_plan(dataset, plots)):
+            if data is None:
+                continue
+            png = os.path.join(target, "plots", f"{i + 1:02d}.png")
+            save_plot_png(data, png)
+            rendered.append(os.path.relpath(png, target))
+        release_dataset(dataset.key)
+
+        export_chrome(result.trace, os.path.join(target, TRACE_FILE))
+        timings = dict(result.timings)
+        timings["plots"] = time.perf_counter() - plot_start
+        timings["total"] = time.perf_counter() - start
+        row.update(status="done", timings=timings, plots=rendered, viz_plan_valid=payloads[3] is not None,
+                   plot_checks=[r for r in plan_report if r["status"] != "ok"])
+        _write_json(os.path.join(target, DONE_MARKER), {**row, "signature": signature})
+    except Exception:
+        row.update(status="failed", error=traceback.format_exc(),
+                   timings={"total": time.perf_counter() - start})
+    return row
+
+
+# ---- BATCH ----
+def expand_inputs(patterns):
+    files = []
+    for pattern in patterns:
+        files.extend(glob.glob(pattern, recursive=True))
+    return sorted(dict.fromkeys(os.path.abspath(f) for f in files if f.lower().endswith(INPUT_EXTENSIONS)))
+
+
+def run_batch(patterns, out_dir=DEFAULT_OUT_DIR, workers=DEFAULT_WORKERS,
+              parallel=False, use_cache=True, force=False, viz_planner="llm", incremental=False):
+    """Analyze every CSV matched by ``patterns`` on a pool of ``workers`` processes.
+
+    Writes ``summary.json`` after every finished file, so progress survives
+    a crash; finished files are skipped on the next run unless ``force``.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    files = expand_inputs(patterns)
+    summary_path = os.path.join(out_dir, SUMMARY_FILE)
+    summary = {"started": time.time(), "workers": workers, "files": {}}
+    if os.path.exists(summary_path):
+        with open(summary_path) as fh:
+            summary["files"] = json.load(fh).get("files", {})
+
+    pending = []
+    for path in files:
+        if not force and is_done(path, out_dir):
+            row = summary["files"].setdefault(path, {"file": path})
+            row.update(status="done", resumed=True)
+        else:
+            pending.append(path)
+    print(f"{len(files)} files, {len(files) - len(pending)} already done, {len(pending)} to run")
+
+    start = time.perf_counter()
+    if pending:
+        workers = max(1, min(workers, len(pending)))
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(workers,),
+        )
+        with pool:
+            futures = {
+                pool.submit(analyze_file, path, out_dir, parallel, use_cache, viz_planner, incremental): path
+                for path in pending
+            }
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    row = future.result()
+                except Exception:  # worker process died
+                    row = {"file": path, "status": "failed", "error": traceback.format_exc()}
+                summary["files"][path] = row
+                _write_json(summary_path, summary)
+                took = row.get("timings", {}).get("total", 0.0)
+                print(f"[{row['status']}] {os.path.basename(path)} ({took:.1f}s)")
+
+    statuses = [row.get("status") for row in summary["files"].values()]
+    summary["wall_seconds"] = time.perf_counter() - start
+    summary["done"] = statuses.count("done")
+    summary["failed"] = statuses.count("failed")
+    _write_json(summary_path, summary)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("patterns", nargs="+", help="CSV files or glob patterns (quote them)")
+    parser.add_argument("--out", default=DEFAULT_OUT_DIR, help="output directory")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="files analyzed at once")
+    parser.add_argument("--parallel", action="store_true", help="run the viz branch alongside the analysis")
+    parser.add_argument("--no-cache", action="store_true", help="ignore cached task outputs")
+    parser.add_argument("--force", action="store_true", help="re-run files that already finished")
+    parser.add_argument("--viz-planner", choices=("llm", "rules"), default="llm",
+                        help="plan charts with the viz agent or the rule-based planner")
+    parser.add_argument("--incremental", action="store_true",
+                        help="ingest only rows appended to each CSV since its last run")
+    args = parser.parse_args()
+
+    summary = run_batch(args.patterns, args.out, args.workers, args.parallel,
+                        not args.no_cache, args.force, args.viz_planner, args.incremental)
+    print(f"{summary['done']} done, {summary['failed']} failed in {summary['wall_seconds']:.1f}s "
+          f"-> {os.path.join(args.out, SUMMARY_FILE)}")
+    sys.exit(1 if summary["failed"] else 0)
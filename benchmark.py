@@ -0,0 +1,331 @@
+"""Time and memory-profile the non-LLM stages on synthetic data.
+
+    python benchmark.py --rows 1000 100000 1000000 --out bench.json
+    python benchmark.py --rows 100000 --baseline bench.json   # fail on regressions
+    python benchmark.py --startup --rows                      # import cost per module only
+
+Each stage is timed ``--repeats`` times, then run once more under
+tracemalloc for its peak allocation. LLM calls in the pipeline stage go to
+FakeLLM, which returns canned outputs instantly, so only orchestration
+overhead is measured. ``--startup`` adds the import time of each app
+module, each in a fresh interpreter, and the one-off agent build.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any
+
+import matplotlib
+
+matplotlib.use("Agg")
+
+# get_llms() needs a provider key; the benchmark never reaches a real provider
+for _var in ("GROQ_API_KEY", "DEEPSEEK_API_KEY", "OPENROUTER_API_KEY"):
+    os.environ.setdefault(_var, "benchmark")
+os.environ.setdefault("CREWAI_TRACING_ENABLED", "false")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+
+from crewai.llms.base_llm import BaseLLM  # noqa: E402
+
+# ---- SETTINGS ----
+DEFAULT_ROWS = [1_000, 100_000, 1_000_000]
+DEFAULT_REPEATS = 3
+DATA_DIR = os.path.join(os.getenv("LDA_CACHE_DIR", ".cache"), "benchmark")
+REGRESSION_TOLERANCE = 0.2    # 20% slower than the baseline counts as a regression
+MIN_REGRESSION_SECONDS = 0.01  # ignore noise on stages faster than this
+STARTUP_MODULES = ["pandas", "matplotlib", "streamlit", "crewai", "litellm", "dataset_registry",
+                   "figure_renderer", "plot_graphs", "job_queue", "pipeline", "app_imports"]
+
+# Canned plan on the export schema; also the plot workload of the plot stages
+BENCH_PLOTS = [
+    {"metric": "Shipments by carrier", "chart_type": "bar", "x": "carrier_name", "y": None,
+     "column": None, "aggregation": "count", "top_k": 10, "insight": "volume"},
+    {"metric": "Mean delay by vehicle", "chart_type": "bar", "x": "vehicle_type", "y": "delay_duration_days",
+     "column": None, "aggregation": "mean", "top_k": None, "insight": "delay"},
+    {"metric": "Delay duration", "chart_type": "histogram", "x": "delay_duration_days", "y": None,
+     "column": None, "aggregation": None, "top_k": None, "insight": "spread"},
+    {"metric": "Weight vs delay", "chart_type": "scatter", "x": "shipment_weight_kg", "y": "delay_duration_days",
+     "column": None, "aggregation": None, "top_k": None, "insight": "size"},
+    {"metric": "Delay over time", "chart_type": "line", "x": "scheduled_pickup_date", "y": "delay_duration_days",
+     "column": None, "aggregation": "mean", "top_k": None, "insight": "trend"},
+    {"metric": "Shipment types", "chart_type": "pie", "x": None, "y": None,
+     "column": "shipment_type", "aggregation": None, "top_k": None, "insight": "mix"},
+]
+CANNED_INTERPRETATION = {
+    "chart_explanation": [{"metric": plot["metric"], "explanation": ["canned"]} for plot in BENCH_PLOTS]
+}
+CANNED_TEXT = "- canned benchmark finding"
+
+
+class FakeLLM(BaseLLM):
+    """Instant, deterministic stand-in for every agent's LLM."""
+
+    calls: int = 0
+    outputs: dict = {}
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, response_model=None) -> Any:
+        self.calls += 1
+        model = response_model or getattr(from_task, "output_pydantic", None)
+        payload = self.outputs.get(getattr(model, "__name__", None))
+        if payload is None:
+            payload = CANNED_TEXT
+        elif response_model is not None:
+            return json.dumps(payload)
+        else:
+            payload = json.dumps(payload)
+        return f"Thought: I now know the final answer\nFinal Answer: {payload}"
+
+    def supports_function_calling(self):
+        return False
+
+    def supports_stop_words(self):
+        return True
+
+    def get_context_window_size(self):
+        return 128_000
+
+
+def fake_agents(pipeline):
+    """Point every pipeline agent at one FakeLLM and return it."""
+    llm = FakeLLM(model="fake", outputs={"VizPlan": {"plots": BENCH_PLOTS},
+                                         "InterpretationPlan": CANNED_INTERPRETATION})
+    for agent in (pipeline.data_agent, pipeline.delay_agent, pipeline.recommendation_agent,
+                  pipeline.viz_agent, pipeline.viz_interpreter_agent):
+        agent.llm = llm
+    return llm
+
+
+# ---- DATA ----
+def dataset_path(rows, seed, data_dir=DATA_DIR):
+    from synthetic_data import write_csv
+
+    path = os.path.join(data_dir, f"synthetic_{rows}_seed{seed}.csv")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        write_csv(path, rows, seed)
+    return path
+
+
+# ---- STAGES ----
+def _stages(path, with_pipeline):
+    """(name, setup, run) triples; setup is untimed and returns run's argument."""
+    import dataset_registry
+    import plot_executor
+    from CSV_Loaded import CSVLoaderTool
+    from Stats_Generator import StatsTool
+    from ingest import parquet_cache_path
+    import figure_renderer
+    import tool_cache
+
+    def fresh_handle():
+        dataset_registry._REGISTRY.clear()
+        return dataset_registry.register_dataset(path)
+
+    def cold():
+        handle = fresh_handle()
+        cached = parquet_cache_path(handle.key)
+        if cached and os.path.exists(cached):
+            os.remove(cached)
+        dataset_registry._REGISTRY.clear()
+
+    def render(handle):
+        plot_data = [d for d in plot_executor.execute_plan(handle, BENCH_PLOTS) if d is not None]
+        return figure_renderer.render_figures(plot_data)
+
+    def clear_figures():
+        figure_renderer._MEMO.clear()
+        shutil.rmtree(figure_renderer.FIGURE_DIR, ignore_errors=True)
+        return clear_memo()
+
+    def clear_memo():
+        handle = dataset_registry.register_dataset(path)
+        plot_executor._MEMO.clear()
+        tool_cache.clear()
+        return handle
+
+    def warm_stats():
+        # a second call by path, as an agent would repeat it
+        StatsTool()._run(path)
+        return path
+
+    stages = [
+        ("load_csv_cold", cold, lambda _: dataset_registry.register_dataset(path)),
+        ("load_parquet_cache", lambda: dataset_registry._REGISTRY.clear(),
+         lambda _: dataset_registry.register_dataset(path)),
+    ]
+    if with_pipeline:
+        import pipeline
+
+        fake_agents(pipeline)
+        stages.append(("create_tasks", fresh_handle, pipeline.create_tasks))
+    stages += [
+        ("stats_tool", clear_memo, lambda handle: StatsTool()._run(handle.key)),
+        ("csv_loader_tool", clear_memo, lambda handle: CSVLoaderTool()._run(handle.key)),
+        ("stats_tool_repeat", warm_stats, lambda p: StatsTool()._run(p)),
+        ("plot_aggregations", clear_memo, lambda handle: plot_executor.execute_plan(handle, BENCH_PLOTS)),
+        ("plot_render", clear_figures, render),
+        ("plot_render_cached", lambda: dataset_registry.register_dataset(path), render),
+    ]
+    if with_pipeline:
+        stages.append(("pipeline_fake_llm", fresh_handle,
+                       lambda handle: pipeline.run_pipeline(handle, use_cache=False)))
+    return stages
+
+
+def run_stage(setup, run, repeats, measure_memory=True):
+    timings = []
+    # crewai prints every agent step; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeats):
+            arg = setup()
+            start = time.perf_counter()
+            run(arg)
+            timings.append(time.perf_counter() - start)
+        peak_mb = None
+        if measure_memory:
+            arg = setup()
+            tracemalloc.start()
+            try:
+                run(arg)
+                peak_mb = tracemalloc.get_traced_memory()[1] / 1e6
+            finally:
+                tracemalloc.stop()
+    return {
+        "seconds_min": round(min(timings), 5),
+        "seconds_median": round(statistics.median(timings), 5),
+        "seconds": [round(t, 5) for t in timings],
+        "peak_mb": round(peak_mb, 3) if peak_mb is not None else None,
+    }
+
+
+# ---- STARTUP ----
+APP_IMPORTS = ("import cache_gc, dataset_registry, figure_renderer, job_queue, pipeline, plot_graphs, "
+               "rule_planner, structured_output, tracing, viz_validator")
+
+
+def _import_seconds(statement):
+    # Cumulative import time of everything ``statement`` pulls in, from -X importtime
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", statement], capture_output=True,
+                          text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        return None
+    total = 0
+    for line in proc.stderr.splitlines():
+        parts = line.split("|")
+        # top-level imports have no indentation in the package column
+        if len(parts) == 3 and parts[1].strip().isdigit() and not parts[2].startswith("  "):
+            total += int(parts[1])
+    return round(total / 1e6, 3)
+
+
+def startup_report():
+    """Import seconds per module in a fresh interpreter, plus building the agents."""
+    report = {}
+    for module in STARTUP_MODULES:
+        statement = APP_IMPORTS if module == "app_imports" else f"import {module}"
+        report[module] = _import_seconds(statement)
+        shown = f"{report[module]:>7.3f}s" if report[module] is not None else "  failed"
+        print(f"  import {module:<18} {shown}")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        import pipeline
+
+        pipeline.get_agents()
+    report["get_agents"] = round(time.perf_counter() - start, 3)
+    print(f"  {'get_agents (first)':<25} {report['get_agents']:>7.3f}s")
+    return report
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+
+def run_benchmark(rows_list=DEFAULT_ROWS, repeats=DEFAULT_REPEATS, seed=0, with_pipeline=True,
+                  measure_memory=True, data_dir=DATA_DIR):
+    import numpy
+    import pandas
+
+    results = []
+    for rows in rows_list:
+        start = time.perf_counter()
+        path = dataset_path(rows, seed, data_dir)
+        print(f"{rows:,} rows ({os.path.getsize(path) / 1e6:.1f} MB, ready in {time.perf_counter() - start:.1f}s)")
+        for name, setup, run in _stages(path, with_pipeline):
+            row = {"rows": rows, "stage": name, **run_stage(setup, run, repeats, measure_memory)}
+            results.append(row)
+            peak = f"{row['peak_mb']:>9.1f} MB" if row["peak_mb"] is not None else ""
+            print(f"  {name:<20} {row['seconds_min']:>9.4f}s {peak}")
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pandas": pandas.__version__,
+            "numpy": numpy.__version__,
+            "platform": platform.platform(),
+            "seed": seed,
+            "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Stages whose best time got more than ``tolerance`` slower than the baseline."""
+    before = {(r["rows"], r["stage"]): r for r in baseline["results"]}
+    regressions = []
+    for row in current["results"]:
+        old = before.get((row["rows"], row["stage"]))
+        if old is None or row["seconds_min"] < MIN_REGRESSION_SECONDS:
+            continue
+        ratio = row["seconds_min"] / max(old["seconds_min"], 1e-9)
+        if ratio > 1 + tolerance:
+            regressions.append({"rows": row["rows"], "stage": row["stage"], "before": old["seconds_min"],
+                                "after": row["seconds_min"], "ratio": round(ratio, 3)})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="*", default=DEFAULT_ROWS)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where generated CSVs are kept and reused")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--no-pipeline", action="store_true", help="skip create_tasks and the fake-LLM run")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--baseline", help="previous results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--startup", action="store_true", help="also time module imports and the agent build")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.rows, args.repeats, args.seed, not args.no_pipeline,
+                           not args.no_memory, args.data_dir)
+    if args.startup:
+        print("startup")
+        report["startup"] = startup_report()
+    if args.baseline:
+        with open(args.baseline) as fh:
+            report["regressions"] = compare(report, json.load(fh), args.tolerance)
+    with open(args.out, "w") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"results -> {args.out}")
+
+    for reg in report.get("regressions", []):
+        print(f"REGRESSION {reg['stage']} @ {reg['rows']:,} rows: "
+              f"{reg['before']:.4f}s -> {reg['after']:.4f}s (x{reg['ratio']})")
+    sys.exit(1 if report.get("regressions") else 0)
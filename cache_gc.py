@@ -0,0 +1,117 @@
+"""Lifecycle policy for the on-disk file caches under LDA_CACHE_DIR.
+
+Spooled uploads, Parquet copies, delay cubes, saved traces and figures
+are deleted once unused for ``FILE_CACHE_TTL_SECONDS``; if what remains
+is larger than ``FILE_CACHE_MAX_BYTES`` the least recently used files go
+first. Files of registered datasets and of queued or running jobs are
+never removed, and ``*.tmp`` leftovers of crashed writes are swept after
+an hour.
+
+    python cache_gc.py --dry-run
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+from dataset_registry import UPLOAD_DIR, _LOCK, _REGISTRY
+from delay_cube import CUBE_DIR, cube_path
+from figure_renderer import FIGURE_DIR
+from ingest import PARQUET_DIR, parquet_cache_path
+from tracing import TRACE_DIR
+
+# ---- SETTINGS ----
+FILE_CACHE_TTL_SECONDS = int(os.getenv("LDA_FILE_CACHE_TTL_SECONDS", 3 * 24 * 3600))
+FILE_CACHE_MAX_BYTES = int(os.getenv("LDA_FILE_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+TMP_GRACE_SECONDS = 3600
+GC_INTERVAL_SECONDS = 15 * 60  # maybe_collect() runs at most this often per process
+CACHE_DIRS = (UPLOAD_DIR, PARQUET_DIR, CUBE_DIR, TRACE_DIR, FIGURE_DIR)
+
+_last_run = 0.0
+_run_lock = threading.Lock()
+
+
+def _files(dirs):
+    for directory in dirs:
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if entry.is_file():
+                stat = entry.stat()
+                yield entry.path, stat.st_size, stat.st_mtime
+
+
+def in_use_paths():
+    """Files that must survive: registered datasets and pending jobs' inputs."""
+    with _LOCK:
+        handles = list(_REGISTRY.values())
+    paths = set()
+    for handle in handles:
+        paths.update(p for p in (handle.path, parquet_cache_path(handle.key), cube_path(handle.key)) if p)
+    try:
+        from job_queue import JOB_DB_PATH, QUEUED, RUNNING, _connect
+        if os.path.exists(JOB_DB_PATH):
+            with _connect() as conn:
+                rows = conn.execute(
+                    "SELECT dataset_path, dataset_key FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+                ).fetchall()
+            for row in rows:
+                # jobs from before dataset_key was stored: spooled uploads are named by key
+                key = row["dataset_key"] or os.path.splitext(os.path.basename(row["dataset_path"]))[0]
+                paths.update(p for p in (row["dataset_path"], parquet_cache_path(key), cube_path(key)) if p)
+    except Exception:  # no job store yet / locked: registered datasets still protected
+        pass
+    return {os.path.abspath(p) for p in paths}
+
+
+def collect(dirs=CACHE_DIRS, ttl=FILE_CACHE_TTL_SECONDS, max_bytes=FILE_CACHE_MAX_BYTES, dry_run=False):
+    """Apply the TTL and size policy once; returns what was (or would be) removed."""
+    now = time.time()
+    keep = in_use_paths()
+    removed, kept = [], []
+    for path, size, mtime in _files(dirs):
+        if os.path.abspath(path) in keep:
+            continue
+        if path.endswith(".tmp"):  # in-flight writes are left alone
+            if now - mtime > TMP_GRACE_SECONDS:
+                removed.append((path, size, mtime))
+            continue
+        (removed if now - mtime > ttl else kept).append((path, size, mtime))
+
+    total = sum(size for _, size, _ in kept)
+    for entry in sorted(kept, key=lambda e: e[2]):  # least recently used first
+        if total <= max_bytes:
+            break
+        removed.append(entry)
+        total -= entry[1]
+
+    freed = 0
+    for path, size, _ in removed:
+        if not dry_run:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+        freed += size
+    return {"removed": [path for path, _, _ in removed], "freed_bytes": freed,
+            "remaining_bytes": total, "dry_run": dry_run}
+
+
+def maybe_collect():
+    """collect() if the last run in this process is older than GC_INTERVAL_SECONDS."""
+    global _last_run
+    with _run_lock:
+        if time.time() - _last_run < GC_INTERVAL_SECONDS:
+            return None
+        _last_run = time.time()
+    return collect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="list what would be removed")
+    parser.add_argument("--ttl", type=int, default=FILE_CACHE_TTL_SECONDS, help="seconds unused before removal")
+    parser.add_argument("--max-bytes", type=int, default=FILE_CACHE_MAX_BYTES)
+    args = parser.parse_args()
+    print(json.dumps(collect(ttl=args.ttl, max_bytes=args.max_bytes, dry_run=args.dry_run), indent=2))
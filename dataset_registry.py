@@ -0,0 +1,426 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+import pandas as pd
+
+from delay_analytics import aggregate_delay_chunks, aggregate_delays
+from delay_cube import DelayCube, build_cube, build_cube_chunks, cube_path
+from delay_features import add_delay_features
+from ingest import SCHEMA_FALLBACKS, detect_format, fold_frames, iter_frames, load_frame
+from streaming_profiler import profile_chunks, profile_frame
+from tracing import span
+
+# ---- REGISTRY STATE ----
+# Every dataset is parsed exactly once and kept here, keyed by content hash.
+# The pipeline, the tools and the plotting code all look datasets up by key
+# instead of re-reading the CSV. The registry is an LRU bounded by count and
+# resident bytes; evicted handles drop their frame.
+_REGISTRY = OrderedDict()
+_LOCK = threading.Lock()
+_STATS = {"parses": 0, "parse_seconds": 0.0, "lookups": 0, "parquet_cache_hits": 0, "evictions": 0}
+
+REGISTRY_MAX_DATASETS = int(os.getenv("LDA_REGISTRY_DATASETS", 4))
+REGISTRY_MAX_BYTES = int(os.getenv("LDA_REGISTRY_MB", 2048)) * 1024 * 1024
+
+HASH_CHUNK_BYTES = 1 << 20
+# Uploads are kept on disk by content hash so worker processes can open them
+UPLOAD_DIR = os.path.join(os.getenv("LDA_CACHE_DIR", ".cache"), "uploads")
+# Files above this size are not materialized on registration; their prompt
+# metadata comes from the streaming profiler instead.
+LAZY_LOAD_BYTES = int(os.getenv("LDA_LAZY_LOAD_BYTES", 512 * 1024 * 1024))
+
+
+@dataclass
+class DatasetHandle:
+    key: str
+    source: str
+    parse_seconds: float = 0.0
+    path: Optional[str] = None
+    format: str = "csv"
+    derived: dict = field(default_factory=dict)  # columns computed from timestamps -> formula
+    end_offset: Optional[int] = None  # snapshot of a growing CSV: only its first end_offset bytes
+    schema: Optional[dict] = None  # CSV schema for chunked reads; inferred (and widened) when None
+    _df: Optional[pd.DataFrame] = field(default=None, repr=False)
+    _profile: object = field(default=None, repr=False)
+    _delay_aggregates: object = field(default=None, repr=False)
+    _delay_cube: object = field(default=None, repr=False)
+    _nbytes: Optional[int] = field(default=None, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def df(self):
+        # Lazily parsed handles materialize on first access, once.
+        df = self._df
+        if df is None:
+            with self._lock:
+                if self._df is None:
+                    self._df, self.parse_seconds, self.format, self.derived = _parse(
+                        self.path, self.key, self.end_offset, self.schema)
+                df = self._df
+            _store(self)  # back in the registry (and its byte budget) if it was evicted
+        return df
+
+    @property
+    def is_loaded(self):
+        return self._df is not None
+
+    @property
+    def schema_fallbacks(self):
+        # Columns kept as raw strings because the inferred type lost values
+        return dict(self._df.attrs.get(SCHEMA_FALLBACKS, {})) if self.is_loaded else {}
+
+    @property
+    def columns(self):
+        return list(self._df.columns) if self.is_loaded else self.profile().columns
+
+    @property
+    def row_count(self):
+        return len(self._df) if self.is_loaded else self.profile().total_rows
+
+    def profile(self):
+        # Bounded-memory profile; streamed from disk when the frame is not loaded.
+        if self._profile is None:
+            with self._lock:
+                if self._profile is None:
+                    if self._df is not None:
+                        self._profile = profile_frame(self._df)
+                    else:
+                        self._profile = self.fold_frames(profile_chunks)
+        return self._profile
+
+    def delay_aggregates(self):
+        # Exact delay facts; chunked over the file when the frame is not loaded.
+        if self._delay_aggregates is None:
+            with self._lock:
+                if self._delay_aggregates is None:
+                    if self._df is not None:
+                        self._delay_aggregates = aggregate_delays(self._df)
+                    else:
+                        self._delay_aggregates = self.fold_frames(aggregate_delay_chunks)
+        return self._delay_aggregates
+
+    def iter_frames(self, schema=None):
+        # Bounded-memory chunks of the file, with the same derived columns as df
+        return featured_frames(iter_frames(self.path, key=self.key, end=self.end_offset,
+                                           schema=schema or self.schema), self.derived)
+
+    def fold_frames(self, fold):
+        # fold(chunks) over the whole file; a late schema fallback restarts it,
+        # and the relaxed schema is kept for the next chunked read
+        result, self.schema = fold_frames(fold, self.iter_frames, self.schema)
+        return result
+
+    def delay_cube(self):
+        # Drill-down cube; built once per content hash and kept on disk with the dataset
+        if self._delay_cube is None:
+            with self._lock:
+                if self._delay_cube is None:
+                    self._delay_cube = _load_cube(self)
+        return self._delay_cube
+
+    def memory_bytes(self):
+        df = self._df
+        if df is None:
+            return 0
+        if self._nbytes is None:
+            self._nbytes = int(df.memory_usage(deep=True).sum())
+        return self._nbytes
+
+    def unload(self):
+        # Drop the frame and per-frame results; a file-backed handle re-parses on next use
+        with self._lock:
+            self._df, self._nbytes = None, None
+            self._delay_aggregates = self._delay_cube = None
+
+
+def featured_frames(chunks, derived=None):
+    """Chunks with the derived delay columns added; their formulas go into ``derived``."""
+    for chunk in chunks:
+        chunk, formulas = add_delay_features(chunk)
+        if derived is not None:
+            derived.update(formulas)
+        yield chunk
+
+
+def _load_cube(handle):
+    path = cube_path(handle.key)
+    try:
+        cube = DelayCube.load(path)
+        _touch(path)
+        return cube
+    except (OSError, ValueError, KeyError):  # missing, stale or unreadable: rebuild
+        pass
+    with span("build_delay_cube") as s:
+        if handle._df is not None:
+            cube = build_cube(handle._df)
+        else:
+            cube = handle.fold_frames(build_cube_chunks)
+        s.set(cells=cube.cells if cube is not None else 0)
+    if cube is not None:
+        cube.save(path)
+    return cube
+
+
+# ---- HASHING ----
+def _hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(HASH_CHUNK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _hash_frame(df):
+    row_hashes = pd.util.hash_pandas_object(df, index=False).values
+    return _hash_bytes(row_hashes.tobytes() + "|".join(map(str, df.columns)).encode())
+
+
+# ---- PARSING ----
+def _parse(source, key, end=None, schema=None):
+    # Typed load; CSVs come from the Parquet cache after their first parse.
+    # Snapshots (``end``) are read from the file's first ``end`` bytes only,
+    # with ``schema`` when given
+    start = time.perf_counter()
+    if isinstance(source, (bytes, bytearray)):
+        size = len(source)
+    else:
+        size = end if end is not None else os.path.getsize(source)
+    with span("parse_dataset", bytes=size) as s:
+        if end is not None:
+            chunks, _ = fold_frames(list, lambda relaxed: iter_frames(source, end=end, schema=relaxed), schema)
+            df, fmt = (pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()), "csv"
+        else:
+            df, fmt = load_frame(source, key)
+        s.set(rows=len(df), format=fmt)
+    with span("delay_features") as s:
+        # derived after the Parquet cache write, so the cache holds the file as is
+        df, derived = add_delay_features(df)
+        s.set(columns=len(derived))
+    elapsed = time.perf_counter() - start
+    with _LOCK:
+        _STATS["parses"] += 1
+        _STATS["parse_seconds"] += elapsed
+        _STATS["parquet_cache_hits"] += fmt == "parquet-cache"
+    return df, elapsed, fmt, derived
+
+
+def _recall(key):
+    # Registry lookup that marks the handle as recently used; caller holds _LOCK
+    handle = _REGISTRY.get(key)
+    if handle is not None:
+        _REGISTRY.move_to_end(key)
+    return handle
+
+
+def _store(handle):
+    with _LOCK:
+        existing = _recall(handle.key)
+        if existing is not None:
+            return existing
+        _REGISTRY[handle.key] = handle
+    _evict()
+    return handle
+
+
+def _evict():
+    """Drop least recently used handles over REGISTRY_MAX_DATASETS / REGISTRY_MAX_BYTES.
+
+    The most recent handle always stays, however large.
+    """
+    evicted = []
+    with _LOCK:
+        total = sum(h.memory_bytes() for h in _REGISTRY.values())
+        while len(_REGISTRY) > 1 and (len(_REGISTRY) > REGISTRY_MAX_DATASETS or total > REGISTRY_MAX_BYTES):
+            _, handle = _REGISTRY.popitem(last=False)
+            total -= handle.memory_bytes()
+            evicted.append(handle)
+        _STATS["evictions"] += len(evicted)
+    for handle in evicted:
+        # frames without a file behind them stay with whoever still holds the handle
+        if handle.path is not None:
+            handle.unload()
+
+
+def register_dataset(source, name=None, lazy=None):
+    """Parse ``source`` once and return its shared handle.
+
+    ``source`` may be a CSV, Parquet or Arrow file path, raw bytes, a
+    file-like object (e.g. a Streamlit upload) or a loaded DataFrame. Registering the same
+    content twice returns the existing handle without parsing again.
+    Paths larger than ``LAZY_LOAD_BYTES`` (or ``lazy=True``) are only
+    parsed when ``handle.df`` is first accessed.
+    """
+    if isinstance(source, DatasetHandle):
+        return _store(source)
+
+    if isinstance(source, pd.DataFrame):
+        key = _hash_frame(source)
+        with _LOCK:
+            existing = _recall(key)
+        if existing is not None:
+            return existing
+        df, derived = add_delay_features(source)
+        return _store(DatasetHandle(key=key, source=name or "dataframe", _df=df, derived=derived))
+
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        return _register_path(path, _hash_file(path), name or os.path.basename(path), lazy)
+
+    # bytes or file-like upload: spooled to disk once, then parsed from the file
+    key, path = _spool_upload(source)
+    return _register_path(path, key, name or getattr(source, "name", "upload"), lazy)
+
+
+def _register_path(path, key, name, lazy):
+    with _LOCK:
+        existing = _recall(key)
+    if existing is not None:
+        return existing
+    if lazy is None:
+        lazy = os.path.getsize(path) > LAZY_LOAD_BYTES
+    handle = DatasetHandle(key=key, source=name, path=path)
+    if not lazy:
+        handle._df, handle.parse_seconds, handle.format, handle.derived = _parse(path, key)
+    return _store(handle)
+
+
+# ---- UPLOAD SPOOL ----
+def _upload_path(key, head):
+    return os.path.join(UPLOAD_DIR, f"{key}.{detect_format(bytes(head))}")
+
+
+def _spool_upload(source):
+    """Write an upload to ``UPLOAD_DIR/<sha256>.<format>`` once; returns (key, path).
+
+    In-memory uploads (bytes, BytesIO / Streamlit's UploadedFile) are hashed
+    through a zero-copy view and only written when the file is missing, so
+    Streamlit reruns cost one hash and no disk writes. Other file objects
+    are hashed while they are streamed to disk.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return _spool_buffer(memoryview(source))
+    if hasattr(source, "getbuffer"):
+        with source.getbuffer() as view:
+            return _spool_buffer(view)
+
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    tmp = os.path.join(UPLOAD_DIR, f"upload.{os.getpid()}.{threading.get_ident()}.tmp")
+    digest = hashlib.sha256()
+    head = b""
+    if hasattr(source, "seek"):
+        source.seek(0)
+    try:
+        with open(tmp, "wb") as fh:
+            for block in iter(lambda: source.read(HASH_CHUNK_BYTES), b""):
+                head = head or block[:8]
+                digest.update(block)
+                fh.write(block)
+        key = digest.hexdigest()
+        path = _upload_path(key, head)
+        if os.path.exists(path):
+            os.remove(tmp)
+            _touch(path)
+        else:
+            os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return key, path
+
+
+def _spool_buffer(view):
+    key = _hash_bytes(view)
+    path = _upload_path(key, view[:8])
+    if os.path.exists(path):
+        _touch(path)
+        return key, path
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as fh:
+            for offset in range(0, len(view), HASH_CHUNK_BYTES):
+                fh.write(view[offset:offset + HASH_CHUNK_BYTES])
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return key, path
+
+
+def _touch(path):
+    # mtime doubles as "last used" for the cache GC
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def get_dataset(key):
+    with _LOCK:
+        _STATS["lookups"] += 1
+        handle = _recall(key)
+    if handle is None:
+        raise KeyError(f"Unknown dataset key: {key}")
+    return handle
+
+
+def resolve_dataset(dataset):
+    """Accept a handle, a registry key, a DataFrame or a CSV path."""
+    if isinstance(dataset, DatasetHandle):
+        return dataset
+    if isinstance(dataset, str):
+        with _LOCK:
+            handle = _recall(dataset)
+        if handle is not None:
+            with _LOCK:
+                _STATS["lookups"] += 1
+            return handle
+        if os.path.exists(dataset):
+            return register_dataset(dataset)
+        raise KeyError(f"Unknown dataset key or path: {dataset}")
+    return register_dataset(dataset)
+
+
+def release_dataset(key):
+    with _LOCK:
+        _REGISTRY.pop(key, None)
+
+
+# ---- REPORT ----
+def load_report():
+    """Parse count, parse latency and resident size of registered datasets."""
+    with _LOCK:
+        handles = list(_REGISTRY.values())
+        stats = dict(_STATS)
+    return {
+        "parses": stats["parses"],
+        "parse_seconds": round(stats["parse_seconds"], 4),
+        "lookups": stats["lookups"],
+        "parquet_cache_hits": stats["parquet_cache_hits"],
+        "evictions": stats["evictions"],
+        "datasets": [
+            {
+                "key": h.key[:12],
+                "source": h.source,
+                "format": h.format,
+                "loaded": h.is_loaded,
+                "rows": h.row_count,
+                "columns": len(h.columns),
+                "memory_mb": round(h.memory_bytes() / 1e6, 3),
+                "parse_seconds": round(h.parse_seconds, 4),
+                "schema_fallbacks": h.schema_fallbacks,
+            }
+            for h in handles
+        ],
+    }
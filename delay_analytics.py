@@ -0,0 +1,264 @@
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+# ---- COLUMN ROLES ----
+DELAY_FLAG_COLUMNS = ("is_delayed", "delayed", "logistics_delay", "delay_flag", "is_late")
+DELAY_DURATION_COLUMNS = ("delay_duration_days", "delay_days", "delay_duration", "days_late")
+DELAY_CAUSES_COLUMNS = ("delay_causes", "delay_reasons")
+PRIMARY_CAUSE_COLUMNS = ("primary_delay_cause", "delay_reason", "delay_cause")
+GROUP_COLUMNS = ("carrier_name", "route_id", "vehicle_type", "shipment_type")
+
+TRUE_VALUES = ("true", "1", "yes", "y", "t", "delayed", "late")
+CAUSE_SEPARATOR = ","
+# Histogram edges (days) for the delay duration distribution; mergeable across chunks
+DURATION_BINS = (0, 1, 2, 3, 5, 7, 14, 30, np.inf)
+MAX_TABLE_ROWS = 10
+
+
+def detect_delay_columns(columns):
+    """Map analysis roles to the dataset's column names (None when absent)."""
+    lookup = {col.lower(): col for col in columns}
+
+    def first(candidates):
+        return next((lookup[c] for c in candidates if c in lookup), None)
+
+    return {
+        "flag": first(DELAY_FLAG_COLUMNS),
+        "duration": first(DELAY_DURATION_COLUMNS),
+        "causes": first(DELAY_CAUSES_COLUMNS),
+        "primary_cause": first(PRIMARY_CAUSE_COLUMNS),
+        "groups": [lookup[c] for c in GROUP_COLUMNS if c in lookup],
+    }
+
+
+def to_delay_flag(series):
+    # Vectorized boolean coercion of true/false, 0/1 and yes/no style columns
+    if pd.api.types.is_bool_dtype(series):
+        return series.fillna(False).astype(bool)
+    if pd.api.types.is_numeric_dtype(series):
+        return series.fillna(0).ne(0)
+    return series.astype("string").str.strip().str.lower().isin(TRUE_VALUES).fillna(False).astype(bool)
+
+
+def _add(left, right):
+    if left is None or len(left) == 0:
+        return right
+    if right is None or len(right) == 0:
+        return left
+    return left.add(right, fill_value=0)
+
+
+@dataclass
+class DelayAggregates:
+    """Exact, mergeable delay counts and sums for one dataset (or chunk)."""
+
+    roles: dict
+    rows: int = 0
+    delayed: int = 0
+    duration: dict = field(default_factory=lambda: {"n": 0, "sum": 0.0, "sumsq": 0.0, "min": np.inf, "max": -np.inf})
+    duration_hist: np.ndarray = field(default_factory=lambda: np.zeros(len(DURATION_BINS) - 1, dtype="int64"))
+    cause_counts: pd.Series = None
+    primary_cause_counts: pd.Series = None
+    cooccurrence: pd.Series = None
+    group_stats: dict = field(default_factory=dict)
+    numeric_by_flag: pd.DataFrame = None
+
+    def merge(self, other):
+        self.rows += other.rows
+        self.delayed += other.delayed
+        self.duration = {
+            "n": self.duration["n"] + other.duration["n"],
+            "sum": self.duration["sum"] + other.duration["sum"],
+            "sumsq": self.duration["sumsq"] + other.duration["sumsq"],
+            "min": min(self.duration["min"], other.duration["min"]),
+            "max": max(self.duration["max"], other.duration["max"]),
+        }
+        self.duration_hist = self.duration_hist + other.duration_hist
+        self.cause_counts = _add(self.cause_counts, other.cause_counts)
+        self.primary_cause_counts = _add(self.primary_cause_counts, other.primary_cause_counts)
+        self.cooccurrence = _add(self.cooccurrence, other.cooccurrence)
+        self.numeric_by_flag = _add(self.numeric_by_flag, other.numeric_by_flag)
+        for col, stats in other.group_stats.items():
+            self.group_stats[col] = _add(self.group_stats.get(col), stats)
+        return self
+
+    # ---- DERIVED TABLES ----
+    @property
+    def delay_rate(self):
+        return self.delayed / self.rows if self.rows else 0.0
+
+    def duration_summary(self):
+        n = self.duration["n"]
+        if not n:
+            return {}
+        mean = self.duration["sum"] / n
+        var = max(self.duration["sumsq"] / n - mean ** 2, 0.0) * (n / (n - 1) if n > 1 else 0.0)
+        return {"n": n, "mean": mean, "std": var ** 0.5, "min": self.duration["min"], "max": self.duration["max"]}
+
+    def duration_distribution(self):
+        labels = [
+            f"{int(lo)}+" if np.isinf(hi) else (f"{int(lo)}" if hi - lo == 1 else f"{int(lo)}-{int(hi) - 1}")
+            for lo, hi in zip(DURATION_BINS[:-1], DURATION_BINS[1:])
+        ]
+        return pd.Series(self.duration_hist, index=labels)
+
+    def group_table(self, col):
+        stats = self.group_stats[col]
+        table = pd.DataFrame({
+            "shipments": stats["rows"].astype("int64"),
+            "delayed": stats["delayed"].astype("int64"),
+            "delay_rate_pct": 100 * stats["delayed"] / stats["rows"],
+            "mean_delay_days": stats["duration_sum"] / stats["duration_n"].replace(0, np.nan),
+        })
+        # Most delayed shipments first; index sort keeps ties deterministic across merges
+        return table.sort_index().sort_values(["delayed", "delay_rate_pct"], ascending=False, kind="stable")
+
+    def delayed_vs_on_time(self):
+        if self.numeric_by_flag is None or self.numeric_by_flag.empty:
+            return pd.DataFrame()
+        table = self.numeric_by_flag
+        return pd.DataFrame({
+            "mean_delayed": table["sum_delayed"] / table["n_delayed"].replace(0, np.nan),
+            "mean_on_time": table["sum_on_time"] / table["n_on_time"].replace(0, np.nan),
+        })
+
+
+# ---- AGGREGATION ----
+def aggregate_delays(df, roles=None):
+    roles = roles or detect_delay_columns(df.columns)
+    agg = DelayAggregates(roles=roles, rows=len(df))
+    if roles["flag"] is None:
+        return agg
+
+    flag = to_delay_flag(df[roles["flag"]]).to_numpy()
+    agg.delayed = int(flag.sum())
+
+    duration = None
+    if roles["duration"] is not None:
+        # float math throughout, even for nullable Int columns from typed ingestion
+        duration = pd.to_numeric(df[roles["duration"]], errors="coerce").astype("float64")
+        delayed_durations = duration[flag].dropna().to_numpy(dtype="float64")
+        if len(delayed_durations):
+            agg.duration = {
+                "n": len(delayed_durations),
+                "sum": float(delayed_durations.sum()),
+                "sumsq": float((delayed_durations ** 2).sum()),
+                "min": float(delayed_durations.min()),
+                "max": float(delayed_durations.max()),
+            }
+            agg.duration_hist = np.histogram(delayed_durations, bins=np.array(DURATION_BINS, dtype="float64"))[0]
+
+    if roles["causes"] is not None:
+        causes = (
+            df[roles["causes"]].astype("string").str.lower().str.split(CAUSE_SEPARATOR)
+            .explode().str.strip()
+        )
+        causes = causes[causes.notna() & (causes != "")]
+        agg.cause_counts = causes.value_counts()
+        # Pairs of causes reported on the same shipment
+        long = causes.rename_axis("row").rename("cause").reset_index()
+        pairs = long.merge(long, on="row", suffixes=("_a", "_b"))
+        pairs = pairs[pairs["cause_a"] < pairs["cause_b"]]
+        agg.cooccurrence = pairs.groupby(["cause_a", "cause_b"]).size()
+
+    if roles["primary_cause"] is not None:
+        agg.primary_cause_counts = df[roles["primary_cause"]].dropna().astype(str).str.lower().value_counts()
+
+    base = pd.DataFrame({"delayed": flag.astype("int64")}, index=df.index)
+    if duration is not None:
+        delayed_duration = duration.where(flag)
+        base["duration_sum"] = delayed_duration.fillna(0)
+        base["duration_n"] = delayed_duration.notna().astype("int64")
+    else:
+        base["duration_sum"] = 0.0
+        base["duration_n"] = 0
+    for col in roles["groups"]:
+        grouped = base.groupby(df[col], observed=True, sort=False)
+        stats = grouped.sum()
+        stats["rows"] = grouped.size()
+        agg.group_stats[col] = stats
+
+    skip = {roles["flag"], roles["duration"]}
+    numeric = df.select_dtypes(include="number")
+    numeric = numeric.drop(columns=[c for c in skip if c in numeric.columns])
+    if not numeric.columns.empty:
+        delayed_rows, on_time_rows = numeric[flag], numeric[~flag]
+        agg.numeric_by_flag = pd.DataFrame({
+            "sum_delayed": delayed_rows.sum(),
+            "n_delayed": delayed_rows.count(),
+            "sum_on_time": on_time_rows.sum(),
+            "n_on_time": on_time_rows.count(),
+        })
+    return agg
+
+
+def aggregate_delay_chunks(chunks):
+    total = None
+    for chunk in chunks:
+        part = aggregate_delays(chunk, total.roles if total is not None else None)
+        total = part if total is None else total.merge(part)
+    return total
+
+
+# ---- PROMPT FORMATTING ----
+def _ranked(counts):
+    return counts.sort_index().sort_values(ascending=False, kind="stable").astype("int64")
+
+
+def _table(frame, float_fmt="{:.1f}"):
+    # Compact pipe table; far cheaper in tokens than a dict repr
+    frame = frame.reset_index()
+    lines = [" | ".join(str(c) for c in frame.columns)]
+    for row in frame.itertuples(index=False):
+        lines.append(" | ".join(
+            float_fmt.format(v) if isinstance(v, (float, np.floating)) and not np.isnan(v) else str(v)
+            for v in row
+        ))
+    return "\n".join(lines)
+
+
+def format_delay_facts(agg, max_rows=MAX_TABLE_ROWS):
+    """Render the aggregates as short text tables for the LLM prompt."""
+    roles = agg.roles
+    if roles["flag"] is None:
+        return "No explicit delay flag column was found; delay facts could not be precomputed."
+
+    sections = [
+        f"Delay flag column: {roles['flag']}",
+        f"Shipments: {agg.rows} | delayed: {agg.delayed} ({100 * agg.delay_rate:.1f}%) | "
+        f"on time: {agg.rows - agg.delayed} ({100 * (1 - agg.delay_rate):.1f}%)",
+    ]
+
+    summary = agg.duration_summary()
+    if summary:
+        sections.append(
+            f"{roles['duration']} over delayed shipments: mean {summary['mean']:.2f}, "
+            f"std {summary['std']:.2f}, min {summary['min']:g}, max {summary['max']:g}"
+        )
+        dist = agg.duration_distribution()
+        sections.append("Delay days distribution: " + ", ".join(f"{k}: {v}" for k, v in dist.items()))
+
+    if agg.cause_counts is not None and len(agg.cause_counts):
+        counts = _ranked(agg.cause_counts).head(max_rows)
+        share = 100 * counts / max(agg.delayed, 1)
+        sections.append(
+            f"Delay causes ({roles['causes']}, multi-label, % of delayed shipments):\n"
+            + _table(pd.DataFrame({"shipments": counts, "pct_of_delayed": share}).rename_axis("cause"))
+        )
+    if agg.primary_cause_counts is not None and len(agg.primary_cause_counts):
+        counts = _ranked(agg.primary_cause_counts).head(max_rows)
+        sections.append(f"Primary cause ({roles['primary_cause']}): " + ", ".join(f"{k}: {v}" for k, v in counts.items()))
+    if agg.cooccurrence is not None and len(agg.cooccurrence):
+        top_pairs = _ranked(agg.cooccurrence).head(max_rows)
+        sections.append("Causes reported together: " + ", ".join(f"{a}+{b}: {n}" for (a, b), n in top_pairs.items()))
+
+    for col in roles["groups"]:
+        sections.append(f"Delay rate by {col}:\n" + _table(agg.group_table(col).head(max_rows).rename_axis(col)))
+
+    vs = agg.delayed_vs_on_time()
+    if not vs.empty:
+        sections.append("Delayed vs on-time means:\n" + _table(vs.rename_axis("column"), "{:.2f}"))
+
+    return "\n\n".join(sections)
@@ -0,0 +1,225 @@
+"""Pre-aggregated delay cube for interactive drill-down without the LLM.
+
+Delay counts and duration sums are stored per occupied cell of
+carrier x route x vehicle type x shipment type x month (whichever of those
+the dataset has). Every dimension is factorized once into integer group
+codes; cells are reduced with ``np.bincount`` over the raveled codes, and
+so are roll-up / slice queries, which answer in milliseconds:
+
+    cube = dataset.delay_cube()
+    cube.query({"carrier_name": ["Summit Express"]}, by=["month"])
+
+Cubes are saved next to the other per-dataset caches as
+``CUBE_DIR/<dataset key>.npz`` and loaded from there on the next run.
+"""
+import json
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from delay_analytics import detect_delay_columns, to_delay_flag
+
+# ---- SETTINGS ----
+CUBE_DIR = os.path.join(os.getenv("LDA_CACHE_DIR", ".cache"), "cubes")
+CUBE_DATE_COLUMNS = ("expected_delivery_date", "scheduled_pickup_date", "actual_delivery_date")
+CUBE_MAX_DISTINCT = 5_000   # higher-cardinality group columns are left out of the cube
+MONTH_DIM = "month"
+MISSING_LABEL = "(missing)"
+MEASURES = ("rows", "delayed", "duration_sum", "duration_n")
+CUBE_VERSION = 1
+
+
+@dataclass
+class DelayCube:
+    """Sparse cube: one row of group codes and measures per occupied cell."""
+
+    dims: list
+    labels: dict               # dim -> sorted label array; codes index into it
+    codes: np.ndarray          # (cells, len(dims)) int64
+    measures: dict             # measure -> (cells,) array
+    month_source: str = None   # date column the month dimension comes from
+
+    @property
+    def cells(self):
+        return len(self.codes)
+
+    @property
+    def rows(self):
+        return int(self.measures["rows"].sum())
+
+    def options(self, dim):
+        return list(self.labels[dim])
+
+    def _mask(self, filters):
+        mask = np.ones(self.cells, dtype=bool)
+        for dim, values in (filters or {}).items():
+            if values is None or dim not in self.labels:
+                continue
+            values = [values] if isinstance(values, str) else list(values)
+            wanted = np.flatnonzero(np.isin(self.labels[dim], np.array(values, dtype=str)))
+            mask &= np.isin(self.codes[:, self.dims.index(dim)], wanted)
+        return mask
+
+    def query(self, filters=None, by=()):
+        """Delay rate and mean delay days for the slice ``filters``, rolled up to ``by``.
+
+        ``filters`` maps a dimension to the labels to keep (all when absent);
+        ``by`` lists the dimensions to break down by (none: a single total row).
+        """
+        by = [dim for dim in by if dim in self.labels]
+        mask = self._mask(filters)
+        codes = self.codes[mask][:, [self.dims.index(dim) for dim in by]]
+        if by:
+            shape = tuple(len(self.labels[dim]) for dim in by)
+            cells, inverse = np.unique(np.ravel_multi_index(codes.T, shape), return_inverse=True)
+            keys = np.unravel_index(cells, shape)
+        else:
+            cells, inverse, keys = np.zeros(1), np.zeros(int(mask.sum()), dtype="int64"), ()
+        sums = {m: np.bincount(inverse, weights=self.measures[m][mask], minlength=len(cells))
+                for m in MEASURES}
+        table = pd.DataFrame({dim: self.labels[dim][k] for dim, k in zip(by, keys)})
+        table["shipments"] = sums["rows"].astype("int64")
+        table["delayed"] = sums["delayed"].astype("int64")
+        with np.errstate(invalid="ignore", divide="ignore"):
+            table["delay_rate"] = sums["delayed"] / sums["rows"]
+            table["mean_delay_days"] = sums["duration_sum"] / sums["duration_n"]
+        return table
+
+    # ---- PERSISTENCE ----
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        meta = {"version": CUBE_VERSION, "dims": self.dims, "month_source": self.month_source}
+        arrays = {f"labels_{i}": self.labels[dim] for i, dim in enumerate(self.dims)}
+        arrays.update({f"measure_{m}": self.measures[m] for m in MEASURES})
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as fh:
+            np.savez(fh, meta=np.array(json.dumps(meta)), codes=self.codes, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta["version"] != CUBE_VERSION:
+                raise ValueError(f"cube version {meta['version']} != {CUBE_VERSION}")
+            dims = meta["dims"]
+            return cls(
+                dims=dims,
+                labels={dim: data[f"labels_{i}"] for i, dim in enumerate(dims)},
+                codes=data["codes"],
+                measures={m: data[f"measure_{m}"] for m in MEASURES},
+                month_source=meta["month_source"],
+            )
+
+
+# ---- BUILD ----
+def cube_path(key):
+    return os.path.join(CUBE_DIR, f"{key}.npz")
+
+
+def cube_dimensions(df, roles=None):
+    """(group columns, date column) the cube is built over."""
+    roles = roles or detect_delay_columns(df.columns)
+    groups = [col for col in roles["groups"] if df[col].nunique(dropna=False) <= CUBE_MAX_DISTINCT]
+    lookup = {col.lower(): col for col in df.columns}
+    date = next((lookup[c] for c in CUBE_DATE_COLUMNS if c in lookup), None)
+    return groups, date
+
+
+def _labels(values):
+    # Group code of every row plus its string labels, sorted so chunk cubes merge;
+    # categoricals reuse their codes and other columns are factorized once
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy().astype("int64")
+        labels = values.cat.categories.astype(str).to_numpy(dtype=str)
+    else:
+        codes, uniques = pd.factorize(values)
+        labels = np.asarray(uniques.astype(str), dtype=str)
+    if (codes < 0).any():
+        labels = np.append(labels, MISSING_LABEL)
+        codes = np.where(codes < 0, len(labels) - 1, codes)
+    used = np.bincount(codes, minlength=len(labels)) > 0
+    order = np.flatnonzero(used)[np.argsort(labels[used], kind="stable")]
+    rank = np.full(len(labels), -1, dtype="int64")
+    rank[order] = np.arange(len(order))
+    return rank[codes], labels[order]
+
+
+def _months(values):
+    # "YYYY-MM" labels via integer month numbers; no per-row string formatting
+    dates = pd.to_datetime(values, errors="coerce")
+    number = (dates.dt.year * 12 + dates.dt.month - 1).astype("Int64")
+    codes, uniques = pd.factorize(number)
+    labels = np.array([f"{n // 12:04d}-{n % 12 + 1:02d}" for n in uniques], dtype=str)
+    return pd.Categorical.from_codes(codes, categories=labels)
+
+
+def _reduce(codes, shape, measures):
+    # One bincount per measure over the raveled group codes of occupied cells
+    cells, inverse = np.unique(np.ravel_multi_index(codes.T, shape), return_inverse=True)
+    reduced = {m: np.bincount(inverse, weights=values, minlength=len(cells)) for m, values in measures.items()}
+    return np.stack(np.unravel_index(cells, shape), axis=1).astype("int64"), reduced
+
+
+def build_cube(df, roles=None, dimensions=None):
+    """DelayCube for a frame, or None without a delay flag or any dimension."""
+    roles = roles or detect_delay_columns(df.columns)
+    groups, date = dimensions or cube_dimensions(df, roles)
+    if roles["flag"] is None or not (groups or date):
+        return None
+
+    dims, labels, codes = [], {}, []
+    for col in groups:
+        dims.append(col)
+        col_codes, labels[col] = _labels(df[col])
+        codes.append(col_codes)
+    if date is not None:
+        dims.append(MONTH_DIM)
+        col_codes, labels[MONTH_DIM] = _labels(pd.Series(_months(df[date])))
+        codes.append(col_codes)
+
+    flag = to_delay_flag(df[roles["flag"]]).to_numpy()
+    measures = {"rows": np.ones(len(df)), "delayed": flag.astype("float64"),
+                "duration_sum": np.zeros(len(df)), "duration_n": np.zeros(len(df))}
+    if roles["duration"] is not None:
+        duration = pd.to_numeric(df[roles["duration"]], errors="coerce").to_numpy(dtype="float64")
+        counted = flag & ~np.isnan(duration)  # mean delay over delayed shipments, as in the prompt facts
+        measures["duration_sum"] = np.where(counted, duration, 0.0)
+        measures["duration_n"] = counted.astype("float64")
+
+    shape = tuple(len(labels[dim]) for dim in dims)
+    cell_codes, reduced = _reduce(np.stack(codes, axis=1), shape, measures)
+    return DelayCube(dims=dims, labels=labels, codes=cell_codes, measures=reduced,
+                     month_source=date)
+
+
+def merge_cubes(cubes):
+    """One cube from per-chunk cubes: labels are unioned and cells re-reduced."""
+    cubes = [cube for cube in cubes if cube is not None]
+    if not cubes:
+        return None
+    first = cubes[0]
+    labels = {dim: np.unique(np.concatenate([cube.labels[dim] for cube in cubes])) for dim in first.dims}
+    codes = np.concatenate([
+        np.stack([np.searchsorted(labels[dim], cube.labels[dim][cube.codes[:, i]])
+                  for i, dim in enumerate(first.dims)], axis=1)
+        for cube in cubes
+    ]).astype("int64")
+    measures = {m: np.concatenate([cube.measures[m] for cube in cubes]) for m in MEASURES}
+    shape = tuple(len(labels[dim]) for dim in first.dims)
+    cell_codes, reduced = _reduce(codes, shape, measures)
+    return DelayCube(dims=first.dims, labels=labels, codes=cell_codes, measures=reduced,
+                     month_source=first.month_source)
+
+
+def build_cube_chunks(chunks):
+    # Roles and dimensions are fixed by the first chunk so every part lines up
+    cubes, roles, dimensions = [], None, None
+    for chunk in chunks:
+        if roles is None:
+            roles = detect_delay_columns(chunk.columns)
+            dimensions = cube_dimensions(chunk, roles)
+        cubes.append(build_cube(chunk, roles, dimensions))
+    return merge_cubes(cubes)
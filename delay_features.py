@@ -0,0 +1,110 @@
+"""Delay features derived from planned vs actual timestamps.
+
+Date columns are paired by name: ``expected_delivery_date`` with
+``actual_delivery_date``, ``scheduled_pickup_date`` with
+``actual_pickup_date`` and so on. Each pair gives a slip in days
+(actual - planned); actual pickup -> actual delivery gives the transit
+time. Datasets without a delay flag or duration get ``is_delayed`` and
+``delay_duration_days`` from the delivery slip. Everything is datetime64
+column arithmetic, so the cost is a few vector passes per column pair at
+any row count.
+
+    df, derived = add_delay_features(df)   # derived: {column: formula}
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from delay_analytics import DELAY_DURATION_COLUMNS, DELAY_FLAG_COLUMNS, detect_delay_columns
+
+# ---- SETTINGS ----
+PLANNED_PREFIXES = ("expected", "scheduled", "planned", "promised", "estimated", "target")
+ACTUAL_PREFIXES = ("actual",)
+DATE_SUFFIXES = ("date", "datetime", "time", "timestamp", "ts", "at")
+PICKUP_WORDS = ("pickup", "pick_up", "dispatch", "departure", "ship")
+DELIVERY_WORDS = ("delivery", "deliver", "arrival", "arrive")
+DELAY_TOLERANCE_DAYS = 0.0  # a delivery slip above this counts as a delay
+DERIVED_FLAG = DELAY_FLAG_COLUMNS[0]
+DERIVED_DURATION = DELAY_DURATION_COLUMNS[0]
+
+_SECONDS_PER_DAY = 86_400.0
+_PREFIX = re.compile(rf"^({'|'.join(PLANNED_PREFIXES + ACTUAL_PREFIXES)})_?(.+)$")
+_SUFFIX = re.compile(rf"_({'|'.join(DATE_SUFFIXES)})$")
+
+
+def _split(column):
+    # "expected_delivery_date" -> ("expected", "delivery"); None for other names
+    match = _PREFIX.match(column.lower())
+    if match is None:
+        return None
+    kind = "actual" if match.group(1) in ACTUAL_PREFIXES else "planned"
+    return kind, _SUFFIX.sub("", match.group(2)) or match.group(2)
+
+
+def _find(stems, words):
+    return next((stem for stem in stems if any(word in stem for word in words)), None)
+
+
+def plan_delay_features(columns):
+    """[(name, end column, start column)] for the date pairs found in ``columns``."""
+    planned, actual = {}, {}
+    for col in columns:
+        parsed = _split(str(col))
+        if parsed is not None:
+            (actual if parsed[0] == "actual" else planned).setdefault(parsed[1], col)
+
+    paired = [stem for stem in planned if stem in actual]
+    specs = [(f"{stem}_slip_days", actual[stem], planned[stem]) for stem in paired]
+    pickup, delivery = _find(actual, PICKUP_WORDS), _find(actual, DELIVERY_WORDS)
+    if pickup and delivery and pickup != delivery:
+        specs.append(("transit_days", actual[delivery], actual[pickup]))
+    pickup, delivery = _find(planned, PICKUP_WORDS), _find(planned, DELIVERY_WORDS)
+    if pickup and delivery and pickup != delivery:
+        specs.append(("planned_transit_days", planned[delivery], planned[pickup]))
+    existing = {str(col).lower() for col in columns}
+    return [spec for spec in specs if spec[0] not in existing]
+
+
+def _dates(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    return pd.to_datetime(series, errors="coerce")
+
+
+def _days_between(end, start):
+    # datetime64 difference in fractional days; NaN where either side is missing
+    delta = _dates(end) - _dates(start)
+    return delta.dt.total_seconds().to_numpy(dtype="float64", na_value=np.nan) / _SECONDS_PER_DAY
+
+
+def add_delay_features(df, roles=None):
+    """``(frame with derived columns, {column: formula})``; the input is not modified."""
+    specs = plan_delay_features(df.columns)
+    if not specs:
+        return df, {}
+    new, derived = {}, {}
+    for name, end, start in specs:
+        new[name] = _days_between(df[end], df[start])
+        derived[name] = f"{end} - {start} (days)"
+
+    roles = roles or detect_delay_columns(df.columns)
+    stems = [name[:-len("_slip_days")] for name in new if name.endswith("_slip_days")]
+    delivery = _find(stems, DELIVERY_WORDS)
+    if delivery is not None:
+        slip = f"{delivery}_slip_days"
+        days = new[slip]
+        missing = np.isnan(days)
+        if roles["flag"] is None:
+            new[DERIVED_FLAG] = pd.array(days > DELAY_TOLERANCE_DAYS, dtype="boolean")
+            new[DERIVED_FLAG][missing] = pd.NA
+            derived[DERIVED_FLAG] = f"{slip} > {DELAY_TOLERANCE_DAYS:g}"
+        if roles["duration"] is None:
+            new[DERIVED_DURATION] = np.where(missing, np.nan, np.maximum(days, 0.0))
+            derived[DERIVED_DURATION] = f"max({slip}, 0)"
+    return df.assign(**new), derived
+
+
+def describe_derived(derived):
+    """One prompt line per derived column."""
+    return "\n".join(f"          - {name} = {formula}" for name, formula in derived.items())
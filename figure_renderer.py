@@ -0,0 +1,234 @@
+"""PNG/SVG bytes for PlotData, rendered off the Streamlit script thread.
+
+Figures are built with the object-oriented Agg API (``Figure`` +
+``FigureCanvasAgg``, no pyplot state), so any thread or process can draw
+them. Images are cached in memory and under FIGURE_DIR, keyed on the
+aggregated data, the PlotConfig and the style; the uncached plots of a
+dashboard are rendered together in a process pool.
+
+    images = render_figures(plot_data)   # bytes per PlotData, same order
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from plot_executor import plot_key
+
+# ---- SETTINGS ----
+FIGURE_DIR = os.path.join(os.getenv("LDA_CACHE_DIR", ".cache"), "figures")
+FIGURE_FORMAT = "png"                 # or "svg"
+RENDER_WORKERS = int(os.getenv("LDA_RENDER_WORKERS", min(4, os.cpu_count() or 1)))
+FIGURE_MEMO_SIZE = 64
+STYLE = {"figsize": (5.5, 3.8), "dpi": 120, "title_size": 11, "grid_alpha": 0.4}
+
+_MEMO = OrderedDict()
+_MEMO_LOCK = threading.Lock()
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+# ---- DRAWING ----
+def draw_plot(ax, data):
+    # Draws pre-aggregated PlotData; no DataFrame access here
+    chart_type = data.plot["chart_type"]
+
+    # ---------------- BAR ----------------
+    if chart_type == "bar":
+        positions = np.arange(len(data.series))
+        ax.bar(positions, data.series.to_numpy(), width=0.5)
+        ax.set_xticks(positions, [str(v) for v in data.series.index], rotation=90)
+
+    # ---------------- HISTOGRAM ----------------
+    elif chart_type == "histogram":
+        counts, edges = data.hist
+        ax.stairs(counts, edges, fill=True, edgecolor="white", linewidth=1)
+
+    # ---------------- PIE ----------------
+    elif chart_type == "pie":
+        ax.pie(data.series.to_numpy(), labels=[str(v) for v in data.series.index], autopct="%1.1f%%")
+
+    # ---------------- SCATTER ----------------
+    elif chart_type == "scatter":
+        if data.density is not None:
+            counts, xedges, yedges = data.density
+            masked = np.ma.masked_equal(counts.T, 0)
+            mesh = ax.pcolormesh(xedges, yedges, masked, cmap="viridis")
+            ax.figure.colorbar(mesh, ax=ax, label="Shipments")
+        else:
+            x, y = data.points
+            ax.scatter(x, y, alpha=0.6, s=8 if data.note else None)
+
+    # ---------------- LINE ----------------
+    elif chart_type == "line":
+        ax.plot(data.series.index, data.series.to_numpy())
+
+    if chart_type != "pie":
+        ax.set_xlabel(data.xlabel)
+        ax.set_ylabel(data.ylabel)
+
+    # State any large-data reduction on the chart itself
+    if data.note:
+        ax.text(0.01, 0.99, data.note, transform=ax.transAxes, fontsize=7,
+                va="top", ha="left", alpha=0.75)
+
+
+def plot_figure(data, style=STYLE):
+    """A titled, styled Agg figure for one PlotData (no pyplot, nothing to close)."""
+    fig = Figure(figsize=style["figsize"], dpi=style["dpi"])
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    draw_plot(ax, data)
+
+    # ---------------- TITLE & STYLE ----------------
+    ax.set_title(data.plot["metric"], fontsize=style["title_size"])
+    ax.grid(True, linestyle="--", alpha=style["grid_alpha"])
+    fig.tight_layout()
+    return fig
+
+
+def render_figure(data, fmt=FIGURE_FORMAT, style=STYLE):
+    """Encoded image bytes for one PlotData; safe in any thread or process."""
+    buffer = io.BytesIO()
+    plot_figure(data, style).savefig(buffer, format=fmt, dpi=style["dpi"])
+    return buffer.getvalue()
+
+
+# ---- CACHE ----
+def _digest(h, value):
+    if value is None:
+        h.update(b"\0")
+    elif isinstance(value, tuple):
+        for item in value:
+            _digest(h, item)
+    elif isinstance(value, pd.Series):
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        h.update(repr((value.name, value.index.name, str(value.dtype))).encode())
+    else:
+        array = np.asarray(value)
+        h.update(repr((array.dtype.str, array.shape)).encode())
+        h.update(pd.util.hash_array(array.ravel()).tobytes() if array.dtype == object else array.tobytes())
+
+
+def figure_key(data, fmt=FIGURE_FORMAT, style=STYLE):
+    """Hash of the aggregated data, the PlotConfig, labels and style."""
+    h = hashlib.sha256()
+    for value in (data.series, data.hist, data.points, data.density):
+        _digest(h, value)
+    h.update(json.dumps([plot_key(data.plot), data.xlabel, data.ylabel, data.note, style, fmt],
+                        default=str).encode())
+    return h.hexdigest()
+
+
+def _figure_path(key, fmt):
+    return os.path.join(FIGURE_DIR, f"{key}.{fmt}")
+
+
+def _cached(key, fmt):
+    with _MEMO_LOCK:
+        if key in _MEMO:
+            _MEMO.move_to_end(key)
+            return _MEMO[key]
+    path = _figure_path(key, fmt)
+    try:
+        with open(path, "rb") as fh:
+            image = fh.read()
+        os.utime(path)  # recently used, for cache_gc
+    except OSError:
+        return None
+    _remember(key, image)
+    return image
+
+
+def _remember(key, image):
+    with _MEMO_LOCK:
+        _MEMO[key] = image
+        _MEMO.move_to_end(key)
+        while len(_MEMO) > FIGURE_MEMO_SIZE:
+            _MEMO.popitem(last=False)
+
+
+def _store(key, fmt, image):
+    _remember(key, image)
+    os.makedirs(FIGURE_DIR, exist_ok=True)
+    path = _figure_path(key, fmt)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as fh:
+        fh.write(image)
+    os.replace(tmp, path)
+
+
+def figure_bytes(data, fmt=FIGURE_FORMAT, style=STYLE):
+    """Cached render_figure() for a single plot, drawn in this process."""
+    key = figure_key(data, fmt, style)
+    image = _cached(key, fmt)
+    if image is None:
+        image = render_figure(data, fmt, style)
+        _store(key, fmt, image)
+    return image
+
+
+# ---- PARALLEL RENDERING ----
+def _pool():
+    # spawn, not fork: the Streamlit server process is multi-threaded
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=RENDER_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+        return _POOL
+
+
+def _reset_pool(broken):
+    # Shut the broken executor down (its manager thread and any survivors)
+    # before the next render starts a new one
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is broken:
+            _POOL = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def warm_up():
+    """Start the render workers ahead of the first dashboard."""
+    if RENDER_WORKERS > 1 and _POOL is None:
+        pool = _pool()
+        for _ in range(RENDER_WORKERS):
+            pool.submit(int)
+
+
+def render_figures(plot_data, fmt=FIGURE_FORMAT, style=STYLE, stats=None):
+    """Image bytes for each PlotData, cached ones served as is.
+
+    Two or more uncached plots are drawn in parallel in the worker pool;
+    ``stats`` (a dict) receives the cache hit and render counts.
+    """
+    keys = [figure_key(data, fmt, style) for data in plot_data]
+    images = [_cached(key, fmt) for key in keys]
+    missing = [i for i, image in enumerate(images) if image is None]
+    rendered = None
+    if len(missing) > 1 and RENDER_WORKERS > 1:
+        try:
+            pool = _pool()
+            futures = [pool.submit(render_figure, plot_data[i], fmt, style) for i in missing]
+            rendered = [future.result() for future in futures]
+        except BrokenProcessPool:  # e.g. a worker was killed; draw here instead
+            _reset_pool(pool)
+    if rendered is None:
+        rendered = [render_figure(plot_data[i], fmt, style) for i in missing]
+    for i, image in zip(missing, rendered):
+        _store(keys[i], fmt, image)
+        images[i] = image
+    if stats is not None:
+        stats.update(cached=len(plot_data) - len(missing), rendered=len(missing))
+    return images
@@ -0,0 +1,250 @@
+import hashlib
+import io
+import os
+import pickle
+import time
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from dataset_registry import DatasetHandle, featured_frames, register_dataset
+from delay_analytics import aggregate_delays
+from ingest import SCHEMA_SAMPLE_ROWS, SchemaWidened, infer_schema, iter_csv_frames, read_range
+from pipeline import PipelineResult, run_pipeline, task_output_from_dict, task_output_to_dict
+from result_cache import CACHE_DIR
+from streaming_profiler import DEFAULT_CHUNKSIZE, DatasetProfile
+
+# ---- SETTINGS ----
+STATE_DIR = os.path.join(CACHE_DIR, "incremental")
+DRIFT_THRESHOLD = 0.05   # max absolute change in any tracked rate
+MIN_GROUP_SUPPORT = 30   # groups smaller than this are ignored for drift
+FINGERPRINT_BYTES = 64 * 1024
+TAIL_SETTLE_SECONDS = 1.0  # an unterminated last line counts once the file is this quiet
+TAIL_BLOCK_BYTES = 64 * 1024  # the last newline is searched backwards in blocks of this size
+STATE_VERSION = 2
+
+
+@dataclass
+class IncrementalState:
+    path: str
+    columns: list = None
+    schema: dict = None          # ingest schema inferred on the first run, reused for appends
+    derived: dict = field(default_factory=dict)
+    byte_offset: int = 0
+    head_hash: str = ""
+    tail_hash: str = ""
+    profile: DatasetProfile = None
+    aggregates: object = None
+    baseline: dict = field(default_factory=dict)
+    last_outputs: list = field(default_factory=list)
+    version: int = STATE_VERSION
+
+
+@dataclass
+class IncrementalResult:
+    result: PipelineResult
+    dataset: DatasetHandle
+    rows_ingested: int
+    total_rows: int
+    drift: float
+    reran_llm: bool
+    reset: bool
+
+
+# ---- STATE PERSISTENCE ----
+def _state_path(path, state_dir):
+    name = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]
+    return os.path.join(state_dir, f"{name}.pkl")
+
+
+def load_state(path, state_dir=STATE_DIR):
+    state_file = _state_path(path, state_dir)
+    if os.path.exists(state_file):
+        with open(state_file, "rb") as fh:
+            state = pickle.load(fh)
+        if getattr(state, "version", None) == STATE_VERSION:
+            return state
+    return IncrementalState(path=path)
+
+
+def save_state(state, state_dir=STATE_DIR):
+    os.makedirs(state_dir, exist_ok=True)
+    state_file = _state_path(state.path, state_dir)
+    tmp = state_file + ".tmp"
+    with open(tmp, "wb") as fh:
+        pickle.dump(state, fh)
+    os.replace(tmp, state_file)
+
+
+# ---- APPEND DETECTION ----
+def _window_hashes(fh, offset):
+    # Hash the first and last FINGERPRINT_BYTES before `offset`; O(1) in file size
+    fh.seek(0)
+    head = hashlib.sha256(fh.read(min(offset, FINGERPRINT_BYTES))).hexdigest()
+    start = max(0, offset - FINGERPRINT_BYTES)
+    fh.seek(start)
+    tail = hashlib.sha256(fh.read(offset - start)).hexdigest()
+    return head, tail
+
+
+def _is_append_of(state, fh, size):
+    if not state.byte_offset or size < state.byte_offset:
+        return False
+    return _window_hashes(fh, state.byte_offset) == (state.head_hash, state.tail_hash)
+
+
+def _settled(fh, size):
+    # True once the file has not been written for TAIL_SETTLE_SECONDS and is still ``size`` bytes
+    age = time.time() - os.fstat(fh.fileno()).st_mtime
+    if age < TAIL_SETTLE_SECONDS:
+        time.sleep(TAIL_SETTLE_SECONDS - age)
+    return os.fstat(fh.fileno()).st_size == size
+
+
+def _line_end(fh, start, end):
+    # Offset just past the last newline in [start, end), or start; reads backwards
+    pos = end
+    while pos > start:
+        block = max(start, pos - TAIL_BLOCK_BYTES)
+        fh.seek(block)
+        found = fh.read(pos - block).rfind(b"\n")
+        if found >= 0:
+            return block + found + 1
+        pos = block
+    return start
+
+
+def _read_new_rows(fh, state, chunksize):
+    # Only the bytes after the last processed offset are parsed, typed and
+    # featured like a full load (ingest schema + derived delay columns).
+    # They are streamed from the file, never held in memory at once
+    size = os.fstat(fh.fileno()).st_size
+    end = _line_end(fh, state.byte_offset, size)
+    # A last line without a newline is a complete record once the file stops
+    # growing; while an append is still being written it waits for the next run
+    fh.seek(end)
+    if fh.read(size - end).strip() and _settled(fh, size):
+        end = size
+    if end <= state.byte_offset:
+        return iter(()), state.byte_offset
+    chunks = iter_csv_frames(read_range(fh, state.byte_offset, end), state.schema, chunksize,
+                             header=None, names=state.columns)
+    return featured_frames(chunks, state.derived), end
+
+
+def _fresh_state(path, fh, schema=None):
+    # State for reading ``path`` from its first row; the schema is inferred unless given
+    state = IncrementalState(path=path)
+    fh.seek(0)
+    header = fh.readline()
+    state.columns = list(pd.read_csv(io.BytesIO(header), nrows=0).columns)
+    state.schema = schema or infer_schema(pd.read_csv(path, nrows=SCHEMA_SAMPLE_ROWS))
+    state.byte_offset = len(header)
+    state.profile = DatasetProfile()
+    state.aggregates = None
+    return state
+
+
+def _ingest(fh, state, chunksize):
+    # Merges the new rows into the state's profile and aggregates; returns their count
+    reader, new_offset = _read_new_rows(fh, state, chunksize)
+    rows = 0
+    for chunk in reader:
+        rows += len(chunk)
+        state.profile.update(chunk)
+        roles = state.aggregates.roles if state.aggregates is not None else None
+        part = aggregate_delays(chunk, roles)
+        state.aggregates = part if state.aggregates is None else state.aggregates.merge(part)
+    state.byte_offset = new_offset
+    return rows
+
+
+# ---- DRIFT ----
+def delay_snapshot(agg):
+    """Flat rates that the LLM narrative depends on."""
+    snapshot = {"delay_rate": agg.delay_rate}
+    if agg.cause_counts is not None and agg.delayed:
+        for cause, count in agg.cause_counts.items():
+            snapshot[f"cause:{cause}"] = count / agg.delayed
+    for col, stats in agg.group_stats.items():
+        supported = stats[stats["rows"] >= MIN_GROUP_SUPPORT]
+        for value, row in supported.iterrows():
+            snapshot[f"{col}:{value}"] = row["delayed"] / row["rows"]
+    return snapshot
+
+
+def drift_between(baseline, current):
+    if not baseline:
+        return float("inf")
+    # Groups that only now reached MIN_GROUP_SUPPORT are compared with the
+    # overall rate the previous run described, not with zero.
+    base_default = baseline.get("delay_rate", 0.0)
+    cur_default = current.get("delay_rate", 0.0)
+    keys = set(baseline) | set(current)
+    return max(abs(current.get(k, cur_default) - baseline.get(k, base_default)) for k in keys)
+
+
+# ---- RUNNER ----
+def run_incremental(path, drift_threshold=DRIFT_THRESHOLD, force=False,
+                    state_dir=STATE_DIR, chunksize=DEFAULT_CHUNKSIZE, **pipeline_kwargs):
+    """Ingest rows appended to ``path`` since the last run and merge them.
+
+    The LLM pipeline is re-run only when the merged delay rates drifted
+    more than ``drift_threshold`` from the ones it last described (or when
+    ``force`` is set); otherwise the previous outputs are returned.
+    """
+    start = time.perf_counter()
+    state = load_state(path, state_dir)
+    size = os.path.getsize(path)
+
+    with open(path, "rb") as fh:
+        reset = not _is_append_of(state, fh, size)
+        if reset:
+            state = _fresh_state(path, fh)
+        while True:
+            try:
+                rows_ingested = _ingest(fh, state, chunksize)
+                break
+            except SchemaWidened as exc:
+                # new rows need a looser type than the history was read with:
+                # read the whole file again, so every merged chunk agrees
+                state, reset = _fresh_state(path, fh, exc.schema), True
+        state.head_hash, state.tail_hash = _window_hashes(fh, state.byte_offset)
+    ingest_seconds = time.perf_counter() - start
+
+    current = delay_snapshot(state.aggregates) if state.aggregates is not None else {}
+    drift = drift_between(state.baseline, current)
+    rerun = force or not state.last_outputs or drift > drift_threshold
+
+    # The handle carries the merged profile/aggregates, so create_tasks
+    # never re-reads the history; the frame is only parsed if a caller asks.
+    handle = register_dataset(DatasetHandle(
+        key=hashlib.sha256(f"{os.path.abspath(path)}:{state.byte_offset}:{state.tail_hash}".encode()).hexdigest(),
+        source=os.path.basename(path),
+        path=path,
+        derived=dict(state.derived),
+        end_offset=state.byte_offset,  # a re-parse after eviction stops where the state does
+        schema=dict(state.schema),
+        _profile=state.profile,
+        _delay_aggregates=state.aggregates,
+    ))
+    if rerun:
+        result = run_pipeline(handle, **pipeline_kwargs)
+        state.last_outputs = [task_output_to_dict(output) for output in result.tasks_output]
+        state.baseline = current
+    else:
+        result = PipelineResult(tasks_output=[
+            task_output_from_dict(i, stored) for i, stored in enumerate(state.last_outputs)
+        ])
+
+    result.timings["incremental_ingest"] = ingest_seconds
+    save_state(state, state_dir)
+    return IncrementalResult(
+        result=result,
+        dataset=handle,
+        rows_ingested=rows_ingested,
+        total_rows=state.profile.total_rows,
+        drift=drift,
+        reran_llm=rerun,
+        reset=reset,
+    )
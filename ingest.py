@@ -0,0 +1,407 @@
+"""Typed, columnar ingestion for shipment exports.
+
+CSV columns are read with an inferred schema (datetimes, booleans,
+categoricals, downcast integers) instead of default object dtypes, Parquet
+and Arrow files are read directly, and every CSV gets a Parquet copy keyed
+by content hash so later loads skip CSV parsing entirely.
+
+    python ingest.py logistics-delivery-delay-causes.csv   # memory report
+"""
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from streaming_profiler import DEFAULT_CHUNKSIZE
+
+try:
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # optional: typed CSV still works, without the Parquet cache
+    feather = pq = None
+
+# ---- SETTINGS ----
+PARQUET_DIR = os.path.join(os.getenv("LDA_CACHE_DIR", ".cache"), "parquet")
+SCHEMA_SAMPLE_ROWS = 20_000
+CATEGORY_MAX_UNIQUE = 1_000    # more distinct values than this stay plain strings
+CATEGORY_MAX_RATIO = 0.5       # ... as do columns that are mostly unique
+DATE_PARSE_RATIO = 0.95        # share of sample values that must parse as dates
+DOWNCAST_FLOATS = os.getenv("LDA_DOWNCAST_FLOATS", "0") == "1"  # float32 is lossy
+MEMORY_MAP = os.getenv("LDA_MEMORY_MAP", "1") == "1"  # map files instead of buffered reads
+
+BOOL_VALUES = {"true": True, "false": False, "yes": True, "no": False,
+               "t": True, "f": False, "y": True, "n": False}
+_DATE_NAME = re.compile(r"date|time|_at$|_ts$")
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+PARQUET_MAGIC = b"PAR1"
+ARROW_MAGIC = b"ARROW1"
+INT_DTYPES = ("int8", "int16", "int32", "int64")
+SCHEMA_FALLBACKS = "schema_fallbacks"  # df.attrs entry: {column: values the schema could not convert}
+
+
+# ---- FORMAT DETECTION ----
+def detect_format(source):
+    """'parquet', 'arrow' or 'csv' for a path or raw bytes, by magic number."""
+    if isinstance(source, (bytes, bytearray)):
+        head = bytes(source[:8])
+    else:
+        with open(source, "rb") as fh:
+            head = fh.read(8)
+    if head.startswith(PARQUET_MAGIC):
+        return "parquet"
+    if head.startswith(ARROW_MAGIC):
+        return "arrow"
+    return "csv"
+
+
+def _readable(source):
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+
+# ---- SCHEMA INFERENCE ----
+def _column_kind(name, values):
+    values = values.dropna()
+    if values.empty:
+        return "string"
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return "category"
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return "datetime"
+    if pd.api.types.is_bool_dtype(values):
+        return "bool"
+    if pd.api.types.is_numeric_dtype(values):
+        integral = pd.api.types.is_integer_dtype(values) or bool((values % 1 == 0).all())
+        return "int" if integral else "float"
+
+    text = values.astype(str).str.strip()
+    if text.str.lower().isin(BOOL_VALUES).all():
+        return "bool"
+    if _DATE_NAME.search(name.lower()) or text.str.match(_ISO_DATE).mean() >= DATE_PARSE_RATIO:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            parsed = pd.to_datetime(text, errors="coerce")
+        if parsed.notna().mean() >= DATE_PARSE_RATIO:
+            return "datetime"
+    distinct = text.nunique()
+    if distinct <= CATEGORY_MAX_UNIQUE and distinct <= CATEGORY_MAX_RATIO * len(text):
+        return "category"
+    return "string"
+
+
+def infer_schema(sample):
+    """Map each column of ``sample`` to bool/datetime/category/int/float/string."""
+    return {col: _column_kind(col, sample[col]) for col in sample.columns}
+
+
+def _to_boolean(series):
+    if pd.api.types.is_bool_dtype(series):
+        return series.astype("boolean")
+    return series.astype("string").str.strip().str.lower().map(BOOL_VALUES).astype("boolean")
+
+
+def _downcast_int(series):
+    numeric = pd.to_numeric(series, errors="coerce")
+    values = numeric.dropna()
+    if values.empty or not (values % 1 == 0).all():
+        return numeric  # the sample looked integral, the full column isn't
+    lo, hi = values.min(), values.max()
+    for dtype in INT_DTYPES:
+        if np.iinfo(dtype).min <= lo and hi <= np.iinfo(dtype).max:
+            # nullable Int* keeps missing values without falling back to float
+            return numeric.astype(dtype.capitalize() if numeric.isna().any() else dtype)
+    return numeric
+
+
+def _convert(series, kind):
+    # The typed column, or None when ``kind`` needs no conversion
+    if kind == "bool":
+        return _to_boolean(series)
+    if kind == "datetime" and not pd.api.types.is_datetime64_any_dtype(series):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return pd.to_datetime(series, errors="coerce")
+    if kind == "int":
+        return _downcast_int(series)
+    if kind == "float" and DOWNCAST_FLOATS:
+        return pd.to_numeric(series, errors="coerce", downcast="float")
+    if kind == "category" and not isinstance(series.dtype, pd.CategoricalDtype):
+        return series.astype("category")
+    return None
+
+
+def apply_schema(df, schema):
+    """Convert ``df`` to ``schema`` in place.
+
+    Values the schema sample never saw (e.g. "maybe" in a bool column) would
+    become missing: such a column keeps its raw values instead, is set to
+    "string" in ``schema`` so later chunks agree (iter_csv_frames re-reads
+    earlier ones, see SchemaWidened), and is listed in
+    ``df.attrs[SCHEMA_FALLBACKS]``. Datetimes tolerate the same share of
+    unparseable values as inference (DATE_PARSE_RATIO).
+    """
+    for col, kind in schema.items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        converted = _convert(series, kind)
+        if converted is None:
+            continue
+        raw = int(series.notna().sum())
+        lost = raw - int(converted.notna().sum())
+        tolerated = (1 - DATE_PARSE_RATIO) * raw if kind == "datetime" else 0
+        if lost > tolerated:
+            schema[col] = "string"
+            df.attrs.setdefault(SCHEMA_FALLBACKS, {})[col] = {"kind": kind, "unconverted": lost}
+            continue
+        df[col] = converted
+    return df
+
+
+# ---- READERS ----
+def read_typed_csv(source, schema=None):
+    """Read a CSV path or buffer with an inferred (or given) schema."""
+    if schema is None:
+        schema = infer_schema(pd.read_csv(source, nrows=SCHEMA_SAMPLE_ROWS))
+        if hasattr(source, "seek"):
+            source.seek(0)
+    # categoricals are built by the parser, without an intermediate string column
+    dtypes = {col: "category" for col, kind in schema.items() if kind == "category"}
+    df = pd.read_csv(source, dtype=dtypes, memory_map=MEMORY_MAP and isinstance(source, str))
+    return apply_schema(df, schema), schema
+
+
+def _read_parquet(source):
+    if MEMORY_MAP and isinstance(source, str):
+        return pd.read_parquet(source, memory_map=True)
+    return pd.read_parquet(source)
+
+
+def _read_arrow(source):
+    if MEMORY_MAP and isinstance(source, str):
+        return feather.read_table(source, memory_map=True).to_pandas()
+    return pd.read_feather(source)
+
+
+def read_columnar(source, fmt):
+    if pq is None:
+        raise ImportError(f"Reading {fmt} files requires pyarrow")
+    df = _read_parquet(_readable(source)) if fmt == "parquet" else _read_arrow(_readable(source))
+    # files written by other tools may still carry dates and flags as strings
+    return apply_schema(df, infer_schema(df.head(SCHEMA_SAMPLE_ROWS)))
+
+
+# ---- PARQUET CACHE ----
+def parquet_cache_path(key):
+    return os.path.join(PARQUET_DIR, f"{key}.parquet") if key and pq is not None else None
+
+
+def _write_parquet(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    except Exception:  # best effort: an unconvertible column just means no cache
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def load_frame(source, key=None):
+    """Typed frame for a path or raw bytes, plus how it was loaded.
+
+    The second value is "parquet-cache", "parquet", "arrow" or "csv".
+    CSVs are written to the Parquet cache under ``key`` on first load.
+    """
+    fmt = detect_format(source)
+    if fmt != "csv":
+        return read_columnar(source, fmt), fmt
+    cached = parquet_cache_path(key)
+    if cached and os.path.exists(cached):
+        try:
+            os.utime(cached)  # last-used time for the cache GC
+        except OSError:
+            pass
+        return _read_parquet(cached), "parquet-cache"
+    df, _ = read_typed_csv(_readable(source))
+    if cached:
+        _write_parquet(df, cached)
+    return df, "csv"
+
+
+def _plain(chunk):
+    # Per-chunk dictionaries differ; mergeable aggregates align on plain values
+    for col in chunk.select_dtypes("category").columns:
+        chunk[col] = chunk[col].astype(chunk[col].cat.categories.dtype)
+    return chunk
+
+
+class SchemaWidened(ValueError):
+    """A schema fallback (see apply_schema) after chunks were already handed out.
+
+    Those chunks have the stricter dtypes, so the reader stops; read again
+    from the start with ``schema``, the relaxed one (see fold_frames).
+    """
+
+    def __init__(self, schema, columns):
+        super().__init__(f"{', '.join(columns)} kept as strings after the first chunk; read again")
+        self.schema = schema
+
+
+def iter_csv_frames(source, schema=None, chunksize=DEFAULT_CHUNKSIZE, **read_kwargs):
+    """Typed chunks of a CSV path or buffer, with the same schema as a full load.
+
+    The schema is inferred from the first SCHEMA_SAMPLE_ROWS rows unless
+    given (e.g. for appended rows, with ``header=None, names=...``). Only the
+    first chunk of an inferred schema may fall back to strings; a fallback
+    in any later chunk (or with a given schema) raises SchemaWidened, so
+    the chunks of one read never disagree on dtypes.
+    """
+    inferred = schema is None
+    if inferred:
+        schema = infer_schema(pd.read_csv(source, nrows=SCHEMA_SAMPLE_ROWS, **read_kwargs))
+        if hasattr(source, "seek"):
+            source.seek(0)
+    else:
+        schema = dict(schema)
+    for position, chunk in enumerate(pd.read_csv(source, chunksize=chunksize, **read_kwargs)):
+        chunk = apply_schema(chunk, schema)
+        widened = chunk.attrs.get(SCHEMA_FALLBACKS)
+        if widened and (position or not inferred):
+            raise SchemaWidened(schema, widened)
+        yield _plain(chunk)
+
+
+def fold_frames(fold, open_frames, schema=None):
+    """``fold(open_frames(schema))``, read again while a chunk widens the schema.
+
+    Returns ``(result, schema)``. Each restart relaxes at least one column,
+    so this ends; the result only ever saw chunks of one schema.
+    """
+    while True:
+        try:
+            return fold(open_frames(schema)), schema
+        except SchemaWidened as exc:
+            schema = exc.schema
+
+
+class FileRange(io.RawIOBase):
+    """Bytes ``[start, end)`` of an open binary file as a seekable stream.
+
+    It keeps its own position, so the file can be used in between reads.
+    """
+
+    def __init__(self, fh, start, end):
+        self._fh, self._start, self._end = fh, start, end
+        self._pos = start
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos - self._start
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: self._start, io.SEEK_CUR: self._pos, io.SEEK_END: self._end}[whence]
+        self._pos = min(max(base + offset, self._start), self._end)
+        return self.tell()
+
+    def readinto(self, buffer):
+        size = min(len(buffer), self._end - self._pos)
+        if size <= 0:
+            return 0
+        self._fh.seek(self._pos)
+        data = self._fh.read(size)
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+
+def read_range(fh, start, end):
+    """Buffered reader over bytes ``[start, end)`` of ``fh`` (e.g. for ``pd.read_csv``)."""
+    return io.BufferedReader(FileRange(fh, start, end))
+
+
+def iter_frames(path, chunksize=DEFAULT_CHUNKSIZE, key=None, end=None, schema=None):
+    """Bounded-memory typed chunks of ``path``; served from the Parquet cache when present.
+
+    With ``end`` only the CSV's first ``end`` bytes are read (a snapshot of
+    a file that is still being appended to). CSVs may raise SchemaWidened;
+    read them with fold_frames to restart with the relaxed ``schema``.
+    """
+    if end is not None:
+        with open(path, "rb") as fh:
+            yield from iter_csv_frames(read_range(fh, 0, end), schema, chunksize=chunksize)
+        return
+    fmt = detect_format(path)
+    cached = parquet_cache_path(key)
+    if fmt == "csv" and cached and os.path.exists(cached):
+        path, fmt = cached, "parquet"
+    if fmt == "parquet":
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield _plain(batch.to_pandas())
+    elif fmt == "arrow":
+        for batch in feather.read_table(path, memory_map=True).to_batches(chunksize):
+            yield _plain(batch.to_pandas())
+    else:
+        yield from iter_csv_frames(path, schema, chunksize=chunksize)
+
+
+# ---- MEMORY REPORT ----
+def _mb(df):
+    return round(df.memory_usage(deep=True).sum() / 1e6, 3)
+
+
+def memory_report(path):
+    """Load time and resident size: plain ``pd.read_csv`` vs typed CSV vs Parquet."""
+    start = time.perf_counter()
+    plain = pd.read_csv(path)
+    loads = [{"method": "pd.read_csv", "seconds": time.perf_counter() - start, "memory_mb": _mb(plain)}]
+
+    start = time.perf_counter()
+    typed, schema = read_typed_csv(path)
+    loads.append({"method": "typed csv", "seconds": time.perf_counter() - start, "memory_mb": _mb(typed)})
+
+    if pq is not None:
+        with tempfile.TemporaryDirectory() as tmp:
+            parquet_path = os.path.join(tmp, "cache.parquet")
+            typed.to_parquet(parquet_path, index=False)
+            start = time.perf_counter()
+            cached = pd.read_parquet(parquet_path)
+            loads.append({
+                "method": "parquet cache", "seconds": time.perf_counter() - start,
+                "memory_mb": _mb(cached), "file_mb": round(os.path.getsize(parquet_path) / 1e6, 3),
+            })
+
+    for row in loads:
+        row["seconds"] = round(row["seconds"], 4)
+    columns = {
+        col: {
+            "read_csv": str(plain[col].dtype),
+            "typed": str(typed[col].dtype),
+            "read_csv_mb": round(plain[col].memory_usage(deep=True) / 1e6, 3),
+            "typed_mb": round(typed[col].memory_usage(deep=True) / 1e6, 3),
+        }
+        for col in plain.columns
+    }
+    return {"rows": len(plain), "file_mb": round(os.path.getsize(path) / 1e6, 3),
+            "loads": loads, "schema": schema, "columns": columns}
+
+
+if __name__ == "__main__":
+    for csv_path in sys.argv[1:]:
+        report = memory_report(csv_path)
+        print(f"{csv_path}: {report['rows']:,} rows, {report['file_mb']} MB on disk")
+        for row in report["loads"]:
+            print(f"  {row['method']:<14} {row['seconds']:>8.3f}s {row['memory_mb']:>10.2f} MB")
+        print(json.dumps(report["columns"], indent=2))
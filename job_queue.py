@@ -0,0 +1,359 @@
+import json
+import multiprocessing
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+# ---- SETTINGS ----
+JOB_DB_PATH = os.path.join(os.getenv("LDA_CACHE_DIR", ".cache"), "jobs.sqlite")
+JOB_WORKERS = int(os.getenv("LDA_JOB_WORKERS", 2))
+POLL_SECONDS = 1.5
+STREAM_FLUSH_SECONDS = 0.25  # streamed tokens are written at most this often per job
+STREAM_POLL_SECONDS = 0.5    # UI refresh while a task is streaming
+HEARTBEAT_SECONDS = 10       # a running job's worker refreshes jobs.heartbeat this often
+JOB_STALE_SECONDS = 60       # running jobs without a heartbeat this long are re-queued on start
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+WORKER_DIED = "The worker process running this job died (e.g. killed for memory); please run it again."
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+_POOL_JOBS = {}  # executor -> ids of jobs submitted to it that have not finished
+_JOBS_LOCK = threading.Lock()
+
+
+# ---- STORAGE ----
+@contextmanager
+def _connect(db_path=JOB_DB_PATH):
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def init_db(db_path=JOB_DB_PATH):
+    with _connect(db_path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                dataset_path TEXT NOT NULL,
+                options TEXT NOT NULL,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL,
+                error TEXT,
+                timings TEXT,
+                prompt_tokens TEXT,
+                trace TEXT,
+                dataset_key TEXT,
+                viz_check TEXT,
+                owner TEXT,
+                heartbeat REAL
+            )"""
+        )
+        # databases created before these were stored
+        for column, kind in (("trace", "TEXT"), ("dataset_key", "TEXT"), ("viz_check", "TEXT"),
+                             ("owner", "TEXT"), ("heartbeat", "REAL")):
+            try:
+                conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            except sqlite3.OperationalError:
+                pass
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS job_tasks (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                output TEXT NOT NULL,
+                finished REAL NOT NULL,
+                PRIMARY KEY (job_id, idx)
+            )"""
+        )
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS job_streams (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (job_id, idx)
+            )"""
+        )
+
+
+def get_job(job_id, db_path=JOB_DB_PATH):
+    """Job row plus the outputs of every task finished so far."""
+    with _connect(db_path) as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        tasks = conn.execute(
+            "SELECT idx, output, finished FROM job_tasks WHERE job_id = ? ORDER BY idx", (job_id,)
+        ).fetchall()
+        streams = conn.execute(
+            "SELECT idx, text FROM job_streams WHERE job_id = ? ORDER BY idx", (job_id,)
+        ).fetchall()
+    job = dict(row)
+    for field in ("options", "timings", "prompt_tokens", "trace", "viz_check"):
+        job[field] = json.loads(job[field]) if job[field] else {}
+    job["tasks"] = {t["idx"]: {**json.loads(t["output"]), "finished": t["finished"]} for t in tasks}
+    # partial answers of tasks still being written (streamed tokens)
+    job["streams"] = {s["idx"]: s["text"] for s in streams if s["idx"] not in job["tasks"]}
+    return job
+
+
+def save_task_output(job_id, index, output, db_path=JOB_DB_PATH):
+    # Also used to replace an output that was repaired after the job finished
+    from pipeline import task_output_to_dict
+    with _connect(db_path) as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO job_tasks VALUES (?, ?, ?, ?)",
+            (job_id, index, json.dumps(task_output_to_dict(output), default=str), time.time()),
+        )
+
+
+def list_jobs(limit=20, db_path=JOB_DB_PATH):
+    with _connect(db_path) as conn:
+        rows = conn.execute(
+            "SELECT id, status, dataset_path, created, finished FROM jobs ORDER BY created DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+# ---- WORKER (runs in a separate process) ----
+class _StreamWriter:
+    # Keeps the latest partial answer per task; one write per STREAM_FLUSH_SECONDS, not per token
+    def __init__(self, job_id, db_path):
+        self.job_id, self.db_path = job_id, db_path
+        self.pending = {}
+        self.flushed = 0.0
+        self.lock = threading.Lock()
+
+    def add(self, index, text):
+        with self.lock:
+            self.pending[index] = text
+            if time.time() - self.flushed < STREAM_FLUSH_SECONDS:
+                return
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.flushed = time.time()
+        if not pending:
+            return
+        with _connect(self.db_path) as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO job_streams VALUES (?, ?, ?, ?)",
+                [(self.job_id, index, text, self.flushed) for index, text in pending.items()],
+            )
+
+
+def _check_viz_plan(result, dataset):
+    # Validate (and re-ask) the viz plan here rather than in the UI's render
+    # path; {"plan": hash, "plots": [...], "report": [...]}, or None
+    from pipeline import OUTPUT_MODELS
+    from structured_output import parse_output
+    from viz_validator import plan_hash, validate_and_repair
+
+    try:
+        plan, _ = parse_output(result.tasks_output[3], OUTPUT_MODELS[3])
+        if plan is None:
+            return None  # the UI re-runs the task first
+        plots = plan.model_dump()["plots"]
+        kept, report = validate_and_repair(plots, dataset)
+    except Exception:
+        return None  # the UI checks the plan itself
+    return {"plan": plan_hash(plots), "plots": kept, "report": report}
+
+
+def _heartbeat(job_id, db_path, stop):
+    # Marks the job as alive, so another server process does not re-queue it
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            with _connect(db_path) as conn:
+                conn.execute("UPDATE jobs SET heartbeat = ? WHERE id = ?", (time.time(), job_id))
+        except sqlite3.Error:
+            pass  # the next beat retries
+
+
+def _run_job(job_id, db_path=JOB_DB_PATH):
+    job = get_job(job_id, db_path)
+    now = time.time()
+    with _connect(db_path) as conn:
+        # claimed once: a job resubmitted after a pool restart is not run twice
+        claimed = conn.execute(
+            "UPDATE jobs SET status = ?, started = ?, owner = ?, heartbeat = ? WHERE id = ? AND status = ?",
+            (RUNNING, now, f"{socket.gethostname()}:{os.getpid()}", now, job_id, QUEUED),
+        ).rowcount
+    if not claimed:
+        return job_id
+    stop = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job_id, db_path, stop), daemon=True).start()
+    try:
+        _execute_job(job_id, job, db_path)
+    finally:
+        stop.set()
+    return job_id
+
+
+def _execute_job(job_id, job, db_path):
+    stream = _StreamWriter(job_id, db_path)
+
+    def record_task(index, output):
+        stream.flush()
+        save_task_output(job_id, index, output, db_path)
+
+    try:
+        from pipeline import run_pipeline
+
+        result = run_pipeline(job["dataset_path"], on_task_complete=record_task, on_token=stream.add,
+                              **job["options"])
+        # store every final output, even if a task callback did not fire
+        recorded = get_job(job_id, db_path)["tasks"]
+        for index, output in enumerate(result.tasks_output):
+            if index not in recorded:
+                record_task(index, output)
+        viz_check = _check_viz_plan(result, job["dataset_key"] or job["dataset_path"])
+        with _connect(db_path) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, timings = ?, prompt_tokens = ?, trace = ?, viz_check = ? "
+                "WHERE id = ?",
+                (DONE, time.time(), json.dumps(result.timings), json.dumps(result.prompt_tokens),
+                 json.dumps(result.trace, default=str), json.dumps(viz_check, default=str), job_id),
+            )
+            conn.execute("DELETE FROM job_streams WHERE job_id = ?", (job_id,))
+    except Exception:
+        with _connect(db_path) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, error = ? WHERE id = ?",
+                (FAILED, time.time(), traceback.format_exc(), job_id),
+            )
+
+
+# ---- SUBMISSION ----
+def _warm_worker(workers):
+    # Each worker takes its share of the provider limits, then imports crewai and
+    # builds the agents once, before its first job; a missing key is reported by
+    # the job that needs it, not here
+    from llm_clients import split_limits, use_limits
+
+    use_limits(split_limits(workers))
+    try:
+        from pipeline import get_agents
+
+        get_agents()
+    except Exception:
+        pass
+
+
+def _pool():
+    # spawn, not fork: the Streamlit server process is multi-threaded
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            init_db()
+            _POOL = ProcessPoolExecutor(
+                max_workers=JOB_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_warm_worker,
+                initargs=(JOB_WORKERS,),
+            )
+            _resume_pending()
+        return _POOL
+
+
+def _replace_broken(broken):
+    # The jobs this pool was running are failed (never other pools' or other
+    # processes' jobs); its queued ones are resumed by the new pool
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is broken:
+            _POOL = None
+            with _JOBS_LOCK:
+                job_ids = sorted(_POOL_JOBS.pop(broken, ()))
+            with _connect() as conn:
+                conn.executemany("UPDATE jobs SET status = ?, finished = ?, error = ? WHERE id = ? AND status = ?",
+                                 [(FAILED, time.time(), WORKER_DIED, job_id, RUNNING) for job_id in job_ids])
+            broken.shutdown(wait=False, cancel_futures=True)
+    return _pool()
+
+
+def _submit(pool, job_id):
+    with _JOBS_LOCK:
+        _POOL_JOBS.setdefault(pool, set()).add(job_id)
+    future = pool.submit(_run_job, job_id)
+
+    def check(done):
+        # a killed worker breaks the whole pool; restart it without waiting for a new submission
+        if not done.cancelled() and isinstance(done.exception(), BrokenProcessPool):
+            threading.Thread(target=_replace_broken, args=(pool,), daemon=True).start()
+            return
+        with _JOBS_LOCK:
+            _POOL_JOBS.get(pool, set()).discard(job_id)
+
+    future.add_done_callback(check)
+
+
+def _resume_pending():
+    # Queued jobs, and running jobs whose worker stopped beating (e.g. the
+    # server process that ran them was killed), are picked up again. Jobs
+    # other live processes are running are left alone; a queued job that
+    # several processes submit is still run once (see the claim in _run_job)
+    stale = time.time() - JOB_STALE_SECONDS
+    with _connect() as conn:
+        conn.execute("UPDATE jobs SET status = ? WHERE status = ? AND COALESCE(heartbeat, started, created) < ?",
+                     (QUEUED, RUNNING, stale))
+        pending = [row["id"] for row in conn.execute(
+            "SELECT id FROM jobs WHERE status = ? ORDER BY created", (QUEUED,)
+        )]
+    for job_id in pending:
+        _submit(_POOL, job_id)
+
+
+def warm_workers():
+    """Start the job workers (and their agents) ahead of the first submission."""
+    pool = _pool()
+    for _ in range(JOB_WORKERS):
+        pool.submit(int)
+
+
+def submit_job(dataset_path, dataset_key=None, **options):
+    """Queue ``run_pipeline(dataset_path, **options)`` and return its job id.
+
+    ``dataset_key`` (the registry key) lets the UI find the dataset again
+    without re-hashing the file.
+    """
+    pool = _pool()
+    job_id = uuid.uuid4().hex[:12]
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, status, dataset_path, dataset_key, options, created) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, QUEUED, os.path.abspath(dataset_path), dataset_key, json.dumps(options), time.time()),
+        )
+    try:
+        _submit(pool, job_id)
+    except BrokenProcessPool:
+        _submit(_replace_broken(pool), job_id)
+    return job_id
+
+
+def job_result(job):
+    """Rebuild a PipelineResult from a finished job row."""
+    from pipeline import PipelineResult, task_output_from_dict
+
+    outputs = [task_output_from_dict(i, job["tasks"][i]) for i in sorted(job["tasks"])]
+    return PipelineResult(tasks_output=outputs, timings=job["timings"],
+                          prompt_tokens=job["prompt_tokens"], trace=job.get("trace") or {},
+                          viz_planner=job["options"].get("viz_planner", "llm"),
+                          viz_check=job.get("viz_check") or {})
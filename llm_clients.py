@@ -0,0 +1,433 @@
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, List
+
+from crewai.llms.base_llm import BaseLLM
+
+try:  # crewai retries every LLM call on 429 by itself; PooledLLM switches that off for its calls
+    from crewai.llms.retry import _active_llm_rate_limit_retry
+except ImportError:
+    _active_llm_rate_limit_retry = None
+
+from prompt_budget import estimate_tokens
+from tracing import span
+
+# ---- PROVIDER LIMITS ----
+# requests per minute, burst size, max in-flight requests (shared per process)
+PROVIDER_LIMITS = {
+    "openrouter": {"rpm": float(os.getenv("LDA_OPENROUTER_RPM", 20)), "burst": 4, "in_flight": 4},
+    "groq": {"rpm": float(os.getenv("LDA_GROQ_RPM", 30)), "burst": 5, "in_flight": 4},
+    "ollama": {"rpm": float(os.getenv("LDA_OLLAMA_RPM", 600)), "burst": 2, "in_flight": 2},
+}
+DEFAULT_LIMITS = {"rpm": 60.0, "burst": 4, "in_flight": 4}
+
+MAX_RETRIES = 3             # retries per provider when there is nothing to fail over to
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_CAP_SECONDS = 30.0
+ACQUIRE_TIMEOUT_SECONDS = 120.0
+FAILOVER_WAIT_SECONDS = 2.0   # max wait for a busy provider when a fallback exists
+COOLDOWN_SECONDS = 10.0       # a throttled provider is skipped this long (or Retry-After)
+SLOT_POLL_SECONDS = 0.05      # async callers poll the shared in-flight semaphore
+
+
+class LimiterTimeout(TimeoutError):
+    """Raised when our own limiter, not the provider, kept a call waiting."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, ``capacity`` burst."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        # 0 when a token was taken, else the seconds until the next one
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self, timeout=ACQUIRE_TIMEOUT_SECONDS):
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    async def aacquire(self, timeout=ACQUIRE_TIMEOUT_SECONDS):
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._take()
+            if not wait:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    def penalize(self):
+        # A 429 means the provider's view of our budget is tighter than ours
+        with self._lock:
+            self.tokens = min(self.tokens, 0.0)
+
+
+class ProviderLimiter:
+    def __init__(self, rpm, burst, in_flight):
+        self.bucket = TokenBucket(rpm / 60.0, burst)
+        self.slots = threading.BoundedSemaphore(in_flight)
+        self.cooldown_until = 0.0
+
+    def cooling(self):
+        return time.monotonic() < self.cooldown_until
+
+    def cool_down(self, seconds):
+        self.bucket.penalize()
+        self.cooldown_until = max(self.cooldown_until, time.monotonic() + seconds)
+
+    @contextmanager
+    def slot(self, timeout=ACQUIRE_TIMEOUT_SECONDS):
+        if not self.bucket.acquire(timeout):
+            raise LimiterTimeout("Timed out waiting for the LLM rate limiter")
+        if not self.slots.acquire(timeout=timeout):
+            raise LimiterTimeout("Timed out waiting for an LLM request slot")
+        try:
+            yield self
+        finally:
+            self.slots.release()
+
+    @asynccontextmanager
+    async def aslot(self, timeout=ACQUIRE_TIMEOUT_SECONDS):
+        # Same bucket and semaphore as slot(), so sync and async callers share the limits
+        deadline = time.monotonic() + timeout
+        if not await self.bucket.aacquire(timeout):
+            raise LimiterTimeout("Timed out waiting for the LLM rate limiter")
+        while not self.slots.acquire(blocking=False):
+            if time.monotonic() > deadline:
+                raise LimiterTimeout("Timed out waiting for an LLM request slot")
+            await asyncio.sleep(SLOT_POLL_SECONDS)
+        try:
+            yield self
+        finally:
+            self.slots.release()
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+_LIMITS = PROVIDER_LIMITS  # this process's limits, see use_limits()
+
+
+def split_limits(workers, limits=PROVIDER_LIMITS):
+    """A copy of ``limits`` divided between ``workers`` processes sharing one budget.
+
+    Limits are per process, so every worker process installs its share with
+    ``use_limits(split_limits(workers))`` before its first LLM call; together
+    they stay inside one app instance's RPM.
+    """
+    return {
+        provider: {**values, "rpm": values["rpm"] / workers, "in_flight": max(1, values["in_flight"] // workers)}
+        for provider, values in limits.items()
+    }
+
+
+def use_limits(limits):
+    """Make ``limits`` this process's provider limits (limiters are rebuilt)."""
+    global _LIMITS
+    with _LIMITERS_LOCK:
+        _LIMITS = limits
+        _LIMITERS.clear()
+
+
+def get_limiter(provider):
+    with _LIMITERS_LOCK:
+        if provider not in _LIMITERS:
+            limits = _LIMITS.get(provider, DEFAULT_LIMITS)
+            _LIMITERS[provider] = ProviderLimiter(limits["rpm"], limits["burst"], limits["in_flight"])
+        return _LIMITERS[provider]
+
+
+# ---- CONNECTION POOL ----
+_HTTP_CLIENT = None
+
+
+def shared_http_client():
+    """One pooled httpx client for litellm-routed providers (keep-alive reuse)."""
+    global _HTTP_CLIENT
+    if _HTTP_CLIENT is None:
+        import httpx
+        _HTTP_CLIENT = httpx.Client(
+            limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            timeout=httpx.Timeout(120.0, connect=10.0),
+        )
+        try:
+            import litellm
+            litellm.client_session = _HTTP_CLIENT
+        except ImportError:
+            pass
+    return _HTTP_CLIENT
+
+
+# ---- ERROR CLASSIFICATION ----
+def _status_code(exc):
+    for attr in ("status_code", "status"):
+        code = getattr(exc, attr, None)
+        if isinstance(code, int):
+            return code
+    response = getattr(exc, "response", None)
+    return getattr(response, "status_code", None)
+
+
+def is_rate_limit_error(exc):
+    if _status_code(exc) == 429 or "RateLimit" in type(exc).__name__:
+        return True
+    text = str(exc).lower()
+    return "429" in text or "rate limit" in text or "rate_limit" in text or "too many requests" in text
+
+
+def is_transient_error(exc):
+    code = _status_code(exc)
+    if code is not None and code >= 500:
+        return True
+    name = type(exc).__name__
+    return isinstance(exc, (TimeoutError, ConnectionError)) or any(
+        word in name for word in ("Timeout", "Connection", "ServiceUnavailable", "InternalServer")
+    )
+
+
+def retry_after_seconds(exc):
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    # Full jitter: uniform(0, min(cap, base * 2^attempt)), never below Retry-After
+    delay = random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+
+# ---- ANSWERING MODELS ----
+_ANSWERS = contextvars.ContextVar("lda_llm_answers", default=None)
+
+
+@contextmanager
+def record_answers():
+    """Collect ``{task name: model}`` for the PooledLLM calls made in the block.
+
+    The model is the one that actually answered, i.e. a fallback when the
+    primary was throttled; several are joined with ",". crewai's threads
+    copy the caller's context, so their calls are recorded too.
+    """
+    answers = {}
+    token = _ANSWERS.set(answers)
+    try:
+        yield answers
+    finally:
+        _ANSWERS.reset(token)
+
+
+def _record_answer(task_name, model):
+    answers = _ANSWERS.get()
+    if answers is None or not task_name:
+        return
+    with _LIMITERS_LOCK:
+        models = set(filter(None, answers.get(task_name, "").split(",")))
+        answers[task_name] = ",".join(sorted(models | {model}))
+
+
+# ---- POOLED LLM ----
+@contextmanager
+def _own_retries():
+    # Inner provider calls run as if crewai's retry were already active, i.e. once
+    if _active_llm_rate_limit_retry is None:
+        yield
+        return
+    token = _active_llm_rate_limit_retry.set(True)
+    try:
+        yield
+    finally:
+        _active_llm_rate_limit_retry.reset(token)
+
+
+def _message_text(messages):
+    if isinstance(messages, str):
+        return messages
+    return "\n".join(str(m.get("content", "")) if isinstance(m, dict) else str(m) for m in messages)
+
+
+class PooledLLM(BaseLLM):
+    """crewai LLM that routes calls through per-provider rate limiters.
+
+    Each call waits for a token and an in-flight slot of its provider and
+    retries transient errors with jittered exponential backoff. A 429 puts
+    the provider in cooldown and the call fails over to the next LLM in
+    ``fallbacks``; later calls skip the cooling provider entirely. This is
+    the only retry layer: the wrapped LLMs are built with ``max_retries=0``
+    and crewai's own 429 retry is bypassed. ``acall`` does the same without
+    blocking the event loop.
+    """
+
+    primary: Any
+    primary_provider: str
+    fallbacks: List[Any] = []
+    fallback_providers: List[str] = []
+    stats: dict = {}
+
+    def chain(self):
+        return [(self.primary, self.primary_provider)] + list(zip(self.fallbacks, self.fallback_providers))
+
+    def call(self, messages, *args, **kwargs):
+        with self._span(messages, args, kwargs) as trace_span:
+            result = self._call(messages, args, kwargs, trace_span)
+            trace_span.set(completion_tokens=estimate_tokens(result))
+            return result
+
+    async def acall(self, messages, *args, **kwargs):
+        with self._span(messages, args, kwargs) as trace_span:
+            result = await self._acall(messages, args, kwargs, trace_span)
+            trace_span.set(completion_tokens=estimate_tokens(result))
+            return result
+
+    # crewai must not wrap these in its retry: that would multiply ours by three
+    call._crewai_rate_limit_wrapped = True
+    acall._crewai_rate_limit_wrapped = True
+
+    @staticmethod
+    def _task_name(args, kwargs):
+        # from_task is the fourth optional positional of BaseLLM.call
+        task = kwargs.get("from_task", args[3] if len(args) > 3 else None)
+        return getattr(task, "name", None)
+
+    def _span(self, messages, args, kwargs):
+        return span("llm_call", task=self._task_name(args, kwargs), model=self.model,
+                    prompt_tokens=estimate_tokens(_message_text(messages)))
+
+    def _answered(self, llm, provider, args, kwargs, trace_span):
+        self._count(provider, "ok")
+        trace_span.set(answered_by=llm.model)
+        _record_answer(self._task_name(args, kwargs), llm.model)
+
+    def _providers(self, trace_span):
+        # (llm, provider, limiter, has_fallback, slot wait) to try, in failover order
+        chain = self.chain()
+        for position, (llm, provider) in enumerate(chain):
+            limiter = get_limiter(provider)
+            has_fallback = position < len(chain) - 1
+            if has_fallback and limiter.cooling():
+                self._count(provider, "skipped")
+                continue
+            llm.stop = self.stop_sequences
+            trace_span.set(provider=provider)
+            yield llm, provider, limiter, has_fallback, FAILOVER_WAIT_SECONDS if has_fallback else ACQUIRE_TIMEOUT_SECONDS
+
+    def _retry_delay(self, exc, provider, limiter, has_fallback, attempt, trace_span):
+        """Seconds before retrying the same provider, None to fail over; other errors re-raise."""
+        if isinstance(exc, LimiterTimeout):
+            # our own limiter is saturated; don't queue behind it
+            if has_fallback:
+                return None
+            raise exc
+        if is_rate_limit_error(exc):
+            self._count(provider, "throttled")
+            trace_span.add("throttled")
+            limiter.cool_down(max(COOLDOWN_SECONDS, retry_after_seconds(exc) or 0.0))
+            if has_fallback:
+                return None  # fail over straight away
+        elif is_transient_error(exc):
+            self._count(provider, "retried")
+            trace_span.add("retries")
+        else:
+            raise exc
+        if attempt == MAX_RETRIES:
+            return None
+        return backoff_delay(attempt, retry_after_seconds(exc))
+
+    def _failed_over(self, provider, trace_span):
+        self._count(provider, "failed_over")
+        trace_span.add("failovers")
+
+    def _call(self, messages, args, kwargs, trace_span):
+        last_error = None
+        for llm, provider, limiter, has_fallback, wait in self._providers(trace_span):
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    with limiter.slot(wait), _own_retries():
+                        result = llm.call(messages, *args, **kwargs)
+                    self._answered(llm, provider, args, kwargs, trace_span)
+                    return result
+                except Exception as exc:
+                    last_error = exc
+                    delay = self._retry_delay(exc, provider, limiter, has_fallback, attempt, trace_span)
+                    if delay is None:
+                        break
+                    time.sleep(delay)
+            self._failed_over(provider, trace_span)
+        raise last_error
+
+    async def _acall(self, messages, args, kwargs, trace_span):
+        last_error = None
+        for llm, provider, limiter, has_fallback, wait in self._providers(trace_span):
+            for attempt in range(MAX_RETRIES + 1):
+                try:
+                    async with limiter.aslot(wait):
+                        with _own_retries():
+                            result = await llm.acall(messages, *args, **kwargs)
+                    self._answered(llm, provider, args, kwargs, trace_span)
+                    return result
+                except Exception as exc:
+                    last_error = exc
+                    delay = self._retry_delay(exc, provider, limiter, has_fallback, attempt, trace_span)
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+            self._failed_over(provider, trace_span)
+        raise last_error
+
+    def _count(self, provider, outcome):
+        # calls of one agent run on several crewai threads at once
+        key = f"{provider}.{outcome}"
+        with _LIMITERS_LOCK:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def supports_function_calling(self):
+        return self.primary.supports_function_calling()
+
+    def supports_stop_words(self):
+        return self.primary.supports_stop_words()
+
+    def get_context_window_size(self):
+        return self.primary.get_context_window_size()
+
+
+def pooled_llm(primary, provider, fallbacks=()):
+    """Wrap ``primary`` (and ``(llm, provider)`` fallbacks) in a PooledLLM."""
+    shared_http_client()
+    return PooledLLM(
+        model=primary.model,
+        temperature=primary.temperature,
+        max_tokens=primary.max_tokens,
+        primary=primary,
+        primary_provider=provider,
+        fallbacks=[llm for llm, _ in fallbacks],
+        fallback_providers=[name for _, name in fallbacks],
+        stats={},
+    )
@@ -0,0 +1,127 @@
+"""Local OpenAI-compatible chat server that simulates throttling and latency.
+
+Requests with ``"stream": true`` get the answer as ``text/event-stream``
+chunks, like the real providers, so streamed agent calls work against it.
+
+Point a provider at it to exercise llm_clients without real API calls:
+
+    python mock_llm_server.py --port 8765 --fail-rate 0.3 --latency 0.5
+    OPENROUTER_BASE_URL=http://127.0.0.1:8765/v1 streamlit run app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_ANSWER = "Thought: I now know the final answer\nFinal Answer: - mock insight"
+# Returned when the client asks for structured output; valid for VizPlan and InterpretationPlan
+CANNED_JSON = json.dumps({"plots": [], "chart_explanation": []})
+STREAM_CHUNK_CHARS = 8  # content characters per SSE chunk
+
+
+def make_handler(fail_rate, latency, fail_first, retry_after):
+    counter = {"requests": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body, headers=None):
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def _stream(self, completion):
+            # One chat.completion.chunk per STREAM_CHUNK_CHARS, then usage and [DONE];
+            # HTTP/1.0 closes the connection, which ends the body
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            content = completion["choices"][0]["message"]["content"]
+            base = {key: completion[key] for key in ("id", "created", "model")}
+            chunks = [{"role": "assistant", "content": content[i:i + STREAM_CHUNK_CHARS]}
+                      for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+            events = [{**base, "object": "chat.completion.chunk",
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": None}]} for delta in chunks]
+            events.append({**base, "object": "chat.completion.chunk",
+                           "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                           "usage": completion["usage"]})
+            for event in events:
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            with lock:
+                counter["requests"] += 1
+                n = counter["requests"]
+            time.sleep(latency)
+
+            if n <= fail_first or random.random() < fail_rate:
+                self._send(
+                    429,
+                    {"error": {"message": "Rate limit exceeded", "type": "rate_limit_error", "code": 429}},
+                    {"Retry-After": str(retry_after)},
+                )
+                return
+
+            completion = {
+                "id": f"mock-{n}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{
+                    "index": 0,
+                    "message": {
+                        "role": "assistant",
+                        "content": CANNED_JSON if request.get("response_format") else CANNED_ANSWER,
+                    },
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+            }
+            if request.get("stream"):
+                self._stream(completion)
+            else:
+                self._send(200, completion)
+
+    Handler.counter = counter
+    return Handler
+
+
+def serve(port=8765, fail_rate=0.0, latency=0.0, fail_first=0, retry_after=0):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(fail_rate, latency, fail_first, retry_after))
+    server.counter = server.RequestHandlerClass.counter  # {"requests": n}, for tests
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="probability of a 429 per request")
+    parser.add_argument("--fail-first", type=int, default=0, help="always 429 the first N requests")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--retry-after", type=int, default=0, help="Retry-After header on 429s")
+    args = parser.parse_args()
+
+    server = serve(args.port, args.fail_rate, args.latency, args.fail_first, args.retry_after)
+    print(f"Mock LLM server on http://127.0.0.1:{args.port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
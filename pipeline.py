@@ -1,44 +1,108 @@
-import pandas as pd
-from crewai import Agent, Task, Crew
-from crewai import LLM
 from pydantic import BaseModel
 from typing import List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import functools
+import threading
+import time
 
 from dotenv import load_dotenv
 import os
 
+from dataset_registry import resolve_dataset
+from delay_analytics import format_delay_facts
+from delay_features import describe_derived
+from prompt_budget import build_data_context, build_viz_context, prompt_token_report
+from result_cache import CachedTaskOutput, get_result_cache, llm_settings, task_cache_key
+from tracing import adopt, record_span, run_in_context, span, start_trace
+
+# crewai (and litellm under it) is imported on first use, not with this module:
+# the Streamlit process only needs TASK_NAMES and the output models.
 
 load_dotenv()
 # os.environ["OPENAI_API_KEY"] = "dummy" 
+# API keys are read from the environment when the LLMs are first built;
+# providers without a key are left out of the failover chain.
+
+# Stream completions token by token so the UI can show answers as they are written
+STREAM_TOKENS = os.getenv("LDA_STREAM_TOKENS", "1") == "1"
+
+_RESOURCES = {}
+_RESOURCES_LOCK = threading.RLock()
+
+
+def cache_resource(factory):
+    """Build once per process on first call and share the result (like st.cache_resource)."""
+    @functools.wraps(factory)
+    def wrapper():
+        if factory.__name__ not in _RESOURCES:
+            with _RESOURCES_LOCK:
+                if factory.__name__ not in _RESOURCES:
+                    _RESOURCES[factory.__name__] = factory()
+        return _RESOURCES[factory.__name__]
+    return wrapper
+
+
+# ---- LLMS ----
+def configured_providers():
+    """Providers with credentials in the environment, in failover order."""
+    providers = [name for name, var in (("openrouter", "OPENROUTER_API_KEY"), ("groq", "GROQ_API_KEY"))
+                 if os.getenv(var)]
+    if os.getenv("OLLAMA_BASE_URL"):
+        providers.append("ollama")
+    return providers
+
+
+@cache_resource
+def get_llms():
+    from crewai import LLM
+    from llm_clients import pooled_llm
+
+    providers = configured_providers()
+    if not providers:
+        raise RuntimeError("No LLM provider configured: set OPENROUTER_API_KEY, GROQ_API_KEY "
+                           "or OLLAMA_BASE_URL (e.g. in .env)")
+    llms = {}
+
+    if "groq" in providers:
+        llms["groq_llm"] = LLM(
+            model="groq/meta-llama/llama-guard-4-12b", 
+            api_key=os.getenv("GROQ_API_KEY"),
+            max_tokens=500,
+            temperature=0.1,
+            max_retries=0,  # PooledLLM retries and fails over
+            stream=STREAM_TOKENS
+        )
+
+    if "openrouter" in providers:
+        llms["openrouter_llm"] = LLM(
+            model="openrouter/mistralai/devstral-2512:free",
+            api_key=os.getenv("OPENROUTER_API_KEY"),
+            base_url=os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+            temperature=0.1,
+            max_tokens=850,
+            max_retries=0,  # PooledLLM retries and fails over
+            stream=STREAM_TOKENS
+        )
+
+    ### IN CASE GROQ FAILS ###
+    # Local Ollama fallback, enabled by setting OLLAMA_BASE_URL (e.g. http://localhost:11434)
+    if "ollama" in providers:
+        llms["ollama_llm"] = LLM(
+            model=os.getenv("OLLAMA_MODEL", "ollama/llama3"),          # Format: ollama/[model_name]
+            base_url=os.getenv("OLLAMA_BASE_URL"),
+            max_retries=0,  # PooledLLM retries and fails over
+            stream=STREAM_TOKENS
+        )
+
+    # Shared, rate-limited client used by every agent: per-provider token
+    # bucket + in-flight cap, jittered backoff, failover openrouter -> groq (-> ollama)
+    chain = [(llms[f"{name}_llm"], name) for name in providers]
+    llms["fallback_llms"] = chain[1:]
+    llms["agent_llm"] = pooled_llm(*chain[0], fallbacks=chain[1:])
+    return llms
 
-os.environ["GROQ_API_KEY"] = os.getenv("GROQ_API_KEY")
-os.environ["DEEPSEEK_API_KEY"] = os.getenv("DEEPSEEK_API_KEY")
-os.environ["OPENROUTER_API_KEY"] = os.getenv("OPENROUTER_API_KEY")
-
-# Create ONE LLM instance
-groq_llm = LLM(
-    model="groq/meta-llama/llama-guard-4-12b", 
-    api_key=os.getenv("GROQ_API_KEY"),
-    max_tokens=500,
-    temperature=0.1,
-    max_retries=3
-)
-
-openrouter_llm = LLM(
-    model="openrouter/mistralai/devstral-2512:free",
-    api_key=os.getenv("OPENROUTER_API_KEY"),
-    base_url="https://openrouter.ai/api/v1",
-    temperature=0.1,
-    max_tokens=850
-)
-
-
-### IN CASE GROQ FAILS ###
-# ollama_llm = LLM(
-#     model="ollama/llama3",          # Format: ollama/[model_name]
-#     base_url="http://localhost:11434", # Default local Ollama endpoint
-#     max_retries=3
-# )
 
 # --- For the Visualization Agent ---
 class PlotConfig(BaseModel):
@@ -64,116 +128,180 @@ class InterpretationPlan(BaseModel):
 
 
 # ---- AGENTS ----
+AGENT_NAMES = ("data_agent", "delay_agent", "recommendation_agent", "viz_agent", "viz_interpreter_agent")
+
+
+@cache_resource
+def get_agents():
+    from crewai import Agent
 
-# Data Understanding Agent
-data_agent = Agent(
-    role="Logistics Data Understanding Agent",
-    goal="""
-    Understand unknown logistics CSV data and extract
-    information relevant for delay analysis.
-    """,
-    backstory="""
-    You are an expert in exploratory data analysis who can
-    interpret messy enterprise logistics datasets without
-    prior knowledge of their schema.
-    """,
-    allow_delegation=False,
-    llm=openrouter_llm
-)
-
-# Delay Cause Agent
-delay_agent = Agent(
-    role="Delay Cause Intelligence Agent",
-    goal="""
-    Identify why shipment delays occurred by analyzing
-    patterns in the structured logistics data.
-    """,
-    backstory="""
-    You specialize in uncovering operational, environmental,
-    and systemic causes of logistics delays.
-    """,
-    allow_delegation=False,
-     llm=openrouter_llm
-)
-
-# Recommendation Agent
-recommendation_agent = Agent(
-    role="Logistics Optimization Advisor",
-    goal="""
-    Generate actionable insights and recommendations
-    to reduce future logistics delays.
-    """,
-    backstory="""
-    You translate analytical findings into practical
-    business decisions for logistics teams.
-    """,
-    allow_delegation=False,
-    llm=openrouter_llm
-)
-
-viz_agent = Agent(
-      role="Logistics Analytics & Visualization Agent",
-      goal="""
-      Decide which charts and metrics best explain
-      shipment delays and operational issues.
-      """,
-      backstory="""
-      You are a data analyst specializing in logistics KPIs.
-      You interpret computed statistics and recommend
-      meaningful visualizations.
-      """,
-      allow_delegation=False,
-      max_iter = 5,
-      llm=openrouter_llm
+    agent_llm = get_llms()["agent_llm"]
+
+    # Data Understanding Agent
+    data_agent = Agent(
+        role="Logistics Data Understanding Agent",
+        goal="""
+        Understand unknown logistics CSV data and extract
+        information relevant for delay analysis.
+        """,
+        backstory="""
+        You are an expert in exploratory data analysis who can
+        interpret messy enterprise logistics datasets without
+        prior knowledge of their schema.
+        """,
+        allow_delegation=False,
+        llm=agent_llm
+    )
+
+    # Delay Cause Agent
+    delay_agent = Agent(
+        role="Delay Cause Intelligence Agent",
+        goal="""
+        Identify why shipment delays occurred by analyzing
+        patterns in the structured logistics data.
+        """,
+        backstory="""
+        You specialize in uncovering operational, environmental,
+        and systemic causes of logistics delays.
+        """,
+        allow_delegation=False,
+         llm=agent_llm
     )
 
-viz_interpreter_agent = Agent(
-    role="Data Visualization Interpreter",
-    goal="Explain what each visualization reveals in clear business language",
-    backstory="""
-    You are an expert data analyst who explains charts to non-technical stakeholders.
-    You do not create plots or choose columns.
-    You only interpret what the chart shows and what it means for the business.
-    """,
-    verbose=True,
-    allow_delegation=False,
-    llm=openrouter_llm
-)
+    # Recommendation Agent
+    recommendation_agent = Agent(
+        role="Logistics Optimization Advisor",
+        goal="""
+        Generate actionable insights and recommendations
+        to reduce future logistics delays.
+        """,
+        backstory="""
+        You translate analytical findings into practical
+        business decisions for logistics teams.
+        """,
+        allow_delegation=False,
+        llm=agent_llm
+    )
 
+    viz_agent = Agent(
+          role="Logistics Analytics & Visualization Agent",
+          goal="""
+          Decide which charts and metrics best explain
+          shipment delays and operational issues.
+          """,
+          backstory="""
+          You are a data analyst specializing in logistics KPIs.
+          You interpret computed statistics and recommend
+          meaningful visualizations.
+          """,
+          allow_delegation=False,
+          max_iter = 5,
+          llm=agent_llm
+        )
+
+    viz_interpreter_agent = Agent(
+        role="Data Visualization Interpreter",
+        goal="Explain what each visualization reveals in clear business language",
+        backstory="""
+        You are an expert data analyst who explains charts to non-technical stakeholders.
+        You do not create plots or choose columns.
+        You only interpret what the chart shows and what it means for the business.
+        """,
+        verbose=True,
+        allow_delegation=False,
+        llm=agent_llm
+    )
 
-# ---- TASKS ----
-def create_tasks(csv_file):
-    df = pd.read_csv(csv_file)
-    total_rows = len(df) 
-    columns = list(df.columns)
-    sample = df.head(5).to_dict(orient="records")
+    return {name: agent for name, agent in zip(AGENT_NAMES, (
+        data_agent, delay_agent, recommendation_agent, viz_agent, viz_interpreter_agent))}
 
-    numeric_summary = df.describe(include="all").fillna("").to_dict()
 
-    # Optional delay inference helpers
-    unique_values = {
-        col: df[col].dropna().unique()[:10].tolist()
-        for col in df.columns
-    }
+def __getattr__(name):
+    # pipeline.data_agent, pipeline.agent_llm, ... build on first access
+    if name in AGENT_NAMES:
+        return get_agents()[name]
+    if name in ("groq_llm", "openrouter_llm", "ollama_llm", "agent_llm", "fallback_llms"):
+        llms = get_llms()
+        if name in llms:
+            return llms[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    task_data_understanding = Task(
-        description=f"""
-        You are given a logistics dataset that has ALREADY been loaded and analyzed.
-        Dataset metadata:
+
+# ---- TASKS ----
+TASK_NAMES = [
+    "data_understanding",
+    "delay_analysis",
+    "recommendation",
+    "visualization",
+    "viz_interpretation",
+]
+
+
+def _prompt_fields(handle, profile, aggregates, compact):
+    # (dataset metadata, viz columns, viz sample) for the data and viz prompts
+    total_rows = profile.total_rows
+    derived = (
+        "\n          Columns derived from timestamps (exact, computed over all rows):\n"
+        + describe_derived(handle.derived)
+    ) if handle.derived else ""
+
+    if compact:
+        # Token-budgeted tables; low-value columns (IDs, addresses) summarized
+        with span("build_data_context") as s:
+            data_ctx = build_data_context(profile, aggregates)
+            s.set(tokens=data_ctx["tokens"])
+        with span("build_viz_context") as s:
+            viz_ctx = build_viz_context(profile)
+            s.set(tokens=viz_ctx.get("tokens"))
+        dataset_metadata = f"""
+          - Total rows: {total_rows}
+          - Columns: {data_ctx["columns"]}
+          Sample rows (most relevant columns):
+{data_ctx["sample"]}
+          Column statistics (precomputed):
+{data_ctx["column_stats"]}
+          Unique sample values (low-cardinality columns):
+{data_ctx["unique_values"]}
+          Columns left out as low value: {data_ctx["omitted"]}
+          Precomputed delay facts (exact, computed over all rows):
+{data_ctx["delay_facts"]}{derived}"""
+        viz_columns = viz_ctx["columns"]
+        viz_sample = viz_ctx["sample"]
+    else:
+        columns = profile.columns
+        sample = profile.sample
+        numeric_summary = profile.numeric_summary()
+        # Optional delay inference helpers
+        unique_values = profile.unique_values()
+        # Exact delay facts computed over every row (not a sample)
+        delay_facts = format_delay_facts(aggregates)
+        dataset_metadata = f"""
           - Total rows: {total_rows}
           - Columns: {columns}
           Sample rows:{sample}
           Column statistics (precomputed):{numeric_summary}
           Unique sample values per column:{unique_values}
+          Precomputed delay facts (exact, computed over all rows):
+{delay_facts}{derived}"""
+        viz_columns = columns
+        viz_sample = sample
+    return dataset_metadata, viz_columns, viz_sample
+
+
+def _data_task_description(dataset_metadata):
+    return f"""
+        You are given a logistics dataset that has ALREADY been loaded and analyzed.
+        Dataset metadata:{dataset_metadata}
         Your responsibilities:
 
         1. Load and inspect the dataset using actual rows (not just schema).
         2. Identify which columns indicate shipment delay.
           - This may be an explicit binary column (e.g., is_delayed, Logistics_Delay),
             shipment status values (Delayed / Delivered),
-            or inferred from timestamps (expected vs actual dates).
+            or inferred from timestamps (expected vs actual dates; slips already
+            derived from them are listed in the metadata).
         3. Identify columns that may contribute to delays.
-        4. Compute factual summaries from the data, including:
+        4. Report factual summaries using the precomputed delay facts, including:
           - Total number of records
           - Number and percentage of delayed shipments
           - Aggregated statistics for delayed vs non-delayed shipments
@@ -189,12 +317,102 @@ def create_tasks(csv_file):
         - Do NOT assume access to raw CSV
         - Use ONLY the provided information
         - Do NOT perform new calculations
-        """,
+        """
+
+
+def _viz_task_description(viz_columns, viz_sample):
+    return f"""
+        You are a data visualization planner.
+
+        You are given a logistics dataset with the following information:
+
+         Column names:
+        {viz_columns}
+
+         Sample rows (first 5):
+        {viz_sample}
+
+        Your job is to generate visualization plan that can be
+        directly executed in Python.
+
+       Rules:
+        - Generate at most 5 plots (fewer is allowed)
+        - Use ONLY column names that actually exist in the dataset
+        - Do NOT invent data, values, or columns
+        - Set unused fields (x, y, column, aggregation, top_k) to null
+
+        Chart-specific rules:
+        - Pie chart:
+          - Provide ONLY: chart_type, column, metric, insight, top_k
+          - Do NOT provide x or y
+          - Include `top_k` only if category limiting is clearly required
+          - If uncertain, set `top_k` to null
+          - The executor will determine an appropriate limit based on data cardinality
+
+        - Histogram:
+          - You must provide exact column name from data
+          - Set y = null
+          - Do NOT provide top_k
+
+        - Bar chart:
+          - Always provide x
+          - If aggregation is mean or sum, provide y
+          - If aggregation is count, set y = null
+          - Always provide aggregation
+          - Include `top_k` only if category limiting is clearly required
+          - If uncertain, set `top_k` to null
+          - The executor will determine an appropriate limit based on data cardinality
+
+        - Line chart:
+          - Always provide x and y
+          - Always provide aggregation
+
+        - Scatter plot:
+          - Always provide x and y
+          - Do NOT provide aggregation or top_k
+        """
+
+
+def uncompacted_prompt_tokens(handle, tasks):
+    """``prompt_token_report`` against ``create_tasks(handle, compact=False)``.
+
+    Only the data and viz prompts depend on ``compact``; they are rendered
+    from the cached profile without building a second set of tasks.
+    """
+    dataset_metadata, viz_columns, viz_sample = _prompt_fields(
+        handle, handle.profile(), handle.delay_aggregates(), compact=False)
+    before = [task.description for task in tasks]
+    before[0] = _data_task_description(dataset_metadata)
+    before[3] = _viz_task_description(viz_columns, viz_sample)
+    return prompt_token_report(before, tasks, TASK_NAMES)
+
+
+def create_tasks(dataset, compact=True):
+    with span("create_tasks", compact=compact):
+        return _create_tasks(dataset, compact)
+
+
+def _create_tasks(dataset, compact):
+    from crewai import Task
+
+    agents = get_agents()
+    # Bounded-memory profile (streamed from disk for large files)
+    handle = resolve_dataset(dataset)
+    with span("profile") as s:
+        profile = handle.profile()
+        s.set(rows=profile.total_rows, columns=len(profile.columns))
+    with span("delay_aggregates") as s:
+        aggregates = handle.delay_aggregates()
+        s.set(rows=profile.total_rows)
+    dataset_metadata, viz_columns, viz_sample = _prompt_fields(handle, profile, aggregates, compact)
+
+    task_data_understanding = Task(
+        description=_data_task_description(dataset_metadata),
         expected_output="""
         Output a bullet point, fact-based summary derived strictly from the dataset.
         Do not rely on column names alone.
         """,
-        agent=data_agent
+        agent=agents["data_agent"]
     )
 
     task_delay_analysis = Task(
@@ -221,7 +439,7 @@ def create_tasks(csv_file):
         expected_output="""
         Output a ranked bullet points of inferred delay causes with evidence-based explanations.
         """,
-        agent=delay_agent
+        agent=agents["delay_agent"]
     )
 
     task_recommendation = Task(
@@ -243,60 +461,11 @@ def create_tasks(csv_file):
         Clear insights and practical recommendations for
         logistics stakeholders in bullet points.
         """,
-        agent=recommendation_agent
+        agent=agents["recommendation_agent"]
     )
 
     viz_task = Task(
-        description=f"""
-        You are a data visualization planner.
-
-        You are given a logistics dataset with the following information:
-
-         Column names:
-        {list(df.columns)}
-
-         Sample rows (first 5):
-        {df.head(5).to_dict(orient="records")}
-
-        Your job is to generate visualization plan that can be
-        directly executed in Python.
-
-       Rules:
-        - Generate at most 5 plots (fewer is allowed)
-        - Use ONLY column names that actually exist in the dataset
-        - Do NOT invent data, values, or columns
-        - Set unused fields (x, y, column, aggregation, top_k) to null
-
-        Chart-specific rules:
-        - Pie chart:
-          - Provide ONLY: chart_type, column, metric, insight, top_k
-          - Do NOT provide x or y
-          - Include `top_k` only if category limiting is clearly required
-          - If uncertain, set `top_k` to null
-          - The executor will determine an appropriate limit based on data cardinality
-
-        - Histogram:
-          - You must provide exact column name from data
-          - Set y = null
-          - Do NOT provide top_k
-
-        - Bar chart:
-          - Always provide x
-          - If aggregation is mean or sum, provide y
-          - If aggregation is count, set y = null
-          - Always provide aggregation
-          - Include `top_k` only if category limiting is clearly required
-          - If uncertain, set `top_k` to null
-          - The executor will determine an appropriate limit based on data cardinality
-
-        - Line chart:
-          - Always provide x and y
-          - Always provide aggregation
-
-        - Scatter plot:
-          - Always provide x and y
-          - Do NOT provide aggregation or top_k
-        """,
+        description=_viz_task_description(viz_columns, viz_sample),
         expected_output="""
         YOUR OUTPUT MUST BE ONLY THE JSON FOLLOWING VizPlan Schema. 
         EXAMPLE FORMAT:
@@ -315,7 +484,8 @@ def create_tasks(csv_file):
           ]
         }
         """,
-        agent=viz_agent,
+        agent=agents["viz_agent"],
+        context=[],  # schema only, never the analysis outputs, in every run mode
         output_pydantic=VizPlan
         # return_json=True
       )
@@ -340,7 +510,7 @@ def create_tasks(csv_file):
           "chart_explanation": "Clear explanation of what the chart shows"
         }
         """,
-        agent=viz_interpreter_agent,
+        agent=agents["viz_interpreter_agent"],
         context=[viz_task],
         output_pydantic=InterpretationPlan
         # return_json=True
@@ -356,22 +526,320 @@ def create_tasks(csv_file):
 
 
 # ---- PIPELINE RUNNER ----
-def run_pipeline(csv_path):
-   
-    tasks = create_tasks(csv_path)
-
-    tasks[0].agent = data_agent
-    tasks[1].agent = delay_agent
-    tasks[2].agent = recommendation_agent
-    tasks[3].agent = viz_agent
-    tasks[4].agent = viz_interpreter_agent
-
-    crew = Crew(
-        agents=[data_agent, delay_agent, recommendation_agent,viz_agent, viz_interpreter_agent],
-        tasks=tasks,
-        verbose=True
+
+# Task DAG: the visualization branch only needs column names and sample
+# rows, so it is independent of the data -> delay -> recommendation chain.
+ANALYSIS_BRANCH = (0, 1, 2)
+VIZ_BRANCH = (3, 4)
+
+
+# tasks_output positions that carry a pydantic model
+OUTPUT_MODELS = {3: VizPlan, 4: InterpretationPlan}
+
+
+def _upstream(index):
+    # The task whose output task ``index`` builds on: the previous one in its branch
+    branch = ANALYSIS_BRANCH if index in ANALYSIS_BRANCH else VIZ_BRANCH
+    position = branch.index(index)
+    return branch[position - 1] if position else None
+
+
+def task_cache_keys(dataset_key, tasks, answered=None):
+    """Result-cache key of each task in ``tasks`` (named, in pipeline order).
+
+    Keys chain along the task's DAG branch only, so a task has the same key
+    in parallel and sequential runs and in rerun_task. ``answered`` (from
+    llm_clients.record_answers) swaps in the model that actually answered a
+    task: an output written by a fallback, and everything downstream of it,
+    is stored under the fallback's key, never served for the primary's.
+    """
+    keys, by_index = [], {}
+    for task in tasks:
+        index = TASK_NAMES.index(task.name)
+        parent = by_index.get(_upstream(index), "")
+        settings = llm_settings(task.agent)
+        if answered and task.name in answered:
+            settings["model"] = answered[task.name]
+        by_index[index] = task_cache_key(dataset_key, task, parent, settings)
+        keys.append(by_index[index])
+    return keys
+
+
+def _cacheable(task, output):
+    # Structured answers that don't parse are never cached; typed_output
+    # re-runs the task and caches the repaired output instead
+    if not task.output_pydantic:
+        return True
+    from structured_output import parse_output
+
+    return parse_output(output, task.output_pydantic)[0] is not None
+
+
+def task_output_to_dict(output):
+    # JSON-safe form of a TaskOutput / CachedTaskOutput for persistence
+    json_dict = getattr(output, "json_dict", None)
+    model = getattr(output, "pydantic", None)
+    if json_dict is None and model is not None:
+        json_dict = model.model_dump()
+    return {"raw": str(output.raw), "json_dict": json_dict}
+
+
+def task_output_from_dict(index, stored):
+    output = CachedTaskOutput(raw=stored["raw"], json_dict=stored.get("json_dict"))
+    model = OUTPUT_MODELS.get(index)
+    if model is not None and output.json_dict:
+        output.pydantic = model.model_validate(output.json_dict)
+    return output
+
+
+@dataclass
+class PipelineResult:
+    # tasks_output keeps the sequential ordering app.py indexes into
+    tasks_output: list
+    timings: dict = field(default_factory=dict)
+    prompt_tokens: dict = field(default_factory=dict)
+    trace: dict = field(default_factory=dict)  # tracing.Trace.to_dict()
+    viz_planner: str = "llm"  # "rules": tasks_output[3] is the rule plan
+    viz_check: dict = field(default_factory=dict)  # checked plan stored by the job worker
+
+    @property
+    def raw(self):
+        return self.tasks_output[-1].raw if self.tasks_output else ""
+
+
+def _inject_cached_context(task, upstream):
+    # The upstream task is served from cache, so hand its text over explicitly
+    task.context = []
+    task.description = (
+        f"{task.description}\n\n"
+        f"Output of the previous task (use it as context):\n{upstream.raw}"
     )
 
-    result = crew.kickoff()
+
+def _kickoff_branch(tasks, name, dataset_key=None, cache=None, on_task_complete=None):
+    with span(f"branch:{name}", tasks=len(tasks)) as branch:
+        result = _run_branch(tasks, name, dataset_key, cache, on_task_complete, branch)
+        branch.set(cached_tasks=result[3])
+        return result
+
+
+def _run_branch(tasks, name, dataset_key, cache, on_task_complete, branch):
+    from crewai import Crew
+    from llm_clients import record_answers
+
+    start = time.perf_counter()
+    outputs = []
+    keys = task_cache_keys(dataset_key, tasks)
+
+    # Longest cached prefix of the chain; everything after it is re-run
+    if cache is not None:
+        for task, key in zip(tasks, keys):
+            hit = cache.get(key)
+            if hit is None:
+                break
+            if task.output_pydantic and hit.json_dict:
+                hit.pydantic = task.output_pydantic.model_validate(hit.json_dict)
+            outputs.append(hit)
+            now = time.perf_counter()
+            record_span(f"task:{task.name}", now, now, parent=branch, cached=True)
+            if on_task_complete is not None:
+                on_task_complete(task, hit)
+
+    remaining = tasks[len(outputs):]
+    if remaining:
+        served = {TASK_NAMES.index(task.name): output for task, output in zip(tasks, outputs)}
+        parent = _upstream(TASK_NAMES.index(remaining[0].name))
+        if parent in served:
+            _inject_cached_context(remaining[0], served[parent])
+        # A task's span runs from the previous task's completion to its own
+        last_done = [time.perf_counter()]
+
+        def task_done(output, task):
+            now = time.perf_counter()
+            task_span = record_span(f"task:{task.name}", last_done[0], now, parent=branch,
+                                    cached=False, output_chars=len(str(output.raw)))
+            last_done[0] = now
+            # LLM calls ran on crewai's threads; hang them under their task
+            adopt(task_span, lambda s: s.name == "llm_call" and s.attrs.get("task") == task.name)
+            if on_task_complete is not None:
+                on_task_complete(task, output)
+
+        for task in remaining:
+            task.callback = (lambda output, task=task: task_done(output, task))
+        crew = Crew(
+            agents=[task.agent for task in remaining],
+            tasks=remaining,
+            verbose=True
+        )
+        with record_answers() as answered:
+            fresh = crew.kickoff().tasks_output
+        if cache is not None:
+            stored = task_cache_keys(dataset_key, tasks, answered)
+            for task, key, output in zip(remaining, stored[len(outputs):], fresh):
+                if _cacheable(task, output):
+                    cache.put(key, output)
+        outputs.extend(fresh)
+
+    return name, outputs, time.perf_counter() - start, len(tasks) - len(remaining)
+
+
+def run_pipeline(dataset, parallel=False, use_cache=True, on_task_complete=None, viz_planner="llm",
+                 on_token=None):
+    # dataset: DatasetHandle, registry key or CSV path (parsed only once)
+    # on_task_complete(index, output) fires as each of the five tasks finishes
+    # on_token(index, text) fires per streamed chunk with the answer so far
+    # viz_planner="rules": the plot plan comes from rule_planner, not viz_agent
+    with start_trace("run_pipeline", parallel=parallel, use_cache=use_cache, viz_planner=viz_planner) as trace:
+        result = _run_pipeline(dataset, parallel, use_cache, on_task_complete, viz_planner, on_token)
+    result.trace = trace.to_dict()
     return result
+
+
+@contextmanager
+def _stream_tokens(tasks, on_token, timings, start):
+    # crewai emits stream chunks synchronously and in order, tagged with the task id
+    if on_token is None:
+        yield
+        return
+    from crewai.events.event_bus import crewai_event_bus
+    from crewai.events.types.llm_events import LLMStreamChunkEvent
+
+    positions = {str(task.id): i for i, task in enumerate(tasks)}
+    answers = {}  # index -> (call_id, text so far); a new LLM call starts over
+    lock = threading.Lock()
+
+    def handler(source, event):
+        index = positions.get(getattr(event, "task_id", None))
+        if index is None or not event.chunk:
+            return
+        with lock:
+            call_id, text = answers.get(index, (None, ""))
+            if call_id != event.call_id:
+                text = ""
+            text += event.chunk
+            answers[index] = (event.call_id, text)
+            timings.setdefault("first_token", time.perf_counter() - start)
+        on_token(index, text)
+
+    crewai_event_bus.register_handler(LLMStreamChunkEvent, handler)
+    try:
+        yield
+    finally:
+        crewai_event_bus.off(LLMStreamChunkEvent, handler)
+
+
+def _run_pipeline(dataset, parallel, use_cache, on_task_complete, viz_planner, on_token):
+    with span("resolve_dataset"):
+        handle = resolve_dataset(dataset)
+    cache = get_result_cache() if use_cache else None
+    start = time.perf_counter()
+    tasks = create_tasks(handle)
+    timings = {"prompt_build": time.perf_counter() - start}
+    prompt_tokens = uncompacted_prompt_tokens(handle, tasks)
+
+    for task, agent_name in zip(tasks, AGENT_NAMES):
+        task.agent = get_agents()[agent_name]
+    for task, name in zip(tasks, TASK_NAMES):
+        task.name = name
+
+    task_done = None
+    if on_task_complete is not None:
+        positions = {id(task): i for i, task in enumerate(tasks)}
+        task_done = lambda task, output: on_task_complete(positions[id(task)], output)
+
+    start = time.perf_counter()
+    viz_branch = list(VIZ_BRANCH)
+    rule_output = None
+    if viz_planner == "rules":
+        from rule_planner import rule_plan_output
+
+        with span("rule_plan"):
+            rule_output = rule_plan_output(handle)
+        timings["rule_plan"] = time.perf_counter() - start
+        viz_branch.remove(3)
+        _inject_cached_context(tasks[4], rule_output)
+        if on_task_complete is not None:
+            on_task_complete(3, rule_output)
+
+    with _stream_tokens(tasks, on_token, timings, start):
+        tasks_output, cache_hits = _run_tasks(tasks, handle, cache, parallel, viz_branch,
+                                              rule_output, task_done, timings)
+    timings["cached_tasks"] = cache_hits
+    timings["wall"] = time.perf_counter() - start
+    return PipelineResult(tasks_output=tasks_output, timings=timings, prompt_tokens=prompt_tokens,
+                          viz_planner=viz_planner)
+
+
+def _run_tasks(tasks, handle, cache, parallel, viz_branch, rule_output, task_done, timings):
+    cache_hits = 0
+    if parallel:
+        branches = {
+            "analysis": [tasks[i] for i in ANALYSIS_BRANCH],
+            "visualization": [tasks[i] for i in viz_branch],
+        }
+        with ThreadPoolExecutor(max_workers=len(branches)) as pool:
+            futures = [
+                # run_in_context: branch spans nest under this trace
+                pool.submit(run_in_context(_kickoff_branch), branch, name, handle.key, cache, task_done)
+                for name, branch in branches.items()
+            ]
+            results = {}
+            for future in futures:
+                name, outputs, elapsed, hits = future.result()
+                results[name] = outputs
+                timings[name] = elapsed
+                cache_hits += hits
+        tasks_output = results["analysis"] + results["visualization"]
+        if rule_output is not None:
+            tasks_output.insert(3, rule_output)
+        # what the same branches would have cost back to back
+        timings["sequential_estimate"] = timings["analysis"] + timings["visualization"]
+    else:
+        run = [task for i, task in enumerate(tasks) if i != 3 or rule_output is None]
+        _, tasks_output, elapsed, cache_hits = _kickoff_branch(run, "sequential", handle.key, cache, task_done)
+        if rule_output is not None:
+            tasks_output.insert(3, rule_output)
+        timings["sequential"] = elapsed
+    return tasks_output, cache_hits
+
+
+def rerun_task(dataset, index, tasks_output, feedback=None, use_cache=True, accept=None,
+               viz_planner="llm"):
+    """Re-run only task ``index`` on top of the existing upstream outputs.
+
+    ``feedback`` (e.g. a parse error) is appended to the task prompt. The new
+    output is cached under the key the pipeline run used (``viz_planner`` as
+    in that run; a fallback's key if a fallback answered) when
+    ``accept(output)`` is true, so later runs of the same dataset don't hit
+    the same bad answer.
+    """
+    from crewai import Crew
+    from llm_clients import record_answers
+
+    handle = resolve_dataset(dataset)
+    tasks = create_tasks(handle)
+    for task, name in zip(tasks, TASK_NAMES):
+        task.name = name
+    rules = viz_planner == "rules"
+    if rules:  # as in _run_pipeline: the rule plan is part of the interpreter's prompt
+        _inject_cached_context(tasks[4], tasks_output[3])
+    ran = [task for i, task in enumerate(tasks[:index + 1]) if not (rules and i == 3)]
+
+    task = tasks[index]
+    parent = _upstream(index)
+    if parent is not None and not (rules and index == 4):
+        _inject_cached_context(task, tasks_output[parent])
+    if feedback:
+        task.description = (
+            f"{task.description}\n\n"
+            f"Your previous answer could not be used: {feedback}\n"
+            f"Answer again with the same content, strictly in the required format."
+        )
+    with span("rerun_task", task=task.name), record_answers() as answered:
+        output = Crew(agents=[task.agent], tasks=[task], verbose=True).kickoff().tasks_output[0]
+    if use_cache and (accept is None or accept(output)):
+        get_result_cache().put(task_cache_keys(handle.key, ran, answered)[-1], output)
+    return output
+
+
 # result = run_pipeline("C:\\Users\\hp\\Desktop\\AIDTM\\GenAI\\End-TermProject\\Final_Code\\logistics-delivery-delay-causes.csv")
\ No newline at end of file
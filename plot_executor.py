@@ -0,0 +1,291 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from dataset_registry import resolve_dataset
+from tracing import span
+
+MAX_TOP_K = 10
+HIST_BINS = 20
+MEMO_SIZE = 256
+
+# ---- LARGE-DATA RENDERING ----
+LARGE_DATA_POINTS = 50_000    # scatter above this is reduced
+SCATTER_REDUCTION = "density"  # "density" (2D binning) or "sample" (stratified)
+DENSITY_BINS = 120
+SAMPLE_POINTS = 20_000
+LINE_MAX_POINTS = 2_000       # line charts above this are min/max decimated
+
+_AGGREGATIONS = ("mean", "sum", "count")
+
+# (dataset key, plot spec) -> PlotData; survives Streamlit reruns
+_MEMO = OrderedDict()
+_MEMO_LOCK = threading.Lock()
+
+
+@dataclass
+class PlotData:
+    """Aggregated, render-ready data for one PlotConfig."""
+
+    plot: dict
+    series: pd.Series = None       # bar / line / pie
+    hist: tuple = None             # (counts, edges)
+    points: tuple = None           # scatter (x, y) arrays
+    density: tuple = None          # binned scatter (counts, xedges, yedges)
+    xlabel: str = ""
+    ylabel: str = ""
+    note: str = ""                 # data reduction applied, shown on the chart
+
+    @property
+    def points_drawn(self):
+        if self.series is not None:
+            return len(self.series)
+        if self.hist is not None:
+            return len(self.hist[0])
+        if self.density is not None:
+            return int(np.count_nonzero(self.density[0]))
+        return len(self.points[0]) if self.points is not None else 0
+
+
+def pretty_label(col):
+    return col.replace("_", " ").title() if col else ""
+
+
+def plot_key(plot):
+    return json.dumps(plot, sort_keys=True, default=str)
+
+
+def plot_seed(plot):
+    """Sampling seed of a plot: the same spec draws the same points in every process."""
+    return int(hashlib.sha256(plot_key(plot).encode()).hexdigest()[:16], 16)
+
+
+# ---- COMPILE ----
+def compile_plan(plots):
+    """Group the plan's aggregation needs so each column is grouped once.
+
+    Returns {"groups": {x: {(y, agg), ...}}, "hist": {col}, "scatter": {(x, y)}}.
+    Bar counts and pies on the same column share one group-size pass.
+    """
+    groups, hist, scatter = {}, set(), set()
+    for plot in plots:
+        chart_type = plot.get("chart_type")
+        if chart_type == "bar":
+            agg = plot.get("aggregation")
+            if agg == "count":
+                groups.setdefault(plot["x"], set()).add((None, "size"))
+            elif agg in ("mean", "sum"):
+                groups.setdefault(plot["x"], set()).add((plot["y"], agg))
+        elif chart_type == "line":
+            if plot.get("aggregation") in _AGGREGATIONS:
+                groups.setdefault(plot["x"], set()).add((plot["y"], plot["aggregation"]))
+        elif chart_type == "pie":
+            groups.setdefault(plot.get("column"), set()).add((None, "size"))
+        elif chart_type == "histogram":
+            hist.add(plot["x"])
+        elif chart_type == "scatter":
+            scatter.add((plot.get("x"), plot.get("y")))
+    return {"groups": groups, "hist": hist, "scatter": scatter}
+
+
+# ---- EXECUTE ----
+def _run_groups(df, groups):
+    results = {}
+    for x, needs in groups.items():
+        if x not in df.columns:
+            continue
+        # group codes for x are computed once and shared by every plot on x
+        grouped = df.groupby(x, observed=True)
+        if any(agg == "size" for _, agg in needs):
+            results[(x, None, "size")] = grouped.size()
+        by_column = {}
+        for y, agg in needs:
+            if agg != "size":
+                by_column.setdefault(y, []).append(agg)
+        for y, aggs in by_column.items():
+            if y not in df.columns:
+                continue
+            try:
+                table = grouped[y].agg(sorted(aggs))
+            except (TypeError, ValueError):
+                continue  # e.g. mean over a text column
+            for agg in aggs:
+                results[(x, y, agg)] = table[agg]
+    return results
+
+
+# ---- REDUCTION ----
+def stratified_sample(x, y, n_out, bins=DENSITY_BINS, seed=0):
+    """Keep at most an equal share per 2D cell, so sparse regions and
+    outliers survive while dense regions are thinned."""
+    rng = np.random.default_rng(seed)
+    n = len(x)
+    xi = np.digitize(x, np.histogram_bin_edges(x, bins=bins))
+    yi = np.digitize(y, np.histogram_bin_edges(y, bins=bins))
+    cell = xi.astype("int64") * (bins + 2) + yi
+    order = rng.permutation(n)
+    cell_shuffled = pd.Series(cell[order])
+    rank = cell_shuffled.groupby(cell_shuffled).cumcount().to_numpy()
+    per_cell = max(1, n_out // max(1, len(np.unique(cell))))
+    keep = np.sort(order[rank < per_cell])
+    if len(keep) > n_out:
+        keep = np.sort(rng.choice(keep, n_out, replace=False))
+    return keep
+
+
+def minmax_decimate(values, n_out):
+    """Positions to keep so each bucket retains its min and max (LTTB-style
+    shape preservation, fully vectorized)."""
+    n = len(values)
+    buckets = max(1, n_out // 2)
+    bucket = (np.arange(n) * buckets) // n
+    frame = pd.DataFrame({"bucket": bucket, "v": values})
+    grouped = frame.groupby("bucket")["v"]
+    keep = np.concatenate([
+        [0, n - 1],
+        grouped.idxmin().dropna().to_numpy(dtype="int64"),
+        grouped.idxmax().dropna().to_numpy(dtype="int64"),
+    ])
+    return np.unique(keep)
+
+
+def _scatter_data(plot, df, x, y):
+    xs = df[x].to_numpy()
+    ys = df[y].to_numpy()
+    n = len(xs)
+    base = dict(plot=plot, xlabel=pretty_label(x), ylabel=pretty_label(y))
+    if n <= LARGE_DATA_POINTS:
+        return PlotData(points=(xs, ys), **base)
+
+    xn = pd.to_numeric(df[x], errors="coerce").to_numpy(dtype="float64")
+    yn = pd.to_numeric(df[y], errors="coerce").to_numpy(dtype="float64")
+    valid = ~(np.isnan(xn) | np.isnan(yn))
+    if not valid.any():
+        keep = np.sort(np.random.default_rng(plot_seed(plot)).choice(n, SAMPLE_POINTS, replace=False))
+        return PlotData(
+            points=(xs[keep], ys[keep]),
+            note=f"random sample of {len(keep):,} of {n:,} points", **base
+        )
+    xn, yn = xn[valid], yn[valid]
+    if SCATTER_REDUCTION == "density":
+        counts, xedges, yedges = np.histogram2d(xn, yn, bins=DENSITY_BINS)
+        return PlotData(
+            density=(counts, xedges, yedges),
+            note=f"{len(xn):,} points binned into a {DENSITY_BINS}x{DENSITY_BINS} density grid", **base
+        )
+    keep = stratified_sample(xn, yn, SAMPLE_POINTS, seed=plot_seed(plot))
+    return PlotData(
+        points=(xn[keep], yn[keep]),
+        note=f"stratified sample of {len(keep):,} of {len(xn):,} points", **base
+    )
+
+
+def _line_data(plot, data, x, y, agg):
+    base = dict(plot=plot, xlabel=pretty_label(x), ylabel=f"{agg.title()} of {pretty_label(y)}")
+    if len(data) <= LINE_MAX_POINTS:
+        return PlotData(series=data, **base)
+    keep = minmax_decimate(data.to_numpy(dtype="float64"), LINE_MAX_POINTS)
+    return PlotData(
+        series=data.iloc[keep],
+        note=f"min/max decimated to {len(keep):,} of {len(data):,} points", **base
+    )
+
+
+def _top_values(data, top_k):
+    # len(data) is the column's distinct count; no second nunique() pass
+    if len(data) > MAX_TOP_K:
+        top_k = min(top_k or MAX_TOP_K, MAX_TOP_K)
+        return data.sort_values(ascending=False).head(top_k)
+    return data.sort_values(ascending=False)
+
+
+def _build(plot, df, grouped, hists):
+    chart_type = plot.get("chart_type")
+    if chart_type == "bar":
+        x, y, agg = plot["x"], plot.get("y"), plot.get("aggregation")
+        if agg == "count":
+            data = grouped.get((x, None, "size"))
+        elif agg in ("mean", "sum"):
+            data = grouped.get((x, y, agg))
+        else:
+            return None
+        if data is None:
+            return None
+        return PlotData(
+            plot=plot, series=_top_values(data, plot.get("top_k")),
+            xlabel=pretty_label(x),
+            ylabel="Count" if agg == "count" else f"{agg.title()} of {pretty_label(y)}",
+        )
+
+    if chart_type == "histogram":
+        col = plot["x"]
+        if col not in hists:
+            return None
+        return PlotData(plot=plot, hist=hists[col], xlabel=pretty_label(col), ylabel="Frequency")
+
+    if chart_type == "pie":
+        data = grouped.get((plot.get("column"), None, "size"))
+        if data is None:
+            return None
+        return PlotData(plot=plot, series=data.sort_values(ascending=False).head(MAX_TOP_K))
+
+    if chart_type == "scatter":
+        x, y = plot.get("x"), plot.get("y")
+        if x not in df.columns or y not in df.columns:
+            return None
+        return _scatter_data(plot, df, x, y)
+
+    if chart_type == "line":
+        x, y, agg = plot.get("x"), plot.get("y"), plot.get("aggregation")
+        data = grouped.get((x, y, agg))
+        if data is None:
+            return None
+        return _line_data(plot, data, x, y, agg)
+    return None
+
+
+def execute_plan(dataset, plots):
+    """Aggregate every plot of a VizPlan in one batched pass, memoized.
+
+    Returns a list aligned with ``plots``; entries are None for plots that
+    cannot be executed (unknown chart type or aggregation, missing column).
+    """
+    handle = resolve_dataset(dataset)
+    keys = [(handle.key, plot_key(plot)) for plot in plots]
+
+    with _MEMO_LOCK:
+        cached = {key: _MEMO[key] for key in keys if key in _MEMO}
+        for key in cached:
+            _MEMO.move_to_end(key)
+
+    missing = [plot for plot, key in zip(plots, keys) if key not in cached]
+    if missing:
+        with span("plot_aggregations", plots=len(missing), memo_hits=len(cached)) as s:
+            _aggregate(handle, missing, cached)
+            s.set(rows=handle.row_count)
+
+    return [cached[key] for key in keys]
+
+
+def _aggregate(handle, missing, cached):
+    # One grouped pass over the frame for every plot not in the memo
+    df = handle.df
+    plan = compile_plan(missing)
+    grouped = _run_groups(df, plan["groups"])
+    hists = {}
+    for col in plan["hist"]:
+        if col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col], errors="coerce").dropna().to_numpy()
+        hists[col] = np.histogram(values, bins=HIST_BINS)
+    with _MEMO_LOCK:
+        for plot in missing:
+            key = (handle.key, plot_key(plot))
+            cached[key] = _MEMO[key] = _build(plot, df, grouped, hists)
+        while len(_MEMO) > MEMO_SIZE:
+            _MEMO.popitem(last=False)
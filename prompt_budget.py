@@ -0,0 +1,191 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from delay_analytics import format_delay_facts
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # optional: fall back to a character heuristic
+    _ENCODING = None
+
+# ---- BUDGETS (tokens of dataset context per prompt) ----
+DATA_PROMPT_TOKEN_BUDGET = 3000
+VIZ_PROMPT_TOKEN_BUDGET = 1200
+SAMPLE_ROWS = 5
+MAX_CELL_CHARS = 24
+
+# Name patterns used to rank columns by relevance to delay analysis
+_DELAY_WORDS = re.compile(r"delay|late|cause|reason|status|on_?time")
+_DIMENSION_WORDS = re.compile(r"carrier|route|vehicle|mode|type|region|warehouse|hub|priority|service")
+_DATE_WORDS = re.compile(r"date|time|_at$|_ts$|pickup|delivery|eta")
+_MEASURE_WORDS = re.compile(r"weight|volume|distance|cost|price|duration|days|qty|quantity")
+_LOW_VALUE_WORDS = re.compile(r"(^|_)id$|^id_|uuid|street|address|postal|zip|phone|email|name$")
+
+
+def estimate_tokens(text):
+    text = str(text)
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+# ---- COLUMN RANKING ----
+def column_relevance(name, column_profile, total_rows):
+    """Score a column for delay analysis; returns (score, reason)."""
+    lower = name.lower()
+    distinct = column_profile.distinct()
+    non_null = max(column_profile.non_null, 1)
+
+    if column_profile.non_null == 0 or distinct <= 1:
+        return -5, "constant or empty"
+    if _DELAY_WORDS.search(lower):
+        return 10, "delay signal"
+    if _DIMENSION_WORDS.search(lower):
+        return 6, "operational dimension"
+    if _LOW_VALUE_WORDS.search(lower):
+        return -4, f"identifier/free text, {distinct} distinct"
+    if not column_profile.numeric and distinct / non_null > 0.9 and total_rows > 20:
+        return -3, f"near-unique text, {distinct} distinct"
+    if _DATE_WORDS.search(lower):
+        return 5, "timestamp"
+    if _MEASURE_WORDS.search(lower):
+        return 4, "measure"
+    if column_profile.numeric:
+        return 2, "numeric"
+    return 1, "categorical"
+
+
+def rank_columns(profile):
+    scored = [
+        (col, *column_relevance(col, profile.column_profiles[col], profile.total_rows))
+        for col in profile.columns
+    ]
+    # stable: ties keep dataset order
+    return sorted(scored, key=lambda item: -item[1])
+
+
+# ---- COMPACT ENCODINGS ----
+def _cell(value):
+    if isinstance(value, (float, np.floating)):
+        return "" if np.isnan(value) else f"{value:.4g}"
+    if value is None or value is pd.NA or value is pd.NaT:
+        return ""
+    if isinstance(value, pd.Timestamp):
+        # typed date columns read back the way the CSV wrote them
+        return value.strftime("%Y-%m-%d") if value == value.normalize() else str(value)
+    text = str(value)
+    return text if len(text) <= MAX_CELL_CHARS else text[:MAX_CELL_CHARS - 1] + "…"
+
+
+def format_sample(rows, columns):
+    lines = [" | ".join(columns)]
+    lines += [" | ".join(_cell(row.get(col, "")) for col in columns) for row in rows]
+    return "\n".join(lines)
+
+
+def format_column_stats(profile, columns):
+    lines = ["column | type | non_null | distinct | top (freq) | mean | min | median | max"]
+    for col in columns:
+        prof = profile.column_profiles[col]
+        if prof.numeric:
+            _, median, _ = prof.quantiles()
+            lines.append(" | ".join([
+                col, "num", str(prof.non_null), str(prof.distinct()), "",
+                _cell(prof.mean), _cell(float(prof.min)), _cell(median), _cell(float(prof.max)),
+            ]))
+        else:
+            top = prof.top_k(1)
+            top_text = f"{_cell(top.index[0])} ({int(top.iloc[0])})" if len(top) else ""
+            lines.append(" | ".join([
+                col, "cat", str(prof.non_null), str(prof.distinct()), top_text, "", "", "", "",
+            ]))
+    return "\n".join(lines)
+
+
+def format_unique_values(profile, columns, limit=10):
+    return "\n".join(
+        f"{col}: " + ", ".join(_cell(v) for v in profile.column_profiles[col].first_values[:limit])
+        for col in columns
+    )
+
+
+def format_omitted(omitted):
+    if not omitted:
+        return "none"
+    return "; ".join(f"{col} ({reason})" for col, _, reason in omitted)
+
+
+# ---- BUDGETED BUILDERS ----
+def build_data_context(profile, delay_aggregates, budget=DATA_PROMPT_TOKEN_BUDGET):
+    """Prompt fields for the data understanding task, trimmed to ``budget`` tokens.
+
+    Columns are dropped lowest-relevance first; delay facts shrink their
+    tables before any delay-signal column is dropped.
+    """
+    ranked = rank_columns(profile)
+    useful = [item for item in ranked if item[1] > 0]
+    omitted = [item for item in ranked if item[1] <= 0]
+    fact_rows = 10
+
+    while True:
+        cols = [col for col, _, _ in useful]
+        low_card = [c for c in cols if profile.column_profiles[c].distinct() <= 50]
+        fields = {
+            "total_rows": str(profile.total_rows),
+            "columns": ", ".join(profile.columns),
+            "sample": format_sample(profile.sample[:SAMPLE_ROWS], cols),
+            "column_stats": format_column_stats(profile, cols),
+            "unique_values": format_unique_values(profile, low_card),
+            "omitted": format_omitted(omitted),
+            "delay_facts": format_delay_facts(delay_aggregates, max_rows=fact_rows),
+        }
+        tokens = sum(estimate_tokens(v) for v in fields.values())
+        if tokens <= budget:
+            break
+        if fact_rows > 3:
+            fact_rows -= 2
+        elif len(useful) > 1:
+            omitted.append((*useful.pop()[:2], "dropped for token budget"))
+        else:
+            break
+    fields["tokens"] = tokens
+    return fields
+
+
+def build_viz_context(profile, budget=VIZ_PROMPT_TOKEN_BUDGET):
+    """Column list with types (always complete) plus a sample of the top columns."""
+    ranked = [col for col, score, _ in rank_columns(profile) if score > 0]
+    typed_columns = ", ".join(
+        f"{col}:{'num' if profile.column_profiles[col].numeric else 'cat'}"
+        f"{'' if profile.column_profiles[col].numeric else '/' + str(profile.column_profiles[col].distinct())}"
+        for col in profile.columns
+    )
+    while True:
+        fields = {
+            "columns": typed_columns,
+            "sample": format_sample(profile.sample[:SAMPLE_ROWS], ranked),
+        }
+        tokens = sum(estimate_tokens(v) for v in fields.values())
+        if tokens <= budget or len(ranked) <= 1:
+            break
+        ranked.pop()
+    fields["tokens"] = tokens
+    return fields
+
+
+def prompt_token_report(before_tasks, after_tasks, names=None):
+    """Estimated prompt tokens per task for two renderings of the same tasks.
+
+    Items are tasks or their description strings.
+    """
+    report = {}
+    for i, (before, after) in enumerate(zip(before_tasks, after_tasks)):
+        name = names[i] if names else f"task_{i + 1}"
+        report[name] = {
+            "before": estimate_tokens(getattr(before, "description", before)),
+            "after": estimate_tokens(getattr(after, "description", after)),
+        }
+    return report
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Optional
+
+# ---- SETTINGS ----
+CACHE_DIR = os.getenv("LDA_CACHE_DIR", ".cache")
+CACHE_TTL_SECONDS = int(os.getenv("LDA_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+CACHE_MAX_BYTES = int(os.getenv("LDA_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+
+@dataclass
+class CachedTaskOutput:
+    # Same attributes app.py reads from crewai's TaskOutput
+    raw: str
+    json_dict: Optional[dict] = None
+    pydantic: Any = None
+    description: str = ""
+    agent: str = ""
+    cached: bool = True
+
+    def __str__(self):
+        return self.raw
+
+
+def task_cache_key(dataset_key, task, upstream_key="", llm_settings=None):
+    """Content address of one task run.
+
+    Chaining ``upstream_key`` makes a change to one prompt invalidate every
+    task downstream of it, but nothing upstream.
+    """
+    payload = json.dumps({
+        "dataset": dataset_key,
+        "description": task.description,
+        "expected_output": task.expected_output,
+        "llm": llm_settings or {},
+        "upstream": upstream_key,
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def llm_settings(agent):
+    # The requested settings; pipeline.task_cache_keys swaps in a fallback
+    # model when that is what answered
+    llm = getattr(agent, "llm", None)
+    return {
+        "model": getattr(llm, "model", None),
+        "temperature": getattr(llm, "temperature", None),
+        "max_tokens": getattr(llm, "max_tokens", None),
+    }
+
+
+class ResultCache:
+    """SQLite-backed task output store with TTL and size-based LRU eviction."""
+
+    def __init__(self, path=None, ttl=CACHE_TTL_SECONDS, max_bytes=CACHE_MAX_BYTES):
+        self.path = path or os.path.join(CACHE_DIR, "results.sqlite")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS task_results (
+                    key TEXT PRIMARY KEY,
+                    raw TEXT NOT NULL,
+                    json_dict TEXT,
+                    agent TEXT,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )"""
+            )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT raw, json_dict, agent, created FROM task_results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            raw, json_dict, agent, created = row
+            if now - created > self.ttl:
+                conn.execute("DELETE FROM task_results WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE task_results SET accessed = ? WHERE key = ?", (now, key))
+        return CachedTaskOutput(
+            raw=raw,
+            json_dict=json.loads(json_dict) if json_dict else None,
+            agent=agent or "",
+        )
+
+    def put(self, key, output):
+        raw = str(getattr(output, "raw", output))
+        json_dict = getattr(output, "json_dict", None)
+        model = getattr(output, "pydantic", None)
+        if json_dict is None and model is not None:
+            json_dict = model.model_dump()
+        json_text = json.dumps(json_dict, default=str) if json_dict is not None else None
+        size = len(raw) + len(json_text or "")
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO task_results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, raw, json_text, str(getattr(output, "agent", "")), now, now, size),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM task_results WHERE created < ?", (now - self.ttl,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM task_results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in conn.execute("SELECT key, size FROM task_results ORDER BY accessed").fetchall():
+            conn.execute("DELETE FROM task_results WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM task_results")
+
+    def stats(self):
+        with self._lock, self._connect() as conn:
+            count, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM task_results"
+            ).fetchone()
+        return {"entries": count, "bytes": size, "max_bytes": self.max_bytes, "ttl_seconds": self.ttl}
+
+
+_default_cache = None
+
+
+def get_result_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
@@ -0,0 +1,97 @@
+"""Deterministic VizPlan from column types, cardinality and delay roles.
+
+No LLM call: the plan is ready in milliseconds, either instead of the viz
+agent (``run_pipeline(..., viz_planner="rules")``) or as a first render
+while the agent's plan is still being computed.
+
+    plan = rule_plan(dataset)   # {"plots": [...]} on the VizPlan schema
+"""
+import json
+
+from delay_analytics import detect_delay_columns
+from dataset_registry import resolve_dataset
+from viz_validator import plan_schema
+
+# ---- SETTINGS ----
+MAX_PLOTS = 5                # same limit the viz agent is given
+TOP_K = 8
+CATEGORY_MIN_DISTINCT = 2    # below this a breakdown says nothing
+CATEGORY_MAX_DISTINCT = 30   # above this a count bar is mostly "other"
+PIE_MAX_DISTINCT = 8
+
+
+def _plot(metric, chart_type, insight, x=None, y=None, column=None, aggregation=None, top_k=None):
+    return {"metric": metric, "chart_type": chart_type, "x": x, "y": y, "column": column,
+            "aggregation": aggregation, "top_k": top_k, "insight": insight}
+
+
+def _label(col):
+    return col.replace("_", " ")
+
+
+def _delay_plots(roles, schema):
+    plots = []
+    cause, duration = roles["primary_cause"], roles["duration"]
+    if cause:
+        chart = "pie" if schema[cause]["distinct"] <= PIE_MAX_DISTINCT else "bar"
+        plots.append(_plot(
+            "Primary delay causes", chart, "Which causes account for most delayed shipments",
+            **({"column": cause} if chart == "pie" else {"x": cause, "aggregation": "count", "top_k": TOP_K}),
+        ))
+    if duration and schema[duration]["kind"] == "numeric":
+        plots.append(_plot("Delay duration distribution", "histogram",
+                           "How long delays typically last and how long the tail is", x=duration))
+        for group in roles["groups"][:2]:
+            plots.append(_plot(
+                f"Mean delay by {_label(group)}", "bar",
+                f"Which {_label(group)} values are associated with longer delays",
+                x=group, y=duration, aggregation="mean", top_k=TOP_K,
+            ))
+        dates = [col for col, info in schema.items() if info["kind"] == "datetime"]
+        if dates:
+            plots.append(_plot(f"Delay over {_label(dates[0])}", "line",
+                               "Whether delays are getting longer or shorter over time",
+                               x=dates[0], y=duration, aggregation="mean"))
+    return plots
+
+
+def _generic_plots(schema, skip):
+    # Any dataset: breakdowns of low-cardinality columns, distributions of numbers
+    categories = [col for col, info in schema.items() if col not in skip and info["kind"] in ("categorical", "boolean")
+                  and CATEGORY_MIN_DISTINCT <= info["distinct"] <= CATEGORY_MAX_DISTINCT]
+    numbers = [col for col, info in schema.items() if col not in skip and info["kind"] == "numeric"
+               and info["distinct"] > CATEGORY_MAX_DISTINCT]
+    plots = []
+    for col in categories[:2]:
+        plots.append(_plot(f"Records by {_label(col)}", "bar", f"How records split across {_label(col)}",
+                           x=col, aggregation="count", top_k=TOP_K))
+    for col in numbers[:2]:
+        plots.append(_plot(f"{_label(col).capitalize()} distribution", "histogram",
+                           f"Spread and outliers of {_label(col)}", x=col))
+    if len(numbers) >= 2:
+        plots.append(_plot(f"{_label(numbers[0]).capitalize()} vs {_label(numbers[1])}", "scatter",
+                           "Whether the two measures move together", x=numbers[0], y=numbers[1]))
+    return plots
+
+
+def rule_plan(dataset, max_plots=MAX_PLOTS):
+    """Heuristic plot plan: delay charts first, then generic breakdowns."""
+    handle = resolve_dataset(dataset)
+    schema = plan_schema(handle)
+    roles = detect_delay_columns(list(schema))
+    plots = _delay_plots(roles, schema)
+    used = {p[f] for p in plots for f in ("x", "y", "column") if p[f]}
+    skip = used | {roles["flag"], roles["causes"]}
+    plots += _generic_plots(schema, skip)
+    return {"plots": plots[:max_plots]}
+
+
+def rule_plan_output(dataset):
+    """The rule plan as a task output, in place of the viz agent's."""
+    from pipeline import VizPlan
+    from result_cache import CachedTaskOutput
+
+    plan = rule_plan(dataset)
+    output = CachedTaskOutput(raw=json.dumps(plan), json_dict=plan, agent="rule planner", cached=False)
+    output.pydantic = VizPlan.model_validate(plan)
+    return output
@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+
+# ---- SKETCH SIZES ----
+# All per-column state is bounded by these constants, independent of row count.
+DEFAULT_CHUNKSIZE = 100_000
+RESERVOIR_SIZE = 10_000      # values kept for approximate quantiles
+HEAVY_HITTER_CAPACITY = 256  # Misra-Gries counters for top-k
+DISTINCT_SKETCH_SIZE = 2048  # k-minimum-values sketch for distinct counts
+SAMPLE_DISTINCT = 10         # first distinct values kept per column
+SAMPLE_ROWS = 5
+
+_HASH_SPACE = float(2 ** 64)
+
+
+def _is_numeric(series):
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def _row_priorities(positions):
+    # Reservoir keys from hashed row numbers: the same file always keeps the
+    # same sample, however it is chunked and however often it is profiled
+    return pd.util.hash_array(positions.astype("uint64")) / _HASH_SPACE
+
+
+def _misra_gries(counts, capacity):
+    # Keep at most `capacity` counters; every estimate is a lower bound
+    # within n / capacity of the true frequency.
+    if len(counts) <= capacity:
+        return counts
+    threshold = counts.nlargest(capacity + 1).iloc[-1]
+    counts = counts - threshold
+    return counts[counts > 0]
+
+
+class ColumnProfile:
+    """Mergeable, bounded-memory summary of a single column."""
+
+    def __init__(self, name):
+        self.name = name
+        self.non_null = 0
+        self.numeric = None  # None until the first non-empty chunk is seen
+        # moments (Chan et al. parallel variance)
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        # bottom-k priority reservoir for quantiles
+        self.res_keys = np.empty(0)
+        self.res_values = np.empty(0)
+        # heavy hitters, distinct sketch and first values
+        self.heavy = pd.Series(dtype="int64")
+        self.kmv = np.empty(0, dtype="uint64")
+        self.first_values = []
+
+    # ---- UPDATE FROM A CHUNK ----
+    def update(self, series, offset=0):
+        """Add a chunk whose first row is row ``offset`` of the dataset."""
+        values = series.dropna()
+        if values.empty:
+            return
+        self.non_null += len(values)
+
+        chunk_numeric = _is_numeric(values)
+        self.numeric = chunk_numeric if self.numeric is None else (self.numeric and chunk_numeric)
+
+        if chunk_numeric:
+            arr = values.to_numpy(dtype="float64")
+            self._merge_moments(len(arr), float(arr.mean()), float(((arr - arr.mean()) ** 2).sum()))
+            self._merge_extrema(arr.min(), arr.max())
+            positions = offset + np.flatnonzero(series.notna().to_numpy())
+            self._merge_reservoir(_row_priorities(positions), arr)
+
+        counts = values.value_counts()
+        self._merge_heavy(counts[counts > 0])  # categoricals list unseen categories too
+        self._merge_kmv(pd.util.hash_pandas_object(values, index=False).to_numpy())
+
+        if len(self.first_values) < SAMPLE_DISTINCT:
+            for value in values.unique()[:SAMPLE_DISTINCT]:
+                if value not in self.first_values:
+                    self.first_values.append(value)
+                if len(self.first_values) >= SAMPLE_DISTINCT:
+                    break
+
+    # ---- MERGE ANOTHER PROFILE ----
+    def merge(self, other):
+        self.non_null += other.non_null
+        if other.numeric is not None:
+            self.numeric = other.numeric if self.numeric is None else (self.numeric and other.numeric)
+        if other.n:
+            self._merge_moments(other.n, other.mean, other.m2)
+            self._merge_extrema(other.min, other.max)
+            self._merge_reservoir(other.res_keys, other.res_values)
+        self._merge_heavy(other.heavy)
+        self._merge_kmv(other.kmv)
+        for value in other.first_values:
+            if len(self.first_values) >= SAMPLE_DISTINCT:
+                break
+            if value not in self.first_values:
+                self.first_values.append(value)
+        return self
+
+    def _merge_moments(self, n, mean, m2):
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.n * n / total
+        self.n = total
+
+    def _merge_extrema(self, lo, hi):
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+    def _merge_reservoir(self, keys, values):
+        keys = np.concatenate([self.res_keys, keys])
+        values = np.concatenate([self.res_values, values])
+        if len(keys) > RESERVOIR_SIZE:
+            keep = np.argpartition(keys, RESERVOIR_SIZE)[:RESERVOIR_SIZE]
+            keys, values = keys[keep], values[keep]
+        self.res_keys, self.res_values = keys, values
+
+    def _merge_heavy(self, counts):
+        if counts.empty:
+            return
+        merged = counts if self.heavy.empty else self.heavy.add(counts, fill_value=0)
+        self.heavy = _misra_gries(merged, HEAVY_HITTER_CAPACITY)
+
+    def _merge_kmv(self, hashes):
+        merged = np.union1d(self.kmv, hashes.astype("uint64"))
+        self.kmv = merged[:DISTINCT_SKETCH_SIZE]
+
+    # ---- ESTIMATES ----
+    @property
+    def std(self):
+        return float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else np.nan
+
+    def distinct(self):
+        if len(self.kmv) < DISTINCT_SKETCH_SIZE:
+            return int(len(self.kmv))
+        kth = float(self.kmv[-1]) / _HASH_SPACE
+        return int((DISTINCT_SKETCH_SIZE - 1) / kth)
+
+    def quantiles(self, qs=(0.25, 0.5, 0.75)):
+        if not len(self.res_values):
+            return [np.nan for _ in qs]
+        return [float(v) for v in np.quantile(self.res_values, qs)]
+
+    def top_k(self, k=10):
+        if self.heavy.empty and self.first_values:
+            # every value was too rare to keep a counter (e.g. unique ids);
+            # any seen value is then a valid top with a lower-bound count of 1
+            return pd.Series([1], index=[self.first_values[0]])
+        return self.heavy.sort_values(ascending=False).head(k)
+
+    def describe(self):
+        """Same keys as ``DataFrame.describe(include="all")`` for this column."""
+        stats = {key: np.nan for key in
+                 ("count", "unique", "top", "freq", "mean", "std", "min", "25%", "50%", "75%", "max")}
+        stats["count"] = float(self.non_null)
+        if self.numeric:
+            q25, q50, q75 = self.quantiles()
+            stats.update({
+                "mean": self.mean, "std": self.std, "min": float(self.min),
+                "25%": q25, "50%": q50, "75%": q75, "max": float(self.max),
+            })
+        elif self.non_null:
+            top = self.top_k(1)
+            stats.update({
+                "unique": self.distinct(),
+                "top": top.index[0],
+                "freq": int(top.iloc[0]),
+            })
+        return stats
+
+
+class DatasetProfile:
+    """Row count, sample rows and per-column profiles of a whole dataset."""
+
+    def __init__(self):
+        self.total_rows = 0
+        self.columns = []
+        self.sample = []
+        self.column_profiles = {}
+
+    def update(self, chunk):
+        if not self.columns:
+            self.columns = list(chunk.columns)
+        if len(self.sample) < SAMPLE_ROWS:
+            self.sample.extend(chunk.head(SAMPLE_ROWS - len(self.sample)).to_dict(orient="records"))
+        offset = self.total_rows
+        self.total_rows += len(chunk)
+        for col in chunk.columns:
+            if col not in self.column_profiles:
+                self.column_profiles[col] = ColumnProfile(col)
+            self.column_profiles[col].update(chunk[col], offset)
+        return self
+
+    def merge(self, other):
+        if not self.columns:
+            self.columns = list(other.columns)
+        self.total_rows += other.total_rows
+        self.sample = (self.sample + other.sample)[:SAMPLE_ROWS]
+        for col, prof in other.column_profiles.items():
+            if col in self.column_profiles:
+                self.column_profiles[col].merge(prof)
+            else:
+                self.column_profiles[col] = prof
+        return self
+
+    # ---- PROMPT FIELDS (drop-in for create_tasks) ----
+    def numeric_summary(self):
+        # Mirrors df.describe(include="all").fillna("").to_dict()
+        summary = {}
+        for col in self.columns:
+            stats = self.column_profiles[col].describe()
+            summary[col] = {k: ("" if isinstance(v, float) and np.isnan(v) else v) for k, v in stats.items()}
+        return summary
+
+    def unique_values(self):
+        return {col: list(self.column_profiles[col].first_values) for col in self.columns}
+
+
+def profile_chunks(chunks):
+    profile = DatasetProfile()
+    for chunk in chunks:
+        profile.update(chunk)
+    return profile
+
+
+def profile_csv(path, chunksize=DEFAULT_CHUNKSIZE, **read_kwargs):
+    """Profile a CSV with bounded memory by streaming it in chunks."""
+    return profile_chunks(pd.read_csv(path, chunksize=chunksize, **read_kwargs))
+
+
+def profile_frame(df, chunksize=DEFAULT_CHUNKSIZE):
+    return profile_chunks(df.iloc[i:i + chunksize] for i in range(0, max(len(df), 1), chunksize))
@@ -0,0 +1,114 @@
+"""Typed access to the pydantic outputs of the viz and interpretation tasks.
+
+    plan = typed_output(result, 3, dataset)   # VizPlan or None
+
+The pydantic object crewai already built is used as is. Otherwise the raw
+answer goes through a local repair pass (code fences, prose around the
+JSON, trailing commas, Python literals, a bare list for a one-field model)
+and, only if that fails too, the failed task alone is re-run with the
+parse error in its prompt.
+"""
+import ast
+import json
+import os
+import re
+
+from pydantic import BaseModel
+
+# ---- SETTINGS ----
+STRUCTURED_RETRIES = int(os.getenv("LDA_STRUCTURED_RETRIES", 1))  # targeted re-runs per task
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+
+# ---- LOCAL REPAIR ----
+def _json_span(text):
+    # Outermost {...} or [...]; drops "Final Answer:" prefixes and trailing prose
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise ValueError("no JSON object in the answer")
+    start = min(starts)
+    end = text.rfind("}" if text[start] == "{" else "]")
+    if end < start:
+        raise ValueError("unterminated JSON object in the answer")
+    return text[start:end + 1]
+
+
+def repair_json(text):
+    """Parse an LLM answer that is almost JSON; raises ValueError when hopeless."""
+    text = str(text).strip().translate(_SMART_QUOTES)
+    fence = _FENCE.search(text)
+    if fence:
+        text = fence.group(1)
+    text = _TRAILING_COMMA.sub(r"\1", _json_span(text))
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as exc:
+        error = exc
+    # single quotes / None / True: a Python literal rather than JSON
+    literal = re.sub(r"\bnull\b", "None", re.sub(r"\btrue\b", "True", re.sub(r"\bfalse\b", "False", text)))
+    try:
+        return ast.literal_eval(literal)
+    except (ValueError, SyntaxError):
+        raise ValueError(f"invalid JSON: {error}") from None
+
+
+def _coerce(data, model):
+    fields = list(model.model_fields)
+    if len(fields) == 1:
+        # [...] or {"other_name": [...]} for a model with one list field
+        if isinstance(data, list):
+            data = {fields[0]: data}
+        elif isinstance(data, dict) and fields[0] not in data and len(data) == 1:
+            data = {fields[0]: next(iter(data.values()))}
+    return model.model_validate(data)
+
+
+def parse_output(output, model):
+    """``(instance, None)`` for a task output, or ``(None, error)``."""
+    value = getattr(output, "pydantic", None)
+    if isinstance(value, model):
+        return value, None
+    if isinstance(value, BaseModel):
+        value = value.model_dump()
+    data = value if value is not None else getattr(output, "json_dict", None)
+    try:
+        if data is None:
+            data = repair_json(output.raw)
+        return _coerce(data, model), None
+    except ValueError as exc:  # includes pydantic's ValidationError
+        return None, str(exc)[:500] or type(exc).__name__
+
+
+# ---- ACCESSOR ----
+def typed_output(result, index, dataset=None, retries=STRUCTURED_RETRIES, on_repaired=None):
+    """The pydantic model of ``result.tasks_output[index]``, or None.
+
+    With a ``dataset``, an unparseable output triggers up to ``retries``
+    re-runs of that task only; a successful one replaces the output in
+    ``result`` and is passed to ``on_repaired(index, output)``.
+    """
+    from pipeline import OUTPUT_MODELS, rerun_task
+
+    model = OUTPUT_MODELS[index]
+    output = result.tasks_output[index]
+    instance, error = parse_output(output, model)
+    for _ in range(retries if dataset is not None else 0):
+        if instance is not None:
+            break
+        output = rerun_task(dataset, index, result.tasks_output, feedback=error,
+                            accept=lambda out: parse_output(out, model)[0] is not None,
+                            viz_planner=getattr(result, "viz_planner", "llm"))
+        instance, error = parse_output(output, model)
+        if instance is not None:
+            result.tasks_output[index] = output
+            if on_repaired is not None:
+                on_repaired(index, output)
+    if instance is not None:
+        try:
+            output.pydantic = instance  # later reads take the fast path
+        except (AttributeError, ValueError):
+            pass
+    return instance
@@ -0,0 +1,269 @@
+"""Seeded synthetic shipment exports with the same 25-column schema as
+logistics-delivery-delay-causes.csv, at any scale.
+
+    python synthetic_data.py 1000000 shipments_1m.csv --seed 7
+
+Rows are generated and written in chunks, so 50M-row files need no more
+memory than a single chunk.
+"""
+import argparse
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # optional: pandas writes the CSV instead, several times slower
+    pa = pa_csv = None
+
+# ---- SETTINGS ----
+CHUNK_ROWS = 500_000
+MISSING_RATE = 0.005   # share of blanks in the columns the real export leaves empty
+START_DATE = np.datetime64("2023-01-01")
+DATE_SPAN_DAYS = 730
+
+COLUMNS = [
+    "shipment_id", "origin_street_address", "origin_city", "origin_state", "origin_postal_code",
+    "origin_country", "destination_street_address", "destination_city", "destination_state",
+    "destination_postal_code", "destination_country", "scheduled_pickup_date", "actual_pickup_date",
+    "expected_delivery_date", "actual_delivery_date", "is_delayed", "delay_duration_days",
+    "delay_causes", "primary_delay_cause", "carrier_name", "shipment_weight_kg", "shipment_volume_m3",
+    "shipment_type", "route_id", "vehicle_type",
+]
+
+# ---- REFERENCE DATA ----
+# (city, state, postal code base, country, region)
+LOCATIONS = [
+    ("Chicago", "IL", 60601, "USA", "US"), ("Dallas", "TX", 75201, "USA", "US"),
+    ("Los Angeles", "CA", 90001, "USA", "US"), ("San Francisco", "CA", 94102, "USA", "US"),
+    ("New York", "NY", 10001, "USA", "US"), ("Atlanta", "GA", 30301, "USA", "US"),
+    ("Seattle", "WA", 98101, "USA", "US"), ("Miami", "FL", 33101, "USA", "US"),
+    ("Toronto", "ON", 10000, "Canada", "CA"), ("Vancouver", "BC", 20000, "Canada", "CA"),
+    ("Montreal", "QC", 30000, "Canada", "CA"),
+    ("Paris", "Île-de-France", 75001, "France", "EU"), ("Berlin", "Berlin", 10117, "Germany", "EU"),
+    ("Madrid", "Madrid", 28001, "Spain", "EU"), ("Milan", "Lombardy", 20121, "Italy", "EU"),
+    ("Zurich", "Zurich", 8001, "Switzerland", "EU"), ("Dublin", "Leinster", 1000, "Ireland", "UK"),
+    ("London", "Greater London", 10000, "UK", "UK"), ("Manchester", "Greater Manchester", 20000, "UK", "UK"),
+    ("Singapore", "Central", 18956, "Singapore", "SEA"), ("Bangkok", "Bangkok", 10100, "Thailand", "SEA"),
+    ("Shanghai", "Shanghai", 20000, "China", "SEA"), ("Tokyo", "Tokyo", 10000, "Japan", "SEA"),
+    ("Sydney", "NSW", 2000, "Australia", "AU"), ("Melbourne", "VIC", 3000, "Australia", "AU"),
+    ("Auckland", "Auckland", 1010, "New Zealand", "AU"),
+    ("São Paulo", "SP", 10000, "Brazil", "LAT"), ("Buenos Aires", "CABA", 1000, "Argentina", "LAT"),
+    ("Lima", "Lima", 15001, "Peru", "LAT"), ("Cape Town", "Western Cape", 8001, "South Africa", "ME"),
+    ("Dubai", "Dubai", 10000, "UAE", "ME"),
+]
+LOCATION_WEIGHTS = np.array([6, 4, 5, 4, 6, 3, 3, 3, 3, 2, 2, 3, 3, 2, 2, 2, 1, 3, 2, 3, 1, 2, 1, 2, 2, 1, 2, 1, 1, 2, 2], dtype=float)
+STREETS = ["Maple Ave", "Oak Street", "Main Street", "Market Street", "Bay Street", "Elizabeth St",
+           "Baker Street", "Changi Ave", "Rue de Rivoli", "Wilhelmstrasse", "Harbour Rd", "King Street",
+           "Queen Street", "Park Lane", "Station Rd", "Industrial Way", "Dock Road", "Airport Blvd"]
+
+CARRIERS = {
+    "US": ["RapidHaul USA", "Summit Express", "Metro Delivery", "Northeast Logistics", "Starline Express"],
+    "CA": ["GreatNorth Freight", "Polar Logistics", "Maple Leaf Cargo"],
+    "EU": ["EuroWay Freight", "Alpine Transports", "Continental Carriers"],
+    "UK": ["BritExpress", "Thames Logistics"],
+    "SEA": ["ASEAN Freightways", "Pacific Haulage", "Orient Cargo"],
+    "AU": ["DownUnder Logistics", "Southern Cross Freight"],
+    "LAT": ["Andes Mountain Cargo", "Rainbow Transport"],
+    "ME": ["Desert Falcon Logistics", "Evergreen Express"],
+}
+ROUTE_PREFIX = {"US": "RT", "CA": "CA", "EU": "EU", "UK": "UKIE", "SEA": "SEA", "AU": "AU", "LAT": "LAT", "ME": "ME"}
+ROUTES_PER_REGION = 60
+
+# shipment type -> (probability, weight kg median, volume m3 median, vehicles, vehicle probabilities)
+SHIPMENT_TYPES = {
+    "parcel": (0.33, 18.0, 0.12, ["van", "truck", "air"], [0.5, 0.35, 0.15]),
+    "pallet": (0.25, 140.0, 1.0, ["truck", "rail", "van"], [0.6, 0.3, 0.1]),
+    "document": (0.17, 0.02, 0.0003, ["van", "air", "truck"], [0.5, 0.35, 0.15]),
+    "container": (0.16, 3900.0, 14.0, ["ship", "rail", "truck"], [0.55, 0.3, 0.15]),
+    "other": (0.09, 80.0, 0.6, ["other", "truck"], [0.7, 0.3]),
+}
+
+# vehicle -> (delay probability, transit days low, high)
+VEHICLES = {
+    "air": (0.12, 1, 3), "van": (0.22, 1, 3), "truck": (0.25, 2, 5),
+    "rail": (0.55, 4, 10), "ship": (0.7, 10, 30), "other": (0.5, 2, 7),
+}
+
+CAUSES = ["weather", "customs", "staffing", "traffic", "vehicle breakdown"]
+CAUSE_MEAN_DAYS = np.array([3.0, 4.0, 2.0, 1.0, 3.0])
+# relative cause weights per vehicle (same order as CAUSES)
+CAUSE_WEIGHTS = {
+    "air": [5, 3, 2, 0.5, 0.3], "van": [2, 0.3, 2, 5, 0.6], "truck": [2, 1, 2, 4, 1],
+    "rail": [3, 1, 3, 0.5, 1], "ship": [4, 5, 2, 0.2, 0.5], "other": [2, 2, 2, 2, 1],
+}
+CAUSE_COUNT_PROBS = [0.35, 0.5, 0.15]   # 1, 2 or 3 causes per delayed shipment
+
+
+def _all_carriers():
+    return [name for names in CARRIERS.values() for name in names]
+
+
+def _carrier_reliability(seed):
+    # Fixed per seed, so every chunk of one file sees the same carrier mix
+    rng = np.random.default_rng([seed, 1])
+    return dict(zip(_all_carriers(), rng.uniform(0.6, 1.5, len(_all_carriers()))))
+
+
+# Every ordered cause combination of length 1-3, as one string, indexed by code
+_COMBOS = [combo for k in (1, 2, 3) for combo in itertools.permutations(range(len(CAUSES)), k)]
+_COMBO_TEXT = np.array([",".join(CAUSES[c] for c in combo) for combo in _COMBOS], dtype=object)
+# dense lookup from the base-5 digits of a combination to its code
+_COMBO_INDEX = {k: np.full(len(CAUSES) ** k, -1, dtype="int64") for k in (1, 2, 3)}
+for _code, _combo in enumerate(_COMBOS):
+    _COMBO_INDEX[len(_combo)][int(np.dot(_combo, len(CAUSES) ** np.arange(len(_combo) - 1, -1, -1)))] = _code
+
+
+def _pick(rng, options, probs, size):
+    probs = np.asarray(probs, dtype=float)
+    return np.asarray(options, dtype=object)[rng.choice(len(options), size=size, p=probs / probs.sum())]
+
+
+def _locations(rng, n):
+    idx = rng.choice(len(LOCATIONS), size=n, p=LOCATION_WEIGHTS / LOCATION_WEIGHTS.sum())
+    table = np.array(LOCATIONS, dtype=object)[idx]
+    streets = np.array(STREETS, dtype=object)[rng.integers(0, len(STREETS), n)]
+    numbers = rng.integers(1, 3000, n).astype(str).astype(object)
+    postal = (table[:, 2].astype("int64") + rng.integers(0, 40, n)).astype(str).astype(object)
+    return {
+        "street_address": numbers + " " + streets,
+        "city": table[:, 0], "state": table[:, 1], "postal_code": postal,
+        "country": table[:, 3], "region": table[:, 4],
+    }
+
+
+def _lookup(values, table):
+    # per-row table[value] without a Python loop over rows
+    keys = list(table)
+    codes = pd.Categorical(values, categories=keys).codes
+    return np.array([table[k] for k in keys], dtype=float)[codes]
+
+
+def _causes(rng, vehicles):
+    """Weighted sampling of 1-3 distinct causes per row, without replacement."""
+    n = len(vehicles)
+    weights = _lookup(vehicles, CAUSE_WEIGHTS)
+    # exponential race: the smallest -log(u)/w keys are a weighted sample without replacement
+    order = np.argsort(-np.log(rng.random((n, len(CAUSES)))) / weights, axis=1)
+    count = rng.choice(3, size=n, p=CAUSE_COUNT_PROBS) + 1
+    codes = np.empty(n, dtype="int64")
+    for k in (1, 2, 3):
+        rows = count == k
+        digits = order[rows, :k] @ (len(CAUSES) ** np.arange(k - 1, -1, -1))
+        codes[rows] = _COMBO_INDEX[k][digits]
+    mean_days = np.where(
+        count[:, None] > np.arange(3), CAUSE_MEAN_DAYS[order[:, :3]], 0.0
+    ).sum(axis=1)
+    return codes, order[:, 0], mean_days
+
+
+def generate_shipments(rows, seed=0, start_index=0):
+    """One DataFrame of ``rows`` synthetic shipments; deterministic per (seed, start_index)."""
+    rng = np.random.default_rng([seed, start_index])
+    n = rows
+
+    kinds = list(SHIPMENT_TYPES)
+    shipment_type = _pick(rng, kinds, [SHIPMENT_TYPES[k][0] for k in kinds], n)
+    vehicle = np.empty(n, dtype=object)
+    weight = np.empty(n)
+    volume = np.empty(n)
+    for kind, (_, weight_median, volume_median, vehicles, probs) in SHIPMENT_TYPES.items():
+        rows_of_kind = shipment_type == kind
+        size = int(rows_of_kind.sum())
+        vehicle[rows_of_kind] = _pick(rng, vehicles, probs, size)
+        weight[rows_of_kind] = weight_median * rng.lognormal(0.0, 0.6, size)
+        volume[rows_of_kind] = volume_median * rng.lognormal(0.0, 0.5, size)
+
+    origin = _locations(rng, n)
+    destination = _locations(rng, n)
+
+    # carriers and routes follow the origin region
+    carrier = np.empty(n, dtype=object)
+    route = np.empty(n, dtype=object)
+    for region, names in CARRIERS.items():
+        in_region = origin["region"] == region
+        size = int(in_region.sum())
+        carrier[in_region] = np.array(names, dtype=object)[rng.integers(0, len(names), size)]
+        numbers = rng.integers(1, ROUTES_PER_REGION + 1, size)
+        route[in_region] = np.char.add(ROUTE_PREFIX[region], np.char.zfill(numbers.astype(str), 3)).astype(object)
+
+    reliability = _carrier_reliability(seed)
+    delay_p = _lookup(vehicle, {v: spec[0] for v, spec in VEHICLES.items()}) * _lookup(carrier, reliability)
+    delayed = rng.random(n) < np.clip(delay_p, 0.0, 0.95)
+
+    codes, primary, mean_days = _causes(rng, vehicle)
+    delay_days = np.where(delayed, np.maximum(1, rng.poisson(0.6 * mean_days)), 0)
+
+    scheduled = START_DATE + rng.integers(0, DATE_SPAN_DAYS, n).astype("timedelta64[D]")
+    pickup_slip = np.where(rng.random(n) < 0.8, 0, rng.integers(1, 3, n))
+    low = _lookup(vehicle, {v: spec[1] for v, spec in VEHICLES.items()})
+    high = _lookup(vehicle, {v: spec[2] for v, spec in VEHICLES.items()})
+    transit = (low + np.floor(rng.random(n) * (high - low + 1))).astype("int64")
+    expected = scheduled + transit.astype("timedelta64[D]")
+    actual = expected + (pickup_slip + delay_days).astype("timedelta64[D]")
+
+    df = pd.DataFrame({
+        "shipment_id": np.char.add("SHP", np.char.zfill((np.arange(n) + start_index + 1).astype(str), 8)),
+        "origin_street_address": origin["street_address"],
+        "origin_city": origin["city"], "origin_state": origin["state"],
+        "origin_postal_code": origin["postal_code"], "origin_country": origin["country"],
+        "destination_street_address": destination["street_address"],
+        "destination_city": destination["city"], "destination_state": destination["state"],
+        "destination_postal_code": destination["postal_code"], "destination_country": destination["country"],
+        "scheduled_pickup_date": np.datetime_as_string(scheduled, unit="D"),
+        "actual_pickup_date": np.datetime_as_string(scheduled + pickup_slip.astype("timedelta64[D]"), unit="D"),
+        "expected_delivery_date": np.datetime_as_string(expected, unit="D"),
+        "actual_delivery_date": np.datetime_as_string(actual, unit="D"),
+        "is_delayed": delayed,
+        "delay_duration_days": delay_days.astype("float64"),
+        "delay_causes": np.where(delayed, _COMBO_TEXT[codes], None),
+        "primary_delay_cause": np.where(delayed, np.array(CAUSES, dtype=object)[primary], None),
+        "carrier_name": carrier,
+        "shipment_weight_kg": np.round(weight, 2),
+        "shipment_volume_m3": np.round(volume, 4),
+        "shipment_type": shipment_type,
+        "route_id": route,
+        "vehicle_type": vehicle,
+    }, columns=COLUMNS)
+
+    # the real export has occasional blanks in these columns
+    for col in ("is_delayed", "delay_duration_days", "shipment_type", "vehicle_type", "origin_country"):
+        blanks = rng.random(n) < MISSING_RATE
+        df[col] = df[col].astype(object).where(~blanks, None)
+    return df
+
+
+def write_csv(path, rows, seed=0, chunk_rows=CHUNK_ROWS):
+    """Write ``rows`` shipments to ``path`` chunk by chunk; returns ``path``."""
+    tmp = f"{path}.tmp"
+    writer = None
+    with open(tmp, "wb") as fh:
+        for start in range(0, rows, chunk_rows):
+            chunk = generate_shipments(min(chunk_rows, rows - start), seed, start)
+            # flags are written as True/False, like the real export
+            chunk["is_delayed"] = chunk["is_delayed"].map({True: "True", False: "False"})
+            if pa_csv is None:
+                chunk.to_csv(fh, index=False, header=start == 0)
+                continue
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pa_csv.CSVWriter(fh, table.schema)
+            writer.write_table(table)
+        if writer is not None:
+            writer.close()
+    os.replace(tmp, path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rows", type=int)
+    parser.add_argument("path")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+    write_csv(args.path, args.rows, args.seed, args.chunk_rows)
+    print(f"wrote {args.rows:,} rows to {args.path}")
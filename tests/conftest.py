@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Modules read their settings at import: point every cache at a scratch dir first
+os.environ.setdefault("LDA_CACHE_DIR", tempfile.mkdtemp(prefix="lda-tests-"))
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+os.environ.setdefault("CREWAI_TRACING_ENABLED", "false")
+os.environ.setdefault("OTEL_SDK_DISABLED", "true")
+# agents are built with a provider, but tests swap in benchmark.FakeLLM before any call
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_data import write_csv  # noqa: E402
+
+SHIPMENT_ROWS = 2_000
+SHIPMENT_SEED = 7
+
+
+@pytest.fixture(scope="session")
+def shipments_csv(tmp_path_factory):
+    """Synthetic shipments CSV, written once per session."""
+    path = str(tmp_path_factory.mktemp("data") / "shipments.csv")
+    write_csv(path, SHIPMENT_ROWS, seed=SHIPMENT_SEED)
+    return path
+
+
+@pytest.fixture
+def make_shipments(tmp_path):
+    """Write a fresh synthetic CSV: ``make_shipments(rows, seed=0, name=...)``."""
+    def make(rows, seed=0, name="shipments.csv"):
+        path = str(tmp_path / name)
+        write_csv(path, rows, seed=seed)
+        return path
+
+    return make
@@ -0,0 +1,102 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import batch
+from batch import DONE_MARKER, SUMMARY_FILE, expand_inputs, file_signature, is_done, output_dir_for, run_batch
+
+
+def _csv(folder, name, rows=5):
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, name)
+    pd.DataFrame({"carrier": ["a"] * rows, "delay_hours": range(rows)}).to_csv(path, index=False)
+    return path
+
+
+def _mark_done(path, out_dir):
+    target = output_dir_for(path, out_dir)
+    os.makedirs(target, exist_ok=True)
+    with open(os.path.join(target, DONE_MARKER), "w") as fh:
+        json.dump({"status": "done", "signature": file_signature(path)}, fh)
+
+
+@pytest.fixture
+def thread_pool(monkeypatch):
+    # the batch's process pool, run on threads with a stand-in analyze_file
+    ran = []
+
+    def pool(max_workers, mp_context=None, initializer=None, initargs=()):
+        return ThreadPoolExecutor(max_workers)
+
+    def analyze_file(path, out_dir, *options):
+        ran.append(path)
+        if "broken" in path:
+            raise RuntimeError("worker died")
+        return {"file": path, "status": "done", "timings": {"total": 0.0}}
+
+    monkeypatch.setattr(batch, "ProcessPoolExecutor", pool)
+    monkeypatch.setattr(batch, "analyze_file", analyze_file)
+    return ran
+
+
+def test_done_marker_matches_the_file_signature(tmp_path):
+    path, out_dir = _csv(tmp_path / "in", "a.csv"), str(tmp_path / "out")
+    assert not is_done(path, out_dir)
+    _mark_done(path, out_dir)
+    assert is_done(path, out_dir)
+    later = time.time() + 10
+    os.utime(path, (later, later))  # re-exported since
+    assert not is_done(path, out_dir)
+
+
+def test_same_names_in_other_folders_do_not_collide(tmp_path):
+    first, second = _csv(tmp_path / "x", "daily.csv"), _csv(tmp_path / "y", "daily.csv")
+    assert output_dir_for(first, "out") != output_dir_for(second, "out")
+
+
+def test_inputs_are_expanded_once_and_filtered(tmp_path):
+    path = _csv(tmp_path, "a.csv")
+    (tmp_path / "notes.txt").write_text("skip me")
+    pattern = str(tmp_path / "*")
+    assert expand_inputs([pattern, path]) == [os.path.abspath(path)]
+
+
+def test_batch_resumes_and_records_failures(tmp_path, thread_pool):
+    out_dir = str(tmp_path / "out")
+    done = _csv(tmp_path / "in", "done.csv")
+    todo = _csv(tmp_path / "in", "todo.csv")
+    broken = _csv(tmp_path / "in", "broken.csv")
+    _mark_done(done, out_dir)
+
+    summary = run_batch([str(tmp_path / "in" / "*.csv")], out_dir, workers=2)
+
+    assert sorted(thread_pool) == sorted([todo, broken])
+    assert summary["files"][done]["resumed"] is True
+    assert summary["files"][todo]["status"] == "done"
+    assert summary["files"][broken]["status"] == "failed" and "worker died" in summary["files"][broken]["error"]
+    assert (summary["done"], summary["failed"]) == (2, 1)
+    with open(os.path.join(out_dir, SUMMARY_FILE)) as fh:
+        assert json.load(fh)["files"].keys() == summary["files"].keys()
+
+    thread_pool.clear()
+    run_batch([str(tmp_path / "in" / "*.csv")], out_dir, workers=2, force=True)
+    assert len(thread_pool) == 3
+
+
+def test_analyze_file_writes_outputs_and_marker(tmp_path, shipments_csv):
+    pytest.importorskip("crewai")
+    import benchmark
+    import pipeline
+
+    benchmark.fake_agents(pipeline)
+    out_dir = str(tmp_path / "out")
+    row = batch.analyze_file(shipments_csv, out_dir, use_cache=False, viz_planner="rules")
+    assert row["status"] == "done", row.get("error")
+    target = output_dir_for(shipments_csv, out_dir)
+    for name in list(batch.TEXT_OUTPUTS.values()) + list(batch.JSON_OUTPUTS.values()) + [batch.TRACE_FILE]:
+        assert os.path.exists(os.path.join(target, name))
+    assert row["plots"] and is_done(shipments_csv, out_dir)
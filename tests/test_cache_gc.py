@@ -0,0 +1,48 @@
+import json
+import os
+import time
+import uuid
+
+import cache_gc
+from delay_cube import CUBE_DIR, cube_path
+from ingest import PARQUET_DIR, parquet_cache_path
+from job_queue import DONE, QUEUED, _connect, init_db
+
+
+def _touch(path, age):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fh:
+        fh.write("x")
+    then = time.time() - age
+    os.utime(path, (then, then))
+    return path
+
+
+def _add_job(status, dataset_path, dataset_key):
+    init_db()
+    with _connect() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, status, dataset_path, dataset_key, options, created) VALUES (?, ?, ?, ?, ?, ?)",
+            (uuid.uuid4().hex[:12], status, dataset_path, dataset_key, json.dumps({}), time.time()),
+        )
+
+
+def test_pending_job_keeps_its_keyed_caches(tmp_path):
+    # the job's input is a user path; its caches are named by the stored registry key
+    key, done_key = uuid.uuid4().hex, uuid.uuid4().hex
+    source = str(tmp_path / "shipments.csv")
+    _add_job(QUEUED, source, key)
+    _add_job(DONE, source, done_key)
+    cube = _touch(cube_path(key), age=10)
+    old_cube = _touch(cube_path(done_key), age=10)
+    paths = [cube, old_cube]
+    if parquet_cache_path(key):
+        paths.append(_touch(parquet_cache_path(key), age=10))
+
+    keep = cache_gc.in_use_paths()
+    assert {os.path.abspath(p) for p in paths if done_key not in p} <= keep
+
+    # dry run: the scratch cache dirs are shared with the other tests
+    removed = cache_gc.collect(dirs=(CUBE_DIR, PARQUET_DIR), ttl=0, dry_run=True)["removed"]
+    assert old_cube in removed
+    assert not set(paths[:1] + paths[2:]) & set(removed)
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from dataset_registry import DatasetHandle, register_dataset
+from ingest import iter_frames
+from pipeline import _prompt_fields
+from streaming_profiler import profile_chunks
+
+
+def _profile(path, chunksize):
+    return profile_chunks(iter_frames(path, chunksize=chunksize))
+
+
+def test_profile_sample_is_deterministic(make_shipments, monkeypatch):
+    # a reservoir smaller than the file, so sampling actually drops values
+    monkeypatch.setattr("streaming_profiler.RESERVOIR_SIZE", 100)
+    path = make_shipments(1_000, seed=3)
+    first, again, rechunked = _profile(path, 250), _profile(path, 250), _profile(path, 400)
+    for col, column in first.column_profiles.items():
+        if not column.numeric:
+            continue
+        assert len(column.res_values) == 100
+        assert np.array_equal(np.sort(column.res_values), np.sort(again.column_profiles[col].res_values))
+        assert column.quantiles() == rechunked.column_profiles[col].quantiles()
+
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_prompt_is_identical_across_profiles(shipments_csv, compact):
+    # prompts are part of the result-cache key: a fresh profile must render the same text
+    loaded = register_dataset(shipments_csv)
+    streamed = DatasetHandle(key=loaded.key, source="copy", path=shipments_csv, derived=dict(loaded.derived))
+    fields = _prompt_fields(loaded, loaded.profile(), loaded.delay_aggregates(), compact)
+    again = _prompt_fields(streamed, streamed.profile(), streamed.delay_aggregates(), compact)
+    assert fields == again
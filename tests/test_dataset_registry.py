@@ -0,0 +1,21 @@
+from dataset_registry import load_report, register_dataset, resolve_dataset
+
+
+def test_same_content_is_parsed_once(make_shipments):
+    path = make_shipments(300, seed=1)
+    parses = load_report()["parses"]
+    handle = register_dataset(path)
+    with open(path, "rb") as fh:
+        upload = fh.read()
+    assert register_dataset(path) is handle
+    assert register_dataset(upload) is handle  # an upload of the same bytes
+    assert resolve_dataset(handle.key) is handle
+    assert load_report()["parses"] == parses + 1
+
+
+def test_lazy_handle_is_profiled_without_parsing(make_shipments):
+    path = make_shipments(300, seed=2)
+    handle = register_dataset(path, lazy=True)
+    assert handle.row_count == 300
+    assert handle.delay_aggregates() is not None
+    assert not handle.is_loaded
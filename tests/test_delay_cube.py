@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from dataset_registry import register_dataset
+from delay_analytics import to_delay_flag
+from delay_cube import build_cube, build_cube_chunks
+from ingest import iter_frames
+
+
+def test_totals_match_pandas(shipments_csv):
+    df = register_dataset(shipments_csv).df
+    cube = build_cube(df)
+    total = cube.query().iloc[0]
+    flag = to_delay_flag(df["is_delayed"])
+    assert int(total["shipments"]) == len(df)
+    assert int(total["delayed"]) == int(flag.sum())
+
+    table = cube.query(by=["carrier_name"]).set_index("carrier_name").sort_index()
+    expected = flag.groupby(df["carrier_name"].astype(str), observed=True).agg(["size", "sum"]).sort_index()
+    assert table["shipments"].tolist() == expected["size"].tolist()
+    assert table["delayed"].tolist() == expected["sum"].tolist()
+    assert np.allclose(table["delay_rate"], expected["sum"] / expected["size"])
+
+
+def test_slice_matches_pandas(shipments_csv):
+    df = register_dataset(shipments_csv).df
+    carrier = str(df["carrier_name"].iloc[0])
+    sliced = build_cube(df).query({"carrier_name": [carrier]}).iloc[0]
+    rows = df[df["carrier_name"].astype(str) == carrier]
+    delayed = to_delay_flag(rows["is_delayed"])
+    duration = pd.to_numeric(rows["delay_duration_days"], errors="coerce")[delayed]
+    assert int(sliced["shipments"]) == len(rows)
+    assert np.isclose(sliced["mean_delay_days"], duration.mean())
+
+
+def test_chunked_cube_equals_full_cube(shipments_csv):
+    full = build_cube(register_dataset(shipments_csv).df)
+    merged = build_cube_chunks(iter_frames(shipments_csv, chunksize=300))
+    by = [dim for dim in full.dims if dim != "month"][:2]
+    pd.testing.assert_frame_equal(full.query(by=by), merged.query(by=by))
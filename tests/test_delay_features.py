@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from delay_features import add_delay_features, describe_derived, plan_delay_features
+
+
+def _orders():
+    return pd.DataFrame({
+        "order": ["a", "b", "c", "d"],
+        "scheduled_pickup_date": pd.to_datetime(["2024-01-01", "2024-01-01", "2024-01-02", "2024-01-03"]),
+        "actual_pickup_date": pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-02", None]),
+        # untyped columns (e.g. a schema fallback) are parsed here
+        "expected_delivery_date": ["2024-01-05 00:00", "2024-01-05 00:00", "2024-01-06 00:00", "2024-01-07 00:00"],
+        "actual_delivery_date": ["2024-01-05 12:00", "2024-01-08 00:00", "2024-01-04 00:00", None],
+    })
+
+
+def test_date_pairs_are_matched_by_name():
+    names = {name for name, _, _ in plan_delay_features(_orders().columns)}
+    assert names == {"pickup_slip_days", "delivery_slip_days", "transit_days", "planned_transit_days"}
+    assert plan_delay_features(["order", "created_at", "weight"]) == []
+
+
+def test_delay_flag_and_duration_come_from_the_delivery_slip():
+    df = _orders()
+    out, derived = add_delay_features(df)
+
+    np.testing.assert_allclose(out["delivery_slip_days"], [0.5, 3.0, -2.0, np.nan])
+    np.testing.assert_allclose(out["transit_days"], [4.5, 6.0, 2.0, np.nan])
+    assert out["is_delayed"].tolist()[:3] == [True, True, False]
+    assert out["is_delayed"].isna().tolist() == [False, False, False, True]
+    np.testing.assert_allclose(out["delay_duration_days"], [0.5, 3.0, 0.0, np.nan])
+    assert derived["is_delayed"] == "delivery_slip_days > 0"
+    assert "is_delayed" not in df.columns  # the input is left alone
+    assert "- delay_duration_days = max(delivery_slip_days, 0)" in describe_derived(derived)
+
+
+def test_explicit_delay_columns_are_kept():
+    df = _orders().assign(is_delayed=[False] * 4, delay_duration_days=[9] * 4)
+    out, derived = add_delay_features(df)
+    assert out["is_delayed"].tolist() == [False] * 4
+    assert out["delay_duration_days"].tolist() == [9] * 4
+    assert "is_delayed" not in derived and "delivery_slip_days" in derived
+
+
+def test_chunks_derive_the_same_values_as_the_whole_frame():
+    df = _orders()
+    whole, _ = add_delay_features(df)
+    parts = pd.concat([add_delay_features(df.iloc[:2])[0], add_delay_features(df.iloc[2:])[0]])
+    pd.testing.assert_frame_equal(parts, whole)
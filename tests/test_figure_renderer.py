@@ -0,0 +1,75 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import pytest
+
+import figure_renderer
+from figure_renderer import figure_key, render_figures
+from plot_executor import PlotData
+
+PNG = b"\x89PNG"
+
+
+def _bars(values, metric="Mean delay by carrier"):
+    plot = {"metric": metric, "chart_type": "bar", "x": "carrier", "y": "delay_hours", "aggregation": "mean"}
+    series = pd.Series(values, index=[f"carrier-{i}" for i in range(len(values))], name="delay_hours")
+    return PlotData(plot=plot, series=series, xlabel="carrier", ylabel="delay_hours")
+
+
+@pytest.fixture(autouse=True)
+def scratch_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(figure_renderer, "FIGURE_DIR", str(tmp_path / "figures"))
+    monkeypatch.setattr(figure_renderer, "_MEMO", OrderedDict())
+
+
+class BrokenPool:
+    def __init__(self):
+        self.shutdown_args = None
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool("worker killed"))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shutdown_args = (wait, cancel_futures)
+
+
+def test_figures_are_cached_in_memory_and_on_disk(monkeypatch):
+    monkeypatch.setattr(figure_renderer, "RENDER_WORKERS", 1)
+    plots = [_bars([1.0, 2.0]), _bars([3.0, 1.5], metric="Mean delay by lane")]
+    stats = {}
+    images = render_figures(plots, stats=stats)
+    assert all(image.startswith(PNG) for image in images)
+    assert stats == {"cached": 0, "rendered": 2}
+
+    def no_render(*args):
+        raise AssertionError("cached figures are not drawn again")
+
+    monkeypatch.setattr(figure_renderer, "render_figure", no_render)
+    assert render_figures(plots, stats=stats) == images
+    monkeypatch.setattr(figure_renderer, "_MEMO", OrderedDict())  # a new process: served from FIGURE_DIR
+    assert render_figures(plots, stats=stats) == images
+    assert stats == {"cached": 2, "rendered": 0}
+
+
+def test_figure_key_follows_the_data_and_style():
+    key = figure_key(_bars([1.0, 2.0]))
+    assert figure_key(_bars([1.0, 2.0])) == key
+    assert figure_key(_bars([1.0, 2.5])) != key
+    assert figure_key(_bars([1.0, 2.0]), fmt="svg") != key
+    assert figure_key(_bars([1.0, 2.0]), style={**figure_renderer.STYLE, "dpi": 60}) != key
+
+
+def test_broken_pool_is_shut_down_and_plots_drawn_here(monkeypatch):
+    pool = BrokenPool()
+    monkeypatch.setattr(figure_renderer, "RENDER_WORKERS", 2)
+    monkeypatch.setattr(figure_renderer, "_POOL", pool)
+
+    images = render_figures([_bars([1.0, 2.0]), _bars([2.0, 4.0])])
+
+    assert all(image.startswith(PNG) for image in images)
+    assert pool.shutdown_args == (False, True)
+    assert figure_renderer._POOL is None  # the next dashboard starts a new pool
@@ -0,0 +1,111 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("crewai")
+
+import benchmark  # noqa: E402
+import incremental  # noqa: E402
+import pipeline  # noqa: E402
+from dataset_registry import register_dataset  # noqa: E402
+from incremental import delay_snapshot, run_incremental  # noqa: E402
+from synthetic_data import write_csv  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fake_llm():
+    return benchmark.fake_agents(pipeline)
+
+
+def _settle(path):
+    # old enough that the tail reader does not wait for more writes
+    past = time.time() - 60
+    os.utime(path, (past, past))
+
+
+def _run(path, tmp_path):
+    return run_incremental(path, state_dir=str(tmp_path / "state"), chunksize=128, use_cache=False)
+
+
+def _assert_same_delays(run, path):
+    expected = delay_snapshot(register_dataset(path).delay_aggregates())
+    assert delay_snapshot(run.dataset.delay_aggregates()) == pytest.approx(expected)
+
+
+def test_unterminated_last_line_is_read(make_shipments, tmp_path):
+    path = make_shipments(500, seed=4)
+    with open(path, "rb+") as fh:
+        fh.seek(-1, os.SEEK_END)
+        assert fh.read(1) == b"\n"
+        fh.truncate(os.path.getsize(path) - 1)
+    _settle(path)
+    run = _run(path, tmp_path)
+    assert run.rows_ingested == run.total_rows == 500
+    _assert_same_delays(run, path)
+
+
+def test_appended_rows_are_merged(make_shipments, tmp_path):
+    path = make_shipments(400, seed=5)
+    _settle(path)
+    assert _run(path, tmp_path).total_rows == 400
+
+    extra = write_csv(str(tmp_path / "extra.csv"), 100, seed=6)
+    with open(extra, "rb") as src, open(path, "ab") as dst:
+        src.readline()  # header
+        dst.write(src.read())
+    _settle(path)
+    run = _run(path, tmp_path)
+    assert not run.reset
+    assert run.rows_ingested == 100
+    assert run.total_rows == 500
+    _assert_same_delays(run, path)
+    # appended chunks are typed like a full load
+    frame = next(iter(run.dataset.iter_frames()))
+    assert str(frame["actual_delivery_date"].dtype).startswith("datetime64")
+
+
+def test_appends_are_streamed_in_blocks(make_shipments, tmp_path, monkeypatch):
+    # a block far smaller than a row: the last newline is still found
+    monkeypatch.setattr(incremental, "TAIL_BLOCK_BYTES", 16)
+    path = make_shipments(300, seed=8)
+    with open(path, "ab") as fh:
+        fh.write(b"\n")  # a trailing blank line is no row
+    _settle(path)
+    run = _run(path, tmp_path)
+    assert run.rows_ingested == 300
+    _assert_same_delays(run, path)
+
+
+def test_evicted_snapshot_reloads_only_its_rows(make_shipments, tmp_path):
+    path = make_shipments(300, seed=9)
+    _settle(path)
+    handle = _run(path, tmp_path).dataset
+    expected = delay_snapshot(handle.delay_aggregates())
+
+    extra = write_csv(str(tmp_path / "extra.csv"), 200, seed=10)
+    with open(extra, "rb") as src, open(path, "ab") as dst:
+        src.readline()
+        dst.write(src.read())
+    handle.unload()  # as on a registry eviction
+    assert delay_snapshot(handle.delay_aggregates()) == pytest.approx(expected)
+    assert len(handle.df) == 300
+
+
+def test_append_that_widens_the_schema_rereads_the_file(make_shipments, tmp_path):
+    path = make_shipments(300, seed=11)
+    _settle(path)
+    assert _run(path, tmp_path).total_rows == 300
+
+    extra = pd.read_csv(write_csv(str(tmp_path / "extra.csv"), 100, seed=12), dtype=str)
+    extra.loc[3, "origin_postal_code"] = "SW1A 1AA"  # no longer an integer
+    with open(path, "a", newline="") as dst:
+        extra.to_csv(dst, header=False, index=False)
+    _settle(path)
+    run = _run(path, tmp_path)
+    assert run.reset
+    assert run.rows_ingested == run.total_rows == 400
+    frames = list(run.dataset.iter_frames())
+    assert len({str(frame["origin_postal_code"].dtype) for frame in frames}) == 1
+    assert run.dataset.schema["origin_postal_code"] == "string"
@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+
+import ingest
+from ingest import SCHEMA_FALLBACKS, SchemaWidened, fold_frames, iter_csv_frames, iter_frames
+
+
+@pytest.fixture
+def late_value_csv(tmp_path, monkeypatch):
+    # the schema sample sees yes/no only; "maybe" turns up in the third chunk
+    monkeypatch.setattr(ingest, "SCHEMA_SAMPLE_ROWS", 100)
+    flags = ["yes", "no"] * 150
+    flags[250] = "maybe"
+    path = str(tmp_path / "flags.csv")
+    pd.DataFrame({"shipment": range(300), "insured": flags}).to_csv(path, index=False)
+    return path
+
+
+def test_late_fallback_stops_the_read(late_value_csv):
+    chunks = iter_csv_frames(late_value_csv, chunksize=100)
+    assert str(next(chunks)["insured"].dtype) == "boolean"
+    next(chunks)
+    with pytest.raises(SchemaWidened) as raised:
+        next(chunks)
+    assert raised.value.schema["insured"] == "string"
+
+
+def test_fold_frames_rereads_with_the_relaxed_schema(late_value_csv):
+    chunks, schema = fold_frames(list, lambda relaxed: iter_frames(late_value_csv, chunksize=100, schema=relaxed))
+    assert schema["insured"] == "string"
+    assert len(chunks) == 3
+    assert {str(chunk["insured"].dtype) for chunk in chunks} == {str(chunks[0]["insured"].dtype)}
+    assert pd.concat(chunks)["insured"].tolist().count("maybe") == 1
+
+
+def test_first_chunk_fallback_is_recorded_not_raised(late_value_csv):
+    chunks = list(iter_csv_frames(late_value_csv, chunksize=300))
+    assert len(chunks) == 1
+    assert chunks[0].attrs[SCHEMA_FALLBACKS] == {"insured": {"kind": "bool", "unconverted": 1}}
+
+
+def test_given_schema_is_not_modified(late_value_csv):
+    schema = {"shipment": "int", "insured": "bool"}
+    with pytest.raises(SchemaWidened):
+        list(iter_csv_frames(late_value_csv, schema, chunksize=300))
+    assert schema["insured"] == "bool"
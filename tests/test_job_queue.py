@@ -0,0 +1,101 @@
+import json
+import os
+import time
+import uuid
+from concurrent.futures import Future
+
+import pytest
+
+import job_queue
+from job_queue import DONE, FAILED, QUEUED, RUNNING, WORKER_DIED, _connect, get_job, init_db
+
+
+class FakePool:
+    """Records submissions instead of running them."""
+
+    def __init__(self):
+        self.submitted = []
+        self.futures = []
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        self.submitted.append(args[0])
+        self.futures.append(Future())
+        return self.futures[-1]
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+@pytest.fixture
+def add_job():
+    init_db()
+
+    def add(status, heartbeat=None, dataset_path="/nonexistent/shipments.csv"):
+        job_id = uuid.uuid4().hex[:12]
+        with _connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, dataset_path, options, created, started, heartbeat) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, status, dataset_path, json.dumps({}), time.time() - 3600, heartbeat, heartbeat),
+            )
+        return job_id
+
+    return add
+
+
+def test_resume_requeues_only_stale_running_jobs(add_job, monkeypatch):
+    live = add_job(RUNNING, heartbeat=time.time())
+    stale = add_job(RUNNING, heartbeat=time.time() - 2 * job_queue.JOB_STALE_SECONDS)
+    queued = add_job(QUEUED)
+    pool = FakePool()
+    monkeypatch.setattr(job_queue, "_POOL", pool)
+
+    job_queue._resume_pending()
+
+    assert {stale, queued} <= set(pool.submitted)
+    assert live not in pool.submitted
+    assert get_job(live)["status"] == RUNNING
+    assert get_job(stale)["status"] == QUEUED
+
+
+def test_broken_pool_fails_only_its_own_jobs(add_job, monkeypatch):
+    broken = FakePool()
+    mine, other = add_job(RUNNING, heartbeat=time.time()), add_job(RUNNING, heartbeat=time.time())
+    waiting = add_job(QUEUED)
+    job_queue._submit(broken, mine)
+    job_queue._submit(broken, waiting)
+    monkeypatch.setattr(job_queue, "_POOL", broken)
+    replacement = FakePool()
+    monkeypatch.setattr(job_queue, "_pool", lambda: replacement)
+
+    assert job_queue._replace_broken(broken) is replacement
+
+    assert broken.shut_down
+    assert get_job(mine)["status"] == FAILED and get_job(mine)["error"] == WORKER_DIED
+    assert get_job(other)["status"] == RUNNING  # another pool's (or process's) job
+    assert get_job(waiting)["status"] == QUEUED  # resumed by the new pool
+    assert broken not in job_queue._POOL_JOBS
+
+
+def test_finished_jobs_leave_the_pool_set(add_job):
+    pool = FakePool()
+    job_id = add_job(QUEUED)
+    job_queue._submit(pool, job_id)
+    pool.futures[0].set_result(job_id)
+    assert job_id not in job_queue._POOL_JOBS[pool]
+
+
+def test_failed_job_records_traceback(add_job):
+    job_id = add_job(QUEUED)
+    job_queue._run_job(job_id)
+    job = get_job(job_id)
+    assert job["status"] == FAILED
+    assert "Traceback" in job["error"]
+    assert job["owner"].endswith(f":{os.getpid()}")
+
+
+def test_job_is_claimed_once(add_job):
+    job_id = add_job(DONE)
+    job_queue._run_job(job_id)
+    assert get_job(job_id)["status"] == DONE
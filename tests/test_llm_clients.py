@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("crewai")
+
+from crewai import LLM  # noqa: E402
+
+import llm_clients  # noqa: E402
+from llm_clients import pooled_llm  # noqa: E402
+from mock_llm_server import CANNED_ANSWER, serve  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "How late are the trucks?"}]
+
+
+@pytest.fixture(autouse=True)
+def fast_limits(monkeypatch):
+    monkeypatch.setattr(llm_clients, "BACKOFF_BASE_SECONDS", 0.01)
+    monkeypatch.setattr(llm_clients, "_LIMITERS", {})
+
+
+@pytest.fixture
+def mock_server():
+    servers = []
+
+    def start(**options):
+        server = serve(port=0, **options)
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def mock_llm(server, stream=False):
+    host, port = server.server_address
+    return LLM(model="openai/mock-model", base_url=f"http://{host}:{port}/v1", api_key="test",
+               max_retries=0, stream=stream)
+
+
+def test_throttled_provider_is_retried_by_the_pool_only(mock_server):
+    server = mock_server(fail_first=2)
+    llm = pooled_llm(mock_llm(server), "mock")
+    assert llm.call(MESSAGES) == CANNED_ANSWER
+    # two 429s and one success: no retries inside the client or crewai
+    assert server.counter["requests"] == 3
+    assert llm.stats == {"mock.throttled": 2, "mock.ok": 1}
+
+
+def test_throttling_fails_over_and_cools_down(mock_server):
+    primary, fallback = mock_server(fail_rate=1.0), mock_server()
+    llm = pooled_llm(mock_llm(primary), "mock-primary", fallbacks=[(mock_llm(fallback), "mock-fallback")])
+    assert llm.call(MESSAGES) == CANNED_ANSWER
+    assert llm.call(MESSAGES) == CANNED_ANSWER
+    assert primary.counter["requests"] == 1  # the second call skipped the cooling provider
+    assert fallback.counter["requests"] == 2
+    assert llm.stats["mock-primary.skipped"] == 1
+
+
+def test_async_call_shares_the_retry_policy(mock_server):
+    server = mock_server(fail_first=1)
+    llm = pooled_llm(mock_llm(server), "mock")
+    assert asyncio.run(llm.acall(MESSAGES)) == CANNED_ANSWER
+    assert server.counter["requests"] == 2
+
+
+def test_streamed_completion_round_trip(mock_server):
+    server = mock_server()
+    llm = pooled_llm(mock_llm(server, stream=True), "mock")
+    assert llm.call(MESSAGES) == CANNED_ANSWER
+
+
+def test_split_limits_leaves_the_defaults_alone():
+    before = {provider: dict(limits) for provider, limits in llm_clients.PROVIDER_LIMITS.items()}
+    share = llm_clients.split_limits(4)
+    assert llm_clients.PROVIDER_LIMITS == before
+    assert share["openrouter"]["rpm"] == before["openrouter"]["rpm"] / 4
+    assert share["openrouter"]["in_flight"] == 1
+    assert llm_clients.split_limits(4) == share  # calling it again does not divide twice
+
+
+def test_use_limits_rebuilds_the_limiters(monkeypatch):
+    monkeypatch.setattr(llm_clients, "_LIMITS", llm_clients.PROVIDER_LIMITS)
+    before = llm_clients.get_limiter("groq")
+    llm_clients.use_limits(llm_clients.split_limits(2))
+    after = llm_clients.get_limiter("groq")
+    assert after is not before
+    assert after.bucket.rate == before.bucket.rate / 2
+
+
+def test_stats_are_counted_under_concurrency():
+    from concurrent.futures import ThreadPoolExecutor
+
+    llm = pooled_llm(LLM(model="openai/mock-model", api_key="test"), "mock")
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: llm._count("mock", "ok"), range(4_000)))
+    assert llm.stats == {"mock.ok": 4_000}
+
+
+def test_answering_fallback_is_recorded_per_task(mock_server):
+    class Task:
+        id = "task-4"
+        name = "viz_planning"
+
+    primary, fallback = mock_server(fail_rate=1.0), mock_server()
+    fallback_llm = mock_llm(fallback)
+    fallback_llm.model = "mock-fallback-model"
+    llm = pooled_llm(mock_llm(primary), "mock-primary", fallbacks=[(fallback_llm, "mock-fallback")])
+    with llm_clients.record_answers() as answered:
+        assert llm.call(MESSAGES, from_task=Task()) == CANNED_ANSWER
+    assert answered == {"viz_planning": "mock-fallback-model"}
+
+
+def test_fallback_answers_get_their_own_cache_keys():
+    from types import SimpleNamespace
+
+    from pipeline import TASK_NAMES, task_cache_keys
+
+    agent = SimpleNamespace(llm=SimpleNamespace(model="primary", temperature=0.2, max_tokens=1000))
+    tasks = [SimpleNamespace(name=name, agent=agent, description=f"do {name}", expected_output="text")
+             for name in TASK_NAMES]
+    requested = task_cache_keys("data", tasks)
+    assert task_cache_keys("data", tasks, {TASK_NAMES[0]: "primary"}) == requested
+    fallback = task_cache_keys("data", tasks, {TASK_NAMES[0]: "fallback"})
+    assert fallback[0] != requested[0]
+    assert fallback[1] != requested[1]  # downstream of the fallback's answer
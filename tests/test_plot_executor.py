@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+import plot_executor
+from plot_executor import _scatter_data, compile_plan, minmax_decimate, stratified_sample
+
+SCATTER = {"metric": "Weight vs volume", "chart_type": "scatter",
+           "x": "shipment_weight_kg", "y": "shipment_volume_m3"}
+
+
+def _points(n=5_000, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({"shipment_weight_kg": rng.lognormal(3, 1, n),
+                         "shipment_volume_m3": rng.lognormal(0, 1, n)})
+
+
+def test_scatter_sample_does_not_depend_on_earlier_draws(monkeypatch):
+    monkeypatch.setattr(plot_executor, "LARGE_DATA_POINTS", 1_000)
+    monkeypatch.setattr(plot_executor, "SAMPLE_POINTS", 500)
+    monkeypatch.setattr(plot_executor, "SCATTER_REDUCTION", "sample")
+    df = _points()
+    first = _scatter_data(SCATTER, df, SCATTER["x"], SCATTER["y"])
+    stratified_sample(df.iloc[:, 0].to_numpy(), df.iloc[:, 1].to_numpy(), 100, seed=1)  # another plot
+    again = _scatter_data(SCATTER, df, SCATTER["x"], SCATTER["y"])
+    assert len(first.points[0]) <= 500
+    assert np.array_equal(first.points[0], again.points[0])
+
+
+def test_stratified_sample_keeps_sparse_cells():
+    x = np.concatenate([np.zeros(10_000), [100.0]])
+    y = np.concatenate([np.zeros(10_000), [100.0]])
+    keep = stratified_sample(x, y, 50, bins=10)
+    assert len(keep) <= 50
+    assert len(x) - 1 in keep  # the outlier survives thinning
+
+
+def test_minmax_decimate_keeps_extremes():
+    values = np.sin(np.linspace(0, 20, 10_000))
+    values[1234] = 5.0
+    keep = minmax_decimate(values, 100)
+    assert len(keep) <= 102
+    assert 1234 in keep and 0 in keep and len(values) - 1 in keep
+
+
+def test_plots_on_one_column_share_a_group_pass():
+    plan = compile_plan([
+        {"chart_type": "bar", "x": "carrier_name", "aggregation": "count"},
+        {"chart_type": "pie", "column": "carrier_name"},
+        {"chart_type": "bar", "x": "carrier_name", "y": "is_delayed", "aggregation": "mean"},
+    ])
+    assert plan["groups"] == {"carrier_name": {(None, "size"), ("is_delayed", "mean")}}
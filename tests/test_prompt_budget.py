@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from delay_analytics import aggregate_delays
+from prompt_budget import _cell, build_data_context, build_viz_context, estimate_tokens, rank_columns
+from streaming_profiler import profile_frame
+
+
+@pytest.fixture
+def shipments():
+    rng = np.random.default_rng(0)
+    n = 400
+    carriers = np.array([f"Carrier {i}" for i in range(12)])
+    df = pd.DataFrame({
+        "shipment_id": [f"SHP{i:06d}" for i in range(n)],
+        "origin_street_address": [f"{i} Harbour Road, Unit {i % 7}" for i in range(n)],
+        "carrier_name": rng.choice(carriers, n),
+        "route_id": rng.choice([f"R{i:03d}" for i in range(30)], n),
+        "is_delayed": rng.random(n) < 0.3,
+        "delay_duration_days": rng.integers(0, 5, n),
+        "primary_delay_cause": rng.choice(["weather", "customs", "capacity"], n),
+        "shipment_weight_kg": rng.lognormal(4, 1, n).round(1),
+        "scheduled_pickup_date": pd.date_range("2024-01-01", periods=n, freq="h"),
+        "currency": "EUR",
+    })
+    return profile_frame(df), aggregate_delays(df)
+
+
+def test_columns_are_ranked_for_delay_analysis(shipments):
+    profile, _ = shipments
+    ranked = {col: score for col, score, _ in rank_columns(profile)}
+    assert ranked["is_delayed"] > ranked["carrier_name"] > ranked["shipment_weight_kg"]
+    assert ranked["shipment_id"] < 0 and ranked["origin_street_address"] < 0
+    assert ranked["currency"] < 0  # constant
+
+
+def test_data_context_fits_generous_budget_without_drops(shipments):
+    fields = build_data_context(*shipments, budget=100_000)
+    assert "dropped for token budget" not in fields["omitted"]
+    assert "shipment_id" in fields["omitted"] and "currency" in fields["omitted"]
+    assert "shipment_weight_kg" in fields["column_stats"]
+
+
+def test_tight_budget_drops_low_relevance_columns_first(shipments):
+    full = build_data_context(*shipments, budget=100_000)
+    budget = full["tokens"] - 100
+    fields = build_data_context(*shipments, budget=budget)
+    assert fields["tokens"] <= budget
+    assert fields["tokens"] == sum(estimate_tokens(v) for k, v in fields.items() if k != "tokens")
+    # delay facts shrink before columns go; delay signals are the last to go
+    assert len(fields["delay_facts"]) < len(full["delay_facts"])
+    for col in ("is_delayed", "primary_delay_cause", "carrier_name"):
+        assert col in fields["column_stats"]
+    # every column is still named, even when its stats were dropped
+    assert fields["columns"] == full["columns"]
+
+
+def test_viz_context_keeps_every_column_type(shipments):
+    profile, _ = shipments
+    fields = build_viz_context(profile, budget=1)
+    for col in profile.columns:
+        assert f"{col}:" in fields["columns"]
+    assert fields["sample"].count("\n") == 5  # header + sample rows of the top column
+
+
+def test_cells_are_compact():
+    assert _cell(1234.5678) == "1235"
+    assert _cell(float("nan")) == ""
+    assert _cell(pd.Timestamp("2024-03-01")) == "2024-03-01"
+    assert _cell("x" * 40).endswith("…") and len(_cell("x" * 40)) == 24
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from dataset_registry import register_dataset
+from pipeline import VizPlan
+from rule_planner import MAX_PLOTS, rule_plan, rule_plan_output
+from viz_validator import validate_and_repair
+
+
+def _frame(n=300, seed=0, **columns):
+    rng = np.random.default_rng(seed)
+    base = {
+        "warehouse": rng.choice(["north", "south", "east"], n),
+        "distance_km": rng.gamma(2.0, 150.0, n).round(1),
+        "cost_eur": rng.gamma(3.0, 40.0, n).round(2),
+    }
+    return pd.DataFrame({**base, **columns})
+
+
+def test_delay_dataset_gets_delay_charts_first():
+    rng = np.random.default_rng(1)
+    n = 300
+    df = _frame(
+        n,
+        carrier_name=rng.choice(["Acme", "Bolt", "Cargo"], n),
+        route_id=rng.choice([f"R{i}" for i in range(12)], n),
+        is_delayed=rng.random(n) < 0.4,
+        delay_duration_days=rng.integers(0, 9, n),
+        primary_delay_cause=rng.choice(["weather", "customs", "traffic"], n),
+        ship_date=pd.date_range("2024-01-01", periods=n, freq="D"),
+    )
+    plots = rule_plan(register_dataset(df))["plots"]
+
+    assert len(plots) == MAX_PLOTS
+    assert plots[0] == {**plots[0], "chart_type": "pie", "column": "primary_delay_cause"}
+    assert plots[1]["chart_type"] == "histogram" and plots[1]["x"] == "delay_duration_days"
+    assert [(p["x"], p["aggregation"]) for p in plots[2:4]] == [("carrier_name", "mean"), ("route_id", "mean")]
+    assert plots[4]["chart_type"] == "line" and plots[4]["x"] == "ship_date"
+
+
+def test_any_dataset_gets_breakdowns_and_distributions():
+    plots = rule_plan(register_dataset(_frame(seed=2)))["plots"]
+    charts = [(p["chart_type"], p["x"], p["y"]) for p in plots]
+    assert charts == [
+        ("bar", "warehouse", None),
+        ("histogram", "distance_km", None),
+        ("histogram", "cost_eur", None),
+        ("scatter", "distance_km", "cost_eur"),
+    ]
+
+
+def test_rule_plans_validate_unchanged():
+    handle = register_dataset(_frame(seed=3, is_delayed=np.arange(300) % 3 == 0))
+    plots = rule_plan(handle)["plots"]
+    kept, report = validate_and_repair(plots, handle, reask=False)
+    assert [row["status"] for row in report] == ["ok"] * len(plots)
+    assert kept == plots
+
+
+def test_rule_plan_output_is_a_typed_task_output():
+    output = rule_plan_output(register_dataset(_frame(seed=4)))
+    assert isinstance(output.pydantic, VizPlan)
+    assert output.json_dict == rule_plan(register_dataset(_frame(seed=4)))
+    assert output.agent == "rule planner" and not output.cached
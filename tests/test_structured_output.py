@@ -0,0 +1,67 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import pipeline
+from pipeline import InterpretationPlan, PipelineResult, VizPlan
+from result_cache import CachedTaskOutput
+from structured_output import parse_output, repair_json, typed_output
+
+PLOT = {"metric": "Delay rate by carrier", "chart_type": "bar", "x": "carrier_name", "y": "is_delayed",
+        "aggregation": "mean", "insight": "Some carriers run late more often"}
+
+
+@pytest.mark.parametrize("raw", [
+    '```json\n{"plots": [%s]}\n```',
+    'Final Answer: {"plots": [%s]} Let me know if you need more.',
+    '{"plots": [%s,],}',
+    "[%s]",
+])
+def test_near_json_answers_are_repaired(raw):
+    plan, error = parse_output(CachedTaskOutput(raw=raw % json.dumps(PLOT)), VizPlan)
+    assert error is None
+    assert plan.plots[0].x == "carrier_name"
+
+
+def test_python_literals_and_smart_quotes():
+    assert repair_json("{'a': None, 'b': True}") == {"a": None, "b": True}
+    assert repair_json("{“a”: [1, 2, null]}") == {"a": [1, 2, None]}
+
+
+def test_hopeless_answer_reports_an_error():
+    plan, error = parse_output(CachedTaskOutput(raw="I could not produce a plan."), VizPlan)
+    assert plan is None and "no JSON" in error
+    plan, error = parse_output(CachedTaskOutput(raw='{"plots": [{"metric": "m"}]}'), VizPlan)
+    assert plan is None and "chart_type" in error
+
+
+def test_built_model_is_used_as_is():
+    plan = VizPlan(plots=[PLOT])
+    assert parse_output(SimpleNamespace(pydantic=plan, raw="not json"), VizPlan) == (plan, None)
+
+
+def test_unparseable_output_reruns_only_that_task(monkeypatch):
+    calls = []
+    fixed = CachedTaskOutput(raw=json.dumps({"chart_explanation": [{"metric": "m", "explanation": ["e"]}]}))
+
+    def rerun_task(dataset, index, tasks_output, feedback=None, accept=None, viz_planner="llm"):
+        calls.append((index, feedback))
+        assert accept(fixed)
+        return fixed
+
+    monkeypatch.setattr(pipeline, "rerun_task", rerun_task)
+    result = PipelineResult(tasks_output=[CachedTaskOutput(raw="")] * 4 + [CachedTaskOutput(raw="no idea")])
+    repaired = []
+    plan = typed_output(result, 4, dataset="key", on_repaired=lambda i, out: repaired.append(i))
+
+    assert isinstance(plan, InterpretationPlan)
+    assert len(calls) == 1 and calls[0][0] == 4 and calls[0][1]
+    assert result.tasks_output[4] is fixed and repaired == [4]
+    assert fixed.pydantic is plan  # the next read is the fast path
+
+
+def test_without_dataset_nothing_is_rerun(monkeypatch):
+    monkeypatch.setattr(pipeline, "rerun_task", lambda *a, **k: pytest.fail("no re-run without a dataset"))
+    result = PipelineResult(tasks_output=[CachedTaskOutput(raw="")] * 4 + [CachedTaskOutput(raw="no idea")])
+    assert typed_output(result, 4) is None
@@ -0,0 +1,46 @@
+import pandas as pd
+
+import tool_cache
+from prompt_budget import estimate_tokens
+from tool_cache import fit_tokens, memoized_result
+
+
+def _csv(tmp_path):
+    path = str(tmp_path / "tiny.csv")
+    pd.DataFrame({"carrier": ["a", "b", "a"], "delay_hours": [1.0, 2.5, 0.0]}).to_csv(path, index=False)
+    return path
+
+
+def test_memoized_result_computes_once_and_hands_out_copies(tmp_path):
+    tool_cache.clear()
+    path = _csv(tmp_path)
+    calls = []
+
+    def compute(handle):
+        calls.append(handle.key)
+        return {"rows": len(handle.df), "columns": list(handle.df.columns)}
+
+    first = memoized_result("probe", path, {"n": 1}, compute)
+    first["columns"].append("edited by the caller")
+    second = memoized_result("probe", path, {"n": 1}, compute)
+
+    assert len(calls) == 1
+    assert second == {"rows": 3, "columns": ["carrier", "delay_hours"]}
+    memoized_result("probe", path, {"n": 2}, compute)
+    assert len(calls) == 2  # other arguments, other entry
+
+
+def test_fit_tokens_halves_the_largest_collection():
+    payload = {"row_count": 3, "values": [f"value-{i}" for i in range(400)], "small": [1, 2]}
+    fitted = fit_tokens(payload, max_tokens=200)
+
+    assert estimate_tokens(tool_cache._dumps(fitted)) <= 200
+    assert fitted["truncated"] is True
+    assert fitted["row_count"] == 3 and fitted["small"] == [1, 2]
+    assert fitted["values"] == payload["values"][:len(fitted["values"])]
+    assert len(payload["values"]) == 400  # the input is not edited
+
+
+def test_fit_tokens_leaves_small_payloads_alone():
+    payload = {"row_count": 3}
+    assert fit_tokens(payload, max_tokens=200) is payload
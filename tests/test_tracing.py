@@ -0,0 +1,86 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import (NO_SPAN, adopt, record_span, run_in_context, save_trace, span, span_rows, start_trace,
+                     to_chrome)
+
+
+def _names(trace):
+    return {s["id"]: s["name"] for s in trace["spans"]}
+
+
+def test_spans_nest_and_keep_attributes():
+    with start_trace("run", rows=10) as trace:
+        with span("profile", columns=3) as outer:
+            with span("chunk") as inner:
+                inner.add("rows", 5)
+                inner.add("rows", 5)
+            outer.set(done=True)
+    spans = {s["name"]: s for s in trace.to_dict()["spans"]}
+    assert spans["chunk"]["parent"] == spans["profile"]["id"]
+    assert spans["profile"]["parent"] == spans["run"]["id"]
+    assert spans["chunk"]["attrs"] == {"rows": 10}
+    assert spans["profile"]["attrs"] == {"columns": 3, "done": True}
+    assert spans["run"]["duration"] >= spans["profile"]["duration"]
+
+
+def test_spans_outside_a_trace_are_no_ops():
+    with span("idle") as s:
+        assert s is NO_SPAN
+    assert record_span("late", 0.0, 1.0) is NO_SPAN
+
+
+def test_failed_span_records_the_error():
+    with start_trace("run") as trace:
+        try:
+            with span("parse"):
+                raise KeyError("missing")
+        except KeyError:
+            pass
+    parse = next(s for s in trace.to_dict()["spans"] if s["name"] == "parse")
+    assert parse["attrs"]["error"] == "KeyError"
+
+
+def test_worker_threads_join_only_through_run_in_context():
+    def work(name):
+        with span(name):
+            pass
+
+    with start_trace("run") as trace:
+        with ThreadPoolExecutor(2) as pool:
+            pool.submit(run_in_context(work), "joined").result()
+            pool.submit(work, "outside").result()
+        other = threading.Thread(target=run_in_context(work), args=("thread",))
+        other.start()
+        other.join()
+    assert set(_names(trace.to_dict()).values()) == {"run", "joined", "thread"}
+
+
+def test_adopt_moves_recorded_spans_under_a_late_parent():
+    with start_trace("run") as trace:
+        with span("llm_call", task="plan"):
+            pass
+        with span("llm_call", task="explain"):
+            pass
+        task = record_span("task:plan", 0.0, 1.0)
+        adopt(task, lambda s: s.name == "llm_call" and s.attrs.get("task") == "plan")
+    spans = trace.to_dict()["spans"]
+    parents = {s["attrs"].get("task"): s["parent"] for s in spans if s["name"] == "llm_call"}
+    assert parents["plan"] == task.id
+    assert parents["explain"] == trace.root.id
+    depths = {row["name"] + row["attrs"].get("task", ""): row["depth"] for row in span_rows(trace.to_dict())}
+    assert depths["llm_callplan"] == depths["task:plan"] + 1
+
+
+def test_chrome_export(tmp_path):
+    with start_trace("run") as trace:
+        with span("render", plots=4):
+            pass
+    events = to_chrome(trace.to_dict())["traceEvents"]
+    assert {e["name"] for e in events} == {"run", "render"}
+    assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+    path = save_trace(trace.to_dict(), str(tmp_path))
+    with open(path) as fh:
+        assert json.load(fh)["traceEvents"]
+    assert (tmp_path / f"{trace.id}.json").exists()
@@ -0,0 +1,65 @@
+import pytest
+
+import viz_validator
+from dataset_registry import register_dataset
+from plot_executor import execute_plan
+from viz_validator import plan_schema, validate_and_repair
+
+DELAY_RATE = {"metric": "Delay rate by carrier", "chart_type": "bar", "x": "carrier_name",
+              "y": "is_delayed", "aggregation": "mean", "top_k": None, "insight": ""}
+
+
+class FailingLLM:
+    model = "failing"
+
+    def __init__(self):
+        self.calls = 0
+
+    def call(self, messages):
+        self.calls += 1
+        raise ConnectionError("provider down")
+
+
+def test_boolean_columns_have_their_own_kind(shipments_csv):
+    schema = plan_schema(shipments_csv)
+    assert schema["is_delayed"]["kind"] == "boolean"
+    assert schema["delay_duration_days"]["kind"] == "numeric"
+    assert schema["carrier_name"]["kind"] == "categorical"
+
+
+def test_delay_rate_bar_is_ok(shipments_csv):
+    plots, report = validate_and_repair([DELAY_RATE], shipments_csv, reask=False)
+    assert report[0]["status"] == "ok"
+    data = execute_plan(shipments_csv, plots)[0]
+    df = register_dataset(shipments_csv).df
+    expected = df.groupby("carrier_name", observed=True)["is_delayed"].mean()
+    assert len(data.series) > 0  # top carriers only
+    for carrier, rate in data.series.items():
+        assert rate == pytest.approx(expected[carrier])
+
+
+def test_near_miss_fields_are_fixed(shipments_csv):
+    plot = {"metric": "Weights", "chart_type": "Histogram Plot", "column": "Shipment Weight KG"}
+    plots, report = validate_and_repair([plot], shipments_csv, reask=False)
+    assert report[0]["status"] == "fixed"
+    assert plots[0]["chart_type"] == "histogram"
+    assert plots[0]["x"] == "shipment_weight_kg"
+    assert plots[0]["column"] is None
+
+
+def test_scatter_of_a_flag_is_dropped(shipments_csv):
+    plot = {"metric": "m", "chart_type": "scatter", "x": "is_delayed", "y": "shipment_weight_kg"}
+    plots, report = validate_and_repair([plot], shipments_csv, reask=False)
+    assert plots == []
+    assert report[0]["status"] == "dropped"
+
+
+def test_failed_reask_is_not_repeated(shipments_csv, monkeypatch):
+    monkeypatch.setattr(viz_validator, "_FAILED", type(viz_validator._FAILED)())
+    llm = FailingLLM()
+    plot = {"metric": "m", "chart_type": "bar", "x": "no_such_column", "aggregation": "count"}
+    for _ in range(3):
+        plots, report = validate_and_repair([plot], shipments_csv, llm=llm)
+    assert llm.calls == 1
+    assert report[0]["status"] == "dropped"
+    assert "provider down" in report[0]["errors"][-1]
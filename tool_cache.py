@@ -0,0 +1,133 @@
+"""Shared memo for the agent tools (stats_generator, csv_loader).
+
+Agents may call the same tool several times in one run. Paths are mapped
+to their registered dataset through an LRU keyed on path + mtime + size,
+so a repeat call neither re-hashes nor re-parses the file. Tool results
+are memoized per dataset and arguments. Every result is trimmed to a
+token cap before it reaches the next prompt. Lazy (large) datasets are
+never parsed whole: the tools read their streamed profile and first chunk.
+"""
+import copy
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from dataset_registry import DatasetHandle, resolve_dataset
+from prompt_budget import estimate_tokens
+
+# ---- SETTINGS ----
+TOOL_MEMO_SIZE = 64
+TOOL_OUTPUT_TOKENS = int(os.getenv("LDA_TOOL_OUTPUT_TOKENS", 1500))  # default cap per tool result
+MAX_SAMPLE_ROWS = 50
+MAX_TOP_VALUES = 25
+
+_PATHS = OrderedDict()   # (path, mtime_ns, size) -> dataset key
+_RESULTS = OrderedDict()  # (tool, dataset key, args) -> bounded result
+_LOCK = threading.Lock()
+
+
+def _remember(memo, key, value):
+    with _LOCK:
+        memo[key] = value
+        memo.move_to_end(key)
+        while len(memo) > TOOL_MEMO_SIZE:
+            memo.popitem(last=False)
+
+
+def _recall(memo, key):
+    with _LOCK:
+        if key in memo:
+            memo.move_to_end(key)
+            return memo[key]
+    return None
+
+
+def tool_dataset(dataset):
+    """The registered handle for a key, handle or path; paths are memoized by stat."""
+    if isinstance(dataset, DatasetHandle) or not (isinstance(dataset, str) and os.path.isfile(dataset)):
+        return resolve_dataset(dataset)
+    stat = os.stat(dataset)
+    signature = (os.path.abspath(dataset), stat.st_mtime_ns, stat.st_size)
+    key = _recall(_PATHS, signature)
+    if key is not None:
+        try:
+            return resolve_dataset(key)
+        except KeyError:  # released since; register again
+            pass
+    handle = resolve_dataset(dataset)
+    _remember(_PATHS, signature, handle.key)
+    return handle
+
+
+def memoized_result(tool, dataset, args, compute):
+    """``compute(handle)`` once per (tool, dataset, args); later calls are a dict lookup.
+
+    Each call gets its own copy, so a caller editing the result does not
+    change what the next call sees.
+    """
+    handle = tool_dataset(dataset)
+    key = (tool, handle.key, json.dumps(args, sort_keys=True, default=str))
+    result = _recall(_RESULTS, key)
+    if result is None:
+        result = compute(handle)
+        _remember(_RESULTS, key, result)
+    return copy.deepcopy(result)
+
+
+def sample_frame(handle):
+    """The loaded frame, or only the first chunk of a lazy (large) one."""
+    if handle.is_loaded:
+        return handle.df
+    frames = handle.iter_frames()
+    try:
+        return next(frames, None)
+    finally:
+        frames.close()
+
+
+def clear():
+    with _LOCK:
+        _PATHS.clear()
+        _RESULTS.clear()
+
+
+# ---- OUTPUT BOUNDS ----
+def _dumps(value):
+    return json.dumps(value, default=str)
+
+
+def _largest(value):
+    # The longest list/dict below the top level of ``value`` (len > 1), or None
+    best = None
+    stack = list(value.values()) if isinstance(value, dict) else [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, (list, dict)):
+            if len(item) > 1 and (best is None or len(_dumps(item)) > len(_dumps(best))):
+                best = item
+            stack.extend(item.values() if isinstance(item, dict) else item)
+    return best
+
+
+def fit_tokens(payload, max_tokens=TOOL_OUTPUT_TOKENS):
+    """Copy of ``payload`` whose JSON fits ``max_tokens``: the largest collections are halved.
+
+    Trimmed results carry ``"truncated": True`` so the agent knows to ask
+    for fewer columns or rows.
+    """
+    if estimate_tokens(_dumps(payload)) <= max_tokens:
+        return payload
+    payload = copy.deepcopy(payload)
+    while estimate_tokens(_dumps(payload)) > max_tokens:
+        largest = _largest(payload)
+        if largest is None:
+            break
+        if isinstance(largest, list):
+            del largest[len(largest) // 2:]
+        else:
+            for key in list(largest)[len(largest) // 2:]:
+                del largest[key]
+        if isinstance(payload, dict):
+            payload["truncated"] = True
+    return payload
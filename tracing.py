@@ -0,0 +1,218 @@
+"""Lightweight nested spans for the pipeline and plot rendering.
+
+    with start_trace("run_pipeline") as trace:
+        with span("profile", rows=n) as s:
+            ...
+            s.set(columns=len(cols))
+
+Spans are no-ops outside ``start_trace``; the trace lives in a contextvar, so
+concurrent sessions never record into each other's trace and worker threads
+join it only through ``run_in_context``. A finished trace is a plain dict
+(``trace.to_dict()``) that can be stored with a job result, written to
+.cache/traces or exported in Chrome trace format (chrome://tracing,
+Perfetto).
+"""
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+TRACE_DIR = os.path.join(os.getenv("LDA_CACHE_DIR", ".cache"), "traces")
+
+_current_trace = contextvars.ContextVar("lda_trace", default=None)
+_current_span = contextvars.ContextVar("lda_span", default=None)
+_ids = itertools.count(1)
+
+
+class Span:
+    __slots__ = ("id", "name", "parent", "start", "end", "thread", "attrs")
+
+    def __init__(self, name, parent=None, start=None, attrs=None):
+        self.id = next(_ids)
+        self.name = name
+        self.parent = parent
+        self.start = time.perf_counter() if start is None else start
+        self.end = None
+        self.thread = threading.get_ident()
+        self.attrs = dict(attrs or {})
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key, amount=1):
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+
+class _NoSpan:
+    def set(self, **attrs):
+        pass
+
+    def add(self, key, amount=1):
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class Trace:
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.created = time.time()
+        self.origin = time.perf_counter()
+        self.root = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def record(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def reparent(self, parent, predicate):
+        # Attach spans recorded before their parent existed (e.g. task spans
+        # that are only known once the task's callback fires)
+        with self._lock:
+            for span in self.spans:
+                if span is not parent and predicate(span):
+                    span.parent = parent.id
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start)
+        return {
+            "id": self.id,
+            "name": self.name,
+            "created": self.created,
+            "spans": [
+                {
+                    "id": s.id,
+                    "name": s.name,
+                    "parent": s.parent,
+                    "start": round(s.start - self.origin, 6),
+                    "duration": round((s.end or s.start) - s.start, 6),
+                    "thread": s.thread,
+                    "attrs": s.attrs,
+                }
+                for s in spans
+            ],
+        }
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+@contextmanager
+def start_trace(name, **attrs):
+    """Collect every span opened inside the block into a new Trace."""
+    trace = Trace(name)
+    trace_token = _current_trace.set(trace)
+    span_token = _current_span.set(None)
+    try:
+        with span(name, **attrs) as root:
+            trace.root = root
+            yield trace
+    finally:
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+
+
+@contextmanager
+def span(name, **attrs):
+    trace = current_trace()
+    if trace is None:
+        yield NO_SPAN
+        return
+    parent = _current_span.get() or trace.root
+    current = Span(name, parent.id if parent is not None else None, attrs=attrs)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.set(error=type(exc).__name__)
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+        trace.record(current)
+
+
+def record_span(name, start, end, parent=None, **attrs):
+    """Record a span after the fact from perf_counter timestamps."""
+    trace = current_trace()
+    if trace is None:
+        return NO_SPAN
+    parent = parent or _current_span.get() or trace.root
+    recorded = Span(name, getattr(parent, "id", None), start=start, attrs=attrs)
+    recorded.end = end
+    trace.record(recorded)
+    return recorded
+
+
+def adopt(parent, predicate):
+    """Move already-recorded spans matching ``predicate`` under ``parent``."""
+    trace = current_trace()
+    if trace is not None and isinstance(parent, Span):
+        trace.reparent(parent, predicate)
+
+
+def run_in_context(fn):
+    """Wrap ``fn`` so it runs inside the caller's trace context (for thread pools)."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+# ---- EXPORT ----
+def to_chrome(trace):
+    """Chrome trace-event JSON (complete "X" events, microseconds)."""
+    events = [
+        {
+            "name": s["name"],
+            "cat": s["name"].split(":")[0],
+            "ph": "X",
+            "ts": round(s["start"] * 1e6),
+            "dur": round(s["duration"] * 1e6),
+            "pid": 1,
+            "tid": s["thread"],
+            "args": s["attrs"],
+        }
+        for s in trace.get("spans", [])
+    ]
+    return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"trace": trace.get("name")}}
+
+
+def export_chrome(trace, path):
+    with open(path, "w") as fh:
+        json.dump(to_chrome(trace), fh, default=str)
+    return path
+
+
+def save_trace(trace, trace_dir=TRACE_DIR):
+    """Write ``<id>.json`` (spans) and ``<id>.chrome.json``; returns the latter."""
+    os.makedirs(trace_dir, exist_ok=True)
+    with open(os.path.join(trace_dir, f"{trace['id']}.json"), "w") as fh:
+        json.dump(trace, fh, default=str)
+    return export_chrome(trace, os.path.join(trace_dir, f"{trace['id']}.chrome.json"))
+
+
+def span_rows(trace):
+    """Spans in tree order with their depth, for tables."""
+    spans = trace.get("spans", [])
+    children = {}
+    ids = {s["id"] for s in spans}
+    for s in spans:
+        parent = s["parent"] if s["parent"] in ids else None
+        children.setdefault(parent, []).append(s)
+    rows = []
+
+    def walk(parent, depth):
+        for s in children.get(parent, []):
+            rows.append({"depth": depth, **s})
+            walk(s["id"], depth + 1)
+
+    walk(None, 0)
+    return rows
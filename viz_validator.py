@@ -0,0 +1,331 @@
+"""Check a VizPlan against the dataset before any aggregation runs.
+
+Every PlotConfig is compared with the typed schema (numeric / boolean /
+datetime / categorical, distinct counts) from the dataset profile:
+
+* deterministic fixes: near-miss column names, chart type aliases, fields
+  in the wrong slot (histogram ``column`` -> ``x``, pie ``x`` ->
+  ``column``), missing or unsupported aggregations, stray ``y`` / ``top_k``
+* plots that still can't be drawn (unknown columns, a mean over text, a
+  scatter of categories) are sent back to the model in one small prompt,
+  only those plots; answers are cached per dataset and plot, failed
+  re-asks too, so a broken plan does not call the model on every rerun
+
+Job workers check the plan once after the run and store the result with
+the job (``plan_hash`` tells the UI whether it still applies).
+
+    plots, report = validate_and_repair(viz_plan.model_dump()["plots"], dataset)
+"""
+import difflib
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from dataset_registry import resolve_dataset
+from ingest import infer_schema
+from plot_executor import MAX_TOP_K, plot_key
+
+# ---- SETTINGS ----
+CHART_TYPES = ("bar", "line", "scatter", "histogram", "pie")
+CHART_ALIASES = {
+    "hist": "histogram", "histo": "histogram", "distribution": "histogram",
+    "column": "bar", "barh": "bar", "count": "bar", "countplot": "bar",
+    "donut": "pie", "doughnut": "pie", "timeseries": "line", "time_series": "line",
+    "points": "scatter",
+}
+PIE_MAX_DISTINCT = 50       # beyond this a pie is unreadable even with top_k
+NAME_MATCH_CUTOFF = 0.8     # difflib ratio for a near-miss column name
+AGGREGATABLE = ("numeric", "boolean")  # kinds mean/sum apply to (a boolean mean is a rate)
+REASK_RETRY_SECONDS = 600   # a re-ask that raised (e.g. provider down) is not retried sooner
+REASK_FAILURES_SIZE = 256
+
+_WORD = re.compile(r"[^a-z0-9]+")
+_FAILED = OrderedDict()  # re-ask key -> (failed at, error message)
+_FAILED_LOCK = threading.Lock()
+
+
+# ---- SCHEMA ----
+def plan_schema(dataset):
+    """{column: {"kind": numeric|boolean|datetime|categorical, "distinct": n}} from the profile."""
+    handle = resolve_dataset(dataset)
+    profile = handle.profile()
+    schema = {}
+    for col in profile.columns:
+        column = profile.column_profiles[col]
+        inferred = infer_schema(pd.DataFrame({col: pd.Series(column.first_values, dtype=object)}))[col]
+        if column.numeric:
+            kind = "numeric"
+        elif inferred == "bool":
+            kind = "boolean"
+        elif inferred == "datetime":
+            kind = "datetime"
+        else:
+            kind = "categorical"
+        schema[col] = {"kind": kind, "distinct": column.distinct()}
+    return schema
+
+
+def _normalize(name):
+    return _WORD.sub("_", str(name).lower()).strip("_")
+
+
+def resolve_column(name, schema):
+    """Exact, case/spacing-insensitive or close match of ``name``; None if none."""
+    if name is None or name in schema:
+        return name
+    normalized = {_normalize(col): col for col in schema}
+    key = _normalize(name)
+    if key in normalized:
+        return normalized[key]
+    close = difflib.get_close_matches(key, list(normalized), n=1, cutoff=NAME_MATCH_CUTOFF)
+    return normalized[close[0]] if close else None
+
+
+# ---- VALIDATION ----
+def _chart_type(value):
+    chart = _normalize(value).replace("_chart", "").replace("_plot", "").replace("_graph", "")
+    return CHART_ALIASES.get(chart, chart)
+
+
+def check_plot(plot, schema):
+    """(fixed plot, fixes, errors) for one PlotConfig dict; errors mean not drawable."""
+    plot = dict(plot)
+    fixes, errors = [], []
+
+    def fix(field, value, why):
+        if plot.get(field) != value:
+            fixes.append(f"{field}: {plot.get(field)!r} -> {value!r} ({why})")
+            plot[field] = value
+
+    chart = _chart_type(plot.get("chart_type"))
+    if chart not in CHART_TYPES:
+        errors.append(f"unknown chart_type {plot.get('chart_type')!r}")
+        return plot, fixes, errors
+    fix("chart_type", chart, "chart type alias")
+
+    for field in ("x", "y", "column"):
+        name = plot.get(field)
+        if name in (None, "", "null", "None"):
+            fix(field, None, "empty")
+            continue
+        resolved = resolve_column(name, schema)
+        if resolved is None:
+            errors.append(f"{field} {name!r} is not a column")
+        else:
+            fix(field, resolved, "closest column name")
+    if errors:
+        return plot, fixes, errors
+
+    kind = lambda col: schema[col]["kind"] if col else None
+    agg = str(plot.get("aggregation") or "").lower() or None
+    if agg in ("avg", "average"):
+        agg = "mean"
+    elif agg in ("total",):
+        agg = "sum"
+
+    if chart in ("histogram", "pie"):
+        # single-column charts: the column lives in x for histograms, column for pies
+        col = plot.get("x") if chart == "histogram" else plot.get("column")
+        col = col or plot.get("column") or plot.get("x")
+        if chart == "histogram" and kind(col) in ("categorical", "boolean"):
+            # a histogram of categories is a count bar chart
+            fix("chart_type", "bar", "histogram of a categorical column")
+            chart = "bar"
+            plot["x"], agg = col, "count"
+        else:
+            fix("x" if chart == "histogram" else "column", col, "single-column chart")
+            fix("column" if chart == "histogram" else "x", None, "unused for this chart")
+            fix("y", None, "unused for this chart")
+            fix("aggregation", None, "unused for this chart")
+            if chart == "histogram":
+                fix("top_k", None, "unused for this chart")
+                if col is None:
+                    errors.append("histogram needs a numeric column")
+                elif kind(col) != "numeric":
+                    errors.append(f"histogram of {kind(col)} column {col!r}")
+            elif col is None:
+                errors.append("pie needs a column")
+            elif kind(col) == "numeric" and schema[col]["distinct"] > PIE_MAX_DISTINCT:
+                errors.append(f"pie of continuous column {col!r}")
+
+    if chart == "bar":
+        x = plot.get("x") or plot.get("column")
+        fix("x", x, "bar charts group by x")
+        fix("column", None, "unused for this chart")
+        if agg not in ("count", "mean", "sum"):
+            agg = "mean" if plot.get("y") and kind(plot.get("y")) in AGGREGATABLE else "count"
+        if agg == "count":
+            fix("y", None, "count needs no y")
+        elif plot.get("y") is None:
+            agg = "count"
+        fix("aggregation", agg, "bar aggregation")
+        if x is None:
+            errors.append("bar chart needs x")
+        elif agg != "count" and kind(plot["y"]) not in AGGREGATABLE:
+            errors.append(f"{agg} of {kind(plot['y'])} column {plot['y']!r}")
+
+    elif chart == "line":
+        fix("column", None, "unused for this chart")
+        fix("top_k", None, "unused for this chart")
+        if agg not in ("count", "mean", "sum"):
+            agg = "mean"
+        fix("aggregation", agg, "line aggregation")
+        if plot.get("x") is None or plot.get("y") is None:
+            errors.append("line chart needs x and y")
+        elif agg != "count" and kind(plot["y"]) not in AGGREGATABLE:
+            errors.append(f"{agg} of {kind(plot['y'])} column {plot['y']!r}")
+
+    elif chart == "scatter":
+        fix("column", None, "unused for this chart")
+        fix("aggregation", None, "unused for this chart")
+        fix("top_k", None, "unused for this chart")
+        if plot.get("x") is None or plot.get("y") is None:
+            errors.append("scatter needs x and y")
+        else:
+            for field in ("x", "y"):
+                if kind(plot[field]) in ("categorical", "boolean"):
+                    errors.append(f"scatter {field} {plot[field]!r} is {kind(plot[field])}")
+
+    top_k = plot.get("top_k")
+    if top_k is not None:
+        try:
+            top_k = min(max(int(top_k), 1), MAX_TOP_K)
+        except (TypeError, ValueError):
+            top_k = None
+        fix("top_k", top_k, f"integer between 1 and {MAX_TOP_K}")
+    return plot, fixes, errors
+
+
+def validate_plan(plots, dataset, schema=None):
+    """Fixed plots aligned with ``plots`` plus one report row per plot."""
+    schema = schema or plan_schema(dataset)
+    fixed, report = [], []
+    for index, plot in enumerate(plots):
+        checked, fixes, errors = check_plot(plot, schema)
+        fixed.append(checked)
+        status = "invalid" if errors else "fixed" if fixes else "ok"
+        report.append({"index": index, "metric": plot.get("metric"), "status": status,
+                       "fixes": fixes, "errors": errors})
+    return fixed, report
+
+
+# ---- RE-ASK ----
+def _reask_prompt(invalid, schema):
+    columns = ", ".join(f"{col} ({info['kind']}, {info['distinct']} distinct)" for col, info in schema.items())
+    items = "\n".join(
+        f"{i + 1}. {json.dumps(plot, default=str)}\n   problems: {'; '.join(errors)}"
+        for i, (plot, errors) in enumerate(invalid)
+    )
+    return (
+        f"These chart specifications cannot be drawn from the dataset.\n"
+        f"Columns: {columns}\n\n{items}\n\n"
+        f"Return ONLY JSON {{\"plots\": [...]}} with one corrected plot per item, in the same order, "
+        f"keeping each metric's intent. Fields: metric, chart_type (bar|line|scatter|histogram|pie), "
+        f"x, y, column, aggregation (count|mean|sum|null), top_k, insight. Use only the listed columns; "
+        f"mean and sum need a numeric or boolean y (a boolean mean is a rate); "
+        f"histograms and scatters need numeric columns."
+    )
+
+
+def plan_hash(plots):
+    """Content hash of a list of plot dicts."""
+    return hashlib.sha256(json.dumps(plots, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _reask_key(dataset_key, invalid, llm):
+    payload = json.dumps([dataset_key, [plot_key(p) for p, _ in invalid], getattr(llm, "model", "")])
+    return "viz-reask:" + hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _recent_failure(key):
+    with _FAILED_LOCK:
+        failed = _FAILED.get(key)
+        if failed is not None and time.time() - failed[0] >= REASK_RETRY_SECONDS:
+            del _FAILED[key]
+            failed = None
+    return failed[1] if failed is not None else None
+
+
+def _remember_failure(key, message):
+    with _FAILED_LOCK:
+        _FAILED[key] = (time.time(), message)
+        _FAILED.move_to_end(key)
+        while len(_FAILED) > REASK_FAILURES_SIZE:
+            _FAILED.popitem(last=False)
+
+
+def reask_invalid(invalid, schema, dataset_key, llm=None, use_cache=True):
+    """Corrected plots for ``[(plot, errors), ...]`` from one LLM call (cached).
+
+    Unparseable answers are cached like good ones; a call that raised is
+    raised again without calling the model for ``REASK_RETRY_SECONDS``.
+    """
+    from result_cache import CachedTaskOutput, get_result_cache
+    from structured_output import repair_json
+
+    if llm is None:
+        from pipeline import agent_llm as llm
+    cache = get_result_cache() if use_cache else None
+    key = _reask_key(dataset_key, invalid, llm)
+    hit = cache.get(key) if cache is not None else None
+    if hit is not None:
+        raw = hit.raw
+    else:
+        failure = _recent_failure(key)
+        if failure is not None:
+            raise RuntimeError(failure)
+        try:
+            raw = str(llm.call([{"role": "user", "content": _reask_prompt(invalid, schema)}]))
+        except Exception as exc:
+            _remember_failure(key, f"{type(exc).__name__}: {exc}")
+            raise
+        if cache is not None:
+            cache.put(key, CachedTaskOutput(raw=raw))
+    try:
+        data = repair_json(raw)
+    except ValueError:
+        return []
+    plots = data.get("plots", []) if isinstance(data, dict) else data
+    return [p for p in plots if isinstance(p, dict)][:len(invalid)]
+
+
+def validate_and_repair(plots, dataset, reask=True, llm=None):
+    """Validated plots ready for ``execute_plan`` plus the validation report.
+
+    Invalid plots get one re-ask; those still invalid afterwards are dropped
+    (reported with status "dropped").
+    """
+    handle = resolve_dataset(dataset)
+    schema = plan_schema(handle)
+    fixed, report = validate_plan(plots, handle, schema)
+    invalid = [i for i, row in enumerate(report) if row["status"] == "invalid"]
+    if invalid and reask:
+        try:
+            answers = reask_invalid([(fixed[i], report[i]["errors"]) for i in invalid], schema, handle.key, llm)
+        except Exception as exc:  # the plan is still usable without the invalid plots
+            answers = []
+            for i in invalid:
+                report[i]["errors"].append(f"re-ask failed: {exc}")
+        for i, answer in zip(invalid, answers):
+            checked, fixes, errors = check_plot(answer, schema)
+            if not errors:
+                fixed[i] = checked
+                report[i].update(status="reasked", fixes=fixes, reasked_for=report[i]["errors"], errors=[])
+    kept = []
+    seen = set()
+    for plot, row in zip(fixed, report):
+        if row["status"] == "invalid":
+            row["status"] = "dropped"
+            continue
+        if plot_key(plot) in seen:
+            row["status"] = "dropped"
+            row["errors"].append("duplicate of an earlier plot")
+            continue
+        seen.add(plot_key(plot))
+        kept.append(plot)
+    return kept, report